@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable
+
+import numpy as np
+
+from .results import parse_score_remark, score_remarks
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+INTERACTIONS = ("contact", "hbond", "hydrophobic")
+
+# AutoDock atom types that differ from their element
+AUTODOCK_ELEMENTS = {
+    "A": "C",
+    "NA": "N",
+    "NS": "N",
+    "OA": "O",
+    "OS": "O",
+    "SA": "S",
+    "HD": "H",
+    "HS": "H",
+    "CL": "Cl",
+    "BR": "Br",
+}
+
+
+def _element(atom_type: str) -> str:
+    """Maps an AutoDock atom type or PDB element symbol to the element."""
+    return AUTODOCK_ELEMENTS.get(atom_type.upper(), atom_type.capitalize())
+
+
+def _parse_atoms(lines: Iterable[str], autodock_types: bool):
+    """Parses ATOM/HETATM records into coordinates, elements and residues.
+
+    Args:
+        lines: PDB or PDBQT lines.
+        autodock_types: Whether elements come from the PDBQT atom type column.
+
+    Returns:
+        An (n, 3) coordinate array, an array of element symbols and a list of
+        residue labels.
+    """
+    records = [line for line in lines if line.startswith(("ATOM", "HETATM"))]
+    coordinates = np.array(
+        [(line[30:38], line[38:46], line[46:54]) for line in records], dtype=float
+    ).reshape(-1, 3)
+    if autodock_types:
+        types = [line[77:79].strip() for line in records]
+    else:
+        # Fall back on the atom name when the element column is empty
+        types = [line[76:78].strip() or line[12:16].strip()[:1] for line in records]
+    elements = np.array([_element(t) for t in types], dtype=object)
+    residues = [
+        f"{line[21].strip()}:{line[17:20].strip()}{line[22:27].strip()}".lstrip(":")
+        for line in records
+    ]
+    return coordinates, elements, residues
+
+
+def read_pdbqt_poses(pdbqt_file: Path, all_poses: bool = False) -> list[dict]:
+    """Reads docked poses from a Vina output PDBQT file.
+
+    Args:
+        pdbqt_file: Path to the Vina output PDBQT file.
+        all_poses: Read every model instead of only the best (first) one.
+
+    Returns:
+        One dictionary per pose with its ``pose`` number, ``affinity`` (None
+        if missing), ``coordinates`` and ``elements``.
+    """
+    poses = []
+    lines: list[str] = []
+    affinity = None
+
+    def finish():
+        coordinates, elements, _ = _parse_atoms(lines, autodock_types=True)
+        poses.append(
+            {
+                "pose": len(poses) + 1,
+                "affinity": affinity,
+                "coordinates": coordinates,
+                "elements": elements,
+            }
+        )
+
+    remarks = score_remarks()
+    with open(pdbqt_file, "r") as f:
+        for line in f:
+            if line.startswith(remarks):
+                affinity = parse_score_remark(line)
+            elif line.startswith(("ATOM", "HETATM")):
+                lines.append(line)
+            elif line.startswith("ENDMDL"):
+                finish()
+                if not all_poses:
+                    return poses
+                lines, affinity = [], None
+    if lines:
+        finish()
+    return poses
+
+
+def parse_constraint(constraint: str) -> tuple[str, str]:
+    """Splits a ``RESIDUE[:INTERACTION]`` constraint such as ``A:ASP25:hbond``.
+
+    Args:
+        constraint: A residue label, optionally followed by an interaction
+            type; a bare residue means any contact.
+
+    Returns:
+        The residue label and the interaction type.
+
+    Raises:
+        ValueError: If the interaction type is unknown.
+    """
+    residue, _, interaction = constraint.rpartition(":")
+    if interaction not in INTERACTIONS:
+        residue, interaction = constraint, "contact"
+    if not residue or residue.endswith(":"):
+        raise ValueError(
+            f"Invalid constraint '{constraint}'; expected RESIDUE[:INTERACTION] "
+            f"with INTERACTION one of {', '.join(INTERACTIONS)}."
+        )
+    return residue, interaction
+
+
+class ReceptorContacts:
+    """Residue-level interaction fingerprints of poses against one receptor.
+
+    Receptor heavy atoms are indexed once in a ``scipy.spatial.cKDTree``. Each
+    batch of poses is stacked into one coordinate array and all atom pairs
+    within the cutoff are found in a single sparse distance query, which are
+    then classified as contacts, hydrogen bonds (N/O pairs within
+    ``hbond_cutoff``) or hydrophobic contacts (C-C pairs).
+    """
+
+    def __init__(
+        self, receptor_path: Path, cutoff: float = 4.0, hbond_cutoff: float = 3.5
+    ):
+        """
+        Args:
+            receptor_path: The receptor in PDB or PDBQT format.
+            cutoff: Heavy-atom distance for contacts and hydrophobic contacts.
+            hbond_cutoff: N/O distance for hydrogen bonds.
+        """
+        from scipy.spatial import cKDTree
+
+        with open(receptor_path, "r") as f:
+            coordinates, elements, residues = _parse_atoms(
+                f, autodock_types=Path(receptor_path).suffix == ".pdbqt"
+            )
+        heavy = elements != "H"
+        self.residues, residue_index = np.unique(
+            np.array(residues, dtype=object)[heavy], return_inverse=True
+        )
+        self.residues = self.residues.tolist()
+        self.residue_index = residue_index
+        self.elements = elements[heavy]
+        self.tree = cKDTree(coordinates[heavy])
+        self.cutoff = cutoff
+        self.hbond_cutoff = hbond_cutoff
+
+    def fingerprints(self, poses: list[dict]) -> np.ndarray:
+        """Computes interaction fingerprints for a batch of poses.
+
+        Args:
+            poses: Poses as returned by `read_pdbqt_poses`.
+
+        Returns:
+            A boolean array of shape ``(num_poses, num_residues,
+            len(INTERACTIONS))``.
+        """
+        from scipy.spatial import cKDTree
+
+        fingerprints = np.zeros(
+            (len(poses), len(self.residues), len(INTERACTIONS)), dtype=bool
+        )
+        if not poses:
+            return fingerprints
+
+        coordinates = np.concatenate([pose["coordinates"] for pose in poses])
+        elements = np.concatenate([pose["elements"] for pose in poses])
+        pose_index = np.repeat(
+            np.arange(len(poses)), [len(pose["coordinates"]) for pose in poses]
+        )
+        heavy = elements != "H"
+        coordinates, elements, pose_index = (
+            coordinates[heavy],
+            elements[heavy],
+            pose_index[heavy],
+        )
+        if len(coordinates) == 0:
+            return fingerprints
+
+        pairs = self.tree.sparse_distance_matrix(
+            cKDTree(coordinates), self.cutoff, output_type="ndarray"
+        )
+        receptor_atoms, ligand_atoms = pairs["i"], pairs["j"]
+        rows = pose_index[ligand_atoms]
+        residues = self.residue_index[receptor_atoms]
+        receptor_elements = self.elements[receptor_atoms]
+        ligand_elements = elements[ligand_atoms]
+
+        polar = np.isin(receptor_elements, ("N", "O")) & np.isin(
+            ligand_elements, ("N", "O")
+        )
+        masks = {
+            "contact": np.ones(len(pairs), dtype=bool),
+            "hbond": polar & (pairs["v"] <= self.hbond_cutoff),
+            "hydrophobic": (receptor_elements == "C") & (ligand_elements == "C"),
+        }
+        for k, interaction in enumerate(INTERACTIONS):
+            mask = masks[interaction]
+            fingerprints[rows[mask], residues[mask], k] = True
+        return fingerprints
+
+
+def analyze_contacts(
+    results_df: pd.DataFrame,
+    results_dir: Path,
+    receptor_path: Path,
+    constraints: Iterable[str] = (),
+    cutoff: float = 4.0,
+    all_poses: bool = False,
+    batch_size: int = 1000,
+) -> pd.DataFrame:
+    """Adds interaction fingerprint and constraint columns to docking results.
+
+    Poses are read from ``<compound>_docked.pdbqt`` in the results directory
+    and fingerprinted in batches by `ReceptorContacts`. One boolean column
+    named ``<residue>:<interaction>`` is added for every residue interaction
+    seen in any pose or named in a constraint, plus ``contacts`` (the number
+    of residues in contact) and ``passes_constraints``. Compounds without a
+    pose file keep their row, with NaN contact columns and failing the
+    constraints.
+
+    Args:
+        results_df: DataFrame with ``compound`` and ``affinity`` columns, as
+            returned by `aggregate_results`.
+        results_dir: The directory with the docked PDBQT files.
+        receptor_path: The receptor in PDB or PDBQT format.
+        constraints: Required interactions as ``RESIDUE[:INTERACTION]``, such
+            as ``A:ASP25:hbond`` or ``A:PHE30``, see `parse_constraint`.
+        cutoff: Heavy-atom distance for contacts.
+        all_poses: Fingerprint every pose, with one row per pose and a
+            ``pose`` column; the ``affinity`` column then holds each pose's
+            own score.
+        batch_size: The number of poses fingerprinted at once.
+
+    Returns:
+        The results with the added columns.
+    """
+    import pandas as pd
+
+    constraints = [parse_constraint(c) for c in constraints]
+    receptor = ReceptorContacts(receptor_path, cutoff=cutoff)
+    num_interactions = len(INTERACTIONS)
+
+    rows, batch, batch_rows, missing = [], [], [], []
+    pose_codes, interaction_codes = [], []
+    num_poses = 0
+
+    def flush():
+        nonlocal num_poses
+        poses, codes = np.nonzero(
+            receptor.fingerprints(batch).reshape(len(batch), -1)
+        )
+        pose_codes.append(poses + num_poses)
+        interaction_codes.append(codes)
+        num_poses += len(batch)
+        rows.extend(batch_rows)
+        batch.clear()
+        batch_rows.clear()
+
+    for position, row in enumerate(results_df.to_dict("records")):
+        pdbqt_file = results_dir / f"{row['compound']}_docked.pdbqt"
+        if not pdbqt_file.exists():
+            missing.append({**row, "_position": position})
+            continue
+        for pose in read_pdbqt_poses(pdbqt_file, all_poses):
+            pose_row = {**row, "_position": position}
+            if all_poses:
+                pose_row.update(pose=pose["pose"], affinity=pose["affinity"])
+            batch.append(pose)
+            batch_rows.append(pose_row)
+            if len(batch) >= batch_size:
+                flush()
+    if batch:
+        flush()
+
+    pose_codes = np.concatenate(pose_codes) if pose_codes else np.zeros(0, int)
+    interaction_codes = (
+        np.concatenate(interaction_codes) if interaction_codes else np.zeros(0, int)
+    )
+
+    index = {residue: i for i, residue in enumerate(receptor.residues)}
+    required = [
+        index[residue] * num_interactions + INTERACTIONS.index(interaction)
+        for residue, interaction in constraints
+        if residue in index
+    ]
+    codes = np.union1d(interaction_codes, required).astype(int)
+    matrix = np.zeros((num_poses, len(codes)), dtype=bool)
+    matrix[pose_codes, np.searchsorted(codes, interaction_codes)] = True
+    fingerprint_df = pd.DataFrame(
+        matrix,
+        columns=[
+            f"{receptor.residues[code // num_interactions]}:"
+            f"{INTERACTIONS[code % num_interactions]}"
+            for code in codes
+        ],
+    )
+    for residue, interaction in constraints:
+        if residue not in index:
+            print(f"Warning: constraint residue {residue} not found in receptor.")
+            fingerprint_df[f"{residue}:{interaction}"] = False
+
+    # (pose, code) pairs are unique, so this counts residues in contact
+    is_contact = interaction_codes % num_interactions == 0
+    contacts = np.bincount(pose_codes[is_contact], minlength=num_poses)
+    satisfied = np.ones(num_poses, dtype=bool)
+    for residue, interaction in constraints:
+        satisfied &= fingerprint_df[f"{residue}:{interaction}"].to_numpy()
+
+    columns = list(results_df.columns) + (["pose"] if all_poses else []) + ["_position"]
+    contacts_df = pd.concat(
+        [
+            pd.DataFrame(rows, columns=columns),
+            pd.DataFrame({"contacts": contacts, "passes_constraints": satisfied}),
+            fingerprint_df,
+        ],
+        axis=1,
+    )
+    if missing:
+        print(
+            f"Warning: {len(missing)} compounds have no docked pose file; "
+            f"their contact columns are left empty."
+        )
+        missing_df = pd.DataFrame(missing, columns=columns)
+        missing_df["passes_constraints"] = False
+        contacts_df = pd.concat([contacts_df, missing_df], ignore_index=True)
+        contacts_df = contacts_df.sort_values("_position", kind="stable")
+    return contacts_df.drop(columns="_position").reset_index(drop=True)
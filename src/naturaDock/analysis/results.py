@@ -1,9 +1,29 @@
+from __future__ import annotations
+
 from pathlib import Path
-import pandas as pd
+from typing import TYPE_CHECKING
+
+from ..docking.engines import ENGINES
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+def score_remarks() -> tuple[str, ...]:
+    """Returns the score remark prefixes of all registered docking engines."""
+    return tuple(dict.fromkeys(engine.score_remark for engine in ENGINES.values()))
+
+def parse_score_remark(line: str) -> float | None:
+    """Returns the score on a score remark line, or None for any other line."""
+    for remark in score_remarks():
+        if line.startswith(remark):
+            return float(line[len(remark) :].split()[0])
+    return None
 
 def parse_vina_result(pdbqt_file: Path) -> float:
     """Parses a Vina output PDBQT file to extract the binding affinity.
 
+    Output of the Vina derivatives in `docking.engines` is recognised too.
+
     Args:
         pdbqt_file: Path to the Vina output PDBQT file.
 
@@ -12,8 +32,9 @@ def parse_vina_result(pdbqt_file: Path) -> float:
     """
     with open(pdbqt_file, "r") as f:
         for line in f:
-            if line.startswith("REMARK VINA RESULT:"):
-                return float(line.split()[3])
+            affinity = parse_score_remark(line)
+            if affinity is not None:
+                return affinity
     return None
 
 def aggregate_results(results_dir: Path) -> pd.DataFrame:
@@ -25,6 +46,8 @@ def aggregate_results(results_dir: Path) -> pd.DataFrame:
     Returns:
         A pandas DataFrame with the aggregated results.
     """
+    import pandas as pd
+
     results = []
     for pdbqt_file in results_dir.glob("*_docked.pdbqt"):
         compound_name = pdbqt_file.stem.replace("_docked", "")
@@ -33,3 +56,29 @@ def aggregate_results(results_dir: Path) -> pd.DataFrame:
             results.append({"compound": compound_name, "affinity": affinity})
     
     return pd.DataFrame(results)
+
+def collapse_conformer_results(results_df: pd.DataFrame) -> pd.DataFrame:
+    """Collapses per-conformer results to the best score per molecule.
+
+    Conformer ensembles are docked as ``<name>_conf<k>``; compounds without
+    the suffix are kept as they are.
+
+    Args:
+        results_df: DataFrame with ``compound`` and ``affinity`` columns.
+
+    Returns:
+        A DataFrame with one row per molecule and a ``conformer`` column
+        holding the index of the best-scoring conformer (-1 if not an ensemble).
+    """
+    import pandas as pd
+
+    if results_df.empty:
+        return results_df.assign(conformer=pd.Series(dtype=int))
+
+    parts = results_df["compound"].str.extract(r"^(?P<parent>.+)_conf(?P<k>\d+)$")
+    collapsed = results_df.assign(
+        compound=parts["parent"].fillna(results_df["compound"]),
+        conformer=parts["k"].fillna(-1).astype(int),
+    )
+    best = collapsed.groupby("compound")["affinity"].idxmin()
+    return collapsed.loc[best].reset_index(drop=True)
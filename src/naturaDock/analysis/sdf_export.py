@@ -0,0 +1,225 @@
+# Parallel Export of Docked Poses to Scored SDF
+from __future__ import annotations
+
+import gzip
+import io
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+SDF_DIRNAME = "poses"
+SDF_COMPRESSIONS = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def docked_pose_file(results_dir: Path, compound: str, conformer: int = -1) -> Path:
+    """Returns the docking output of a compound, or of one of its conformers."""
+    if conformer >= 0:
+        compound = f"{compound}_conf{conformer}"
+    return results_dir / f"{compound}_docked.pdbqt"
+
+
+def convert_poses(
+    pdbqt_file: Path,
+    name: str,
+    max_poses: int | None = 1,
+    properties: dict | None = None,
+) -> str:
+    """
+    Converts the poses of a docking output file to SD records.
+
+    The molecule is rebuilt in-process by Meeko from the SMILES remarks it
+    writes into the ligand PDBQT, which Vina keeps in its output, so bond
+    orders, charges and hydrogens are those of the input molecule.
+
+    Args:
+        pdbqt_file: The docking output in PDBQT format.
+        name: The record name.
+        max_poses: The number of poses converted, best first; None for all.
+        properties: Properties set on every record.
+
+    Returns:
+        One SD record per pose, with its ``naturaDock_pose`` number and
+        ``naturaDock_affinity``.
+
+    Raises:
+        ValueError: If the file holds no poses Meeko can rebuild.
+    """
+    from meeko import PDBQTMolecule, RDKitMolCreate
+    from rdkit import Chem
+
+    pdbqt = Path(pdbqt_file).read_text()
+    missing = ValueError(
+        f"Cannot rebuild the molecule in {pdbqt_file}; it lacks the SMILES "
+        f"remarks of a Meeko-prepared ligand."
+    )
+    if "REMARK SMILES" not in pdbqt:
+        raise missing
+    pdbqt_mol = PDBQTMolecule(
+        pdbqt, name=name, poses_to_read=max_poses, skip_typing=True
+    )
+    scores = [pose.score for pose in pdbqt_mol]
+    molecules = RDKitMolCreate.from_pdbqt_mol(pdbqt_mol)
+    if not molecules or molecules[0] is None:
+        raise missing
+    mol = molecules[0]
+    mol.ClearProp("meeko")
+    mol.SetProp("_Name", name)
+    for key, value in (properties or {}).items():
+        if isinstance(value, bool):
+            mol.SetProp(key, str(value))
+        elif isinstance(value, int):
+            mol.SetIntProp(key, value)
+        elif isinstance(value, float):
+            mol.SetDoubleProp(key, value)
+        else:
+            mol.SetProp(key, str(value))
+
+    buffer = io.StringIO()
+    writer = Chem.SDWriter(buffer)
+    for pose, (conformer, score) in enumerate(zip(mol.GetConformers(), scores), 1):
+        mol.SetIntProp("naturaDock_pose", pose)
+        if score is not None:
+            mol.SetDoubleProp("naturaDock_affinity", score)
+        writer.write(mol, confId=conformer.GetId())
+    writer.close()
+    return buffer.getvalue()
+
+
+def _convert_job(job: tuple) -> tuple[str | None, str | None]:
+    """Worker for `export_poses_sdf`; returns the SD text or an error message."""
+    pdbqt_file, name, max_poses, properties = job
+    try:
+        return convert_poses(pdbqt_file, name, max_poses, properties), None
+    except Exception as e:
+        return None, f"{name}: {e}"
+
+
+def _converted(jobs: list[tuple], num_workers: int, chunk_size: int):
+    """Yields the results of `_convert_job` in job order."""
+    if num_workers == 1:
+        yield from map(_convert_job, jobs)
+        return
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        items = iter(jobs)
+        # Bounded windows keep converted text from piling up in memory
+        while batch := list(islice(items, 16 * chunk_size * num_workers)):
+            yield from executor.map(_convert_job, batch, chunksize=chunk_size)
+
+
+def _open_sdf(path: Path, compression: str | None):
+    """Opens an SDF file for writing text, compressed while it is written."""
+    if compression == "gzip":
+        return gzip.open(path, "wt", encoding="utf-8", compresslevel=6)
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError(
+                "Writing .zst files requires the zstandard package "
+                "(pip install zstandard)."
+            ) from e
+        return zstandard.open(path, "wt", encoding="utf-8")
+    if compression is not None:
+        raise ValueError(f"Unsupported compression: {compression}")
+    return open(path, "w", encoding="utf-8")
+
+
+def export_poses_sdf(
+    results_df: pd.DataFrame,
+    results_dir: Path,
+    output_dir: Path,
+    top_k: int | None = None,
+    max_poses: int | None = 1,
+    num_workers: int | None = None,
+    records_per_file: int = 50_000,
+    compression: str | None = None,
+    chunk_size: int = 64,
+) -> list[Path]:
+    """
+    Exports the docked poses of ranked results as scored SDF files.
+
+    Docking outputs are converted with `convert_poses` in worker processes
+    and streamed in rank order into ``poses/poses_<n>.sdf`` files, starting a
+    new file after ``records_per_file`` records and compressing with gzip or
+    zstd on request. Every record carries its ``naturaDock_rank``,
+    ``naturaDock_compound``, ``naturaDock_pose``, ``naturaDock_affinity`` and
+    ``naturaDock_source`` (the docking output file), plus
+    ``naturaDock_conformer`` for conformer ensembles. Files that cannot be
+    converted are reported and skipped.
+
+    Args:
+        results_df: DataFrame with ``compound`` and ``affinity`` columns, as
+            returned by `aggregate_results`, and an optional ``conformer``
+            column from `collapse_conformer_results`.
+        results_dir: The directory with the docked PDBQT files.
+        output_dir: The pipeline output directory.
+        top_k: The number of best-ranked compounds exported; None for all.
+        max_poses: Poses exported per compound, best first; None for all.
+        num_workers: Conversion processes; defaults to the physical cores.
+        records_per_file: SD records written before starting a new file.
+        compression: "gzip", "zstd" or None.
+        chunk_size: Compounds sent to a worker at a time.
+
+    Returns:
+        The written SDF files.
+    """
+    import psutil
+
+    if compression is not None and compression not in SDF_COMPRESSIONS:
+        raise ValueError(f"Unsupported compression: {compression}")
+    suffix = ".sdf" + SDF_COMPRESSIONS.get(compression, "")
+    ranked = results_df.sort_values(by="affinity", kind="stable")
+    if top_k is not None:
+        ranked = ranked.head(top_k)
+    num_workers = num_workers or psutil.cpu_count(logical=False)
+
+    jobs = []
+    for rank, row in enumerate(ranked.itertuples(index=False), start=1):
+        conformer = int(getattr(row, "conformer", -1))
+        pdbqt_file = docked_pose_file(results_dir, row.compound, conformer)
+        properties = {
+            "naturaDock_rank": rank,
+            "naturaDock_compound": row.compound,
+            "naturaDock_source": pdbqt_file.name,
+        }
+        if conformer >= 0:
+            properties["naturaDock_conformer"] = conformer
+        jobs.append((pdbqt_file, row.compound, max_poses, properties))
+
+    sdf_dir = output_dir / SDF_DIRNAME
+    sdf_dir.mkdir(parents=True, exist_ok=True)
+    paths, failed = [], []
+    sdf_file, records = None, 0
+
+    def write(text: str):
+        nonlocal sdf_file, records
+        if sdf_file is None or records >= records_per_file:
+            if sdf_file is not None:
+                sdf_file.close()
+            paths.append(sdf_dir / f"poses_{len(paths):04d}{suffix}")
+            sdf_file = _open_sdf(paths[-1], compression)
+            records = 0
+        sdf_file.write(text)
+        records += text.count("$$$$\n")
+
+    try:
+        for text, error in _converted(jobs, num_workers, chunk_size):
+            if error is None:
+                write(text)
+            else:
+                failed.append(error)
+    finally:
+        if sdf_file is not None:
+            sdf_file.close()
+
+    for error in failed[:10]:
+        print(f"Warning: pose export failed for {error}")
+    print(
+        f"Poses of {len(jobs) - len(failed)} compounds exported to {len(paths)} "
+        f"SDF files in {sdf_dir} ({len(failed)} failed)"
+    )
+    return paths
@@ -1,33 +1,272 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+import numpy as np
 from pathlib import Path
 
-def generate_statistics(
-    results_df: pd.DataFrame, output_dir: Path
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+@dataclass
+class ScoreAggregate:
+    """Mergeable single-pass summary of docking scores.
+
+    Holds a fixed-bin histogram plus exact count, mean, variance, minimum and
+    maximum. Aggregates built over chunks or shards with the same binning can
+    be merged, so the full score column never has to be in memory at once.
+
+    Quantiles are interpolated within histogram bins and are accurate to one
+    ``bin_width`` for scores inside ``[lower, upper]``; scores outside the
+    range are counted in the edge bins.
+    """
+
+    lower: float = -30.0
+    upper: float = 10.0
+    bin_width: float = 0.01
+    counts: np.ndarray = field(default=None, repr=False)
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+    minimum: float = np.inf
+    maximum: float = -np.inf
+
+    def __post_init__(self):
+        if self.counts is None:
+            num_bins = int(round((self.upper - self.lower) / self.bin_width))
+            self.counts = np.zeros(num_bins, dtype=np.int64)
+
+    @property
+    def edges(self) -> np.ndarray:
+        """The histogram bin edges."""
+        return self.lower + self.bin_width * np.arange(len(self.counts) + 1)
+
+    def update(self, values) -> ScoreAggregate:
+        """Adds a chunk of scores; NaN values are ignored."""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+
+        bins = np.floor((values - self.lower) / self.bin_width).astype(np.int64)
+        np.clip(bins, 0, len(self.counts) - 1, out=bins)
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+
+        chunk_mean = values.mean()
+        self._combine(values.size, chunk_mean, ((values - chunk_mean) ** 2).sum())
+        self.minimum = min(self.minimum, values.min())
+        self.maximum = max(self.maximum, values.max())
+        return self
+
+    def merge(self, other: ScoreAggregate) -> ScoreAggregate:
+        """Adds another aggregate with the same binning into this one."""
+        if (other.lower, other.upper, other.bin_width) != (
+            self.lower,
+            self.upper,
+            self.bin_width,
+        ):
+            raise ValueError("Cannot merge score aggregates with different binning.")
+        if other.count == 0:
+            return self
+        self.counts += other.counts
+        self._combine(other.count, other.mean, other.m2)
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        return self
+
+    def _combine(self, count: int, mean: float, m2: float):
+        """Merges count/mean/M2 moments (Chan et al. parallel variance)."""
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta**2 * self.count * count / total
+        self.count = total
+
+    def _value_at_rank(self, rank: int, cumulative: np.ndarray) -> float:
+        """Estimates the order statistic at a 0-based rank.
+
+        The c values of a bin are taken to sit at the centres of c equal
+        slices of the bin, so the estimate lies in the true value's bin.
+        """
+        index = int(np.searchsorted(cumulative, rank, side="right"))
+        below = cumulative[index - 1] if index > 0 else 0
+        fraction = (rank - below + 0.5) / self.counts[index]
+        return self.lower + self.bin_width * (index + fraction)
+
+    def quantile(self, q: float) -> float:
+        """Returns the approximate q-quantile, interpolated like pandas."""
+        if self.count == 0:
+            return np.nan
+        # pandas interpolates linearly between the order statistics around
+        # rank q * (n - 1); doing the same on the estimates keeps the error
+        # within one bin
+        rank = q * (self.count - 1)
+        cumulative = np.cumsum(self.counts)
+        low = self._value_at_rank(int(np.floor(rank)), cumulative)
+        high = self._value_at_rank(int(np.ceil(rank)), cumulative)
+        value = low + (rank - np.floor(rank)) * (high - low)
+        return float(np.clip(value, self.minimum, self.maximum))
+
+    def describe(self) -> pd.Series:
+        """Returns a summary with the same index as ``Series.describe()``."""
+        # pandas is imported lazily so live progress tracking stays lightweight
+        import pandas as pd
+
+        std = np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+        return pd.Series(
+            {
+                "count": float(self.count),
+                "mean": self.mean if self.count else np.nan,
+                "std": std,
+                "min": self.minimum if self.count else np.nan,
+                "25%": self.quantile(0.25),
+                "50%": self.quantile(0.5),
+                "75%": self.quantile(0.75),
+                "max": self.maximum if self.count else np.nan,
+            },
+            name="affinity",
+        )
+
+    def smoothed_counts(self) -> np.ndarray:
+        """Returns a Gaussian binned-KDE estimate of the counts per bin.
+
+        The bandwidth follows Scott's rule, as ``seaborn.kdeplot`` does.
+        """
+        if self.count < 2 or self.m2 == 0:
+            return self.counts.astype(float)
+        std = np.sqrt(self.m2 / (self.count - 1))
+        bandwidth = std * self.count ** (-1 / 5) / self.bin_width
+        offsets = np.arange(-int(4 * bandwidth) - 1, int(4 * bandwidth) + 2)
+        kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2)
+        return np.convolve(self.counts, kernel / kernel.sum(), mode="same")
+
+    def to_dict(self) -> dict:
+        """Returns a compact JSON-serialisable form storing non-empty bins only."""
+        nonzero = np.flatnonzero(self.counts)
+        return {
+            "lower": self.lower,
+            "upper": self.upper,
+            "bin_width": self.bin_width,
+            "bins": nonzero.tolist(),
+            "counts": self.counts[nonzero].tolist(),
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self.m2,
+            "minimum": self.minimum if self.count else None,
+            "maximum": self.maximum if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> ScoreAggregate:
+        """Rebuilds an aggregate written by `to_dict`."""
+        aggregate = cls(data["lower"], data["upper"], data["bin_width"])
+        aggregate.counts[data["bins"]] = data["counts"]
+        aggregate.count = data["count"]
+        aggregate.mean = data["mean"]
+        aggregate.m2 = data["m2"]
+        if data["count"]:
+            aggregate.minimum = data["minimum"]
+            aggregate.maximum = data["maximum"]
+        return aggregate
+
+
+def aggregate_scores(
+    results_df: pd.DataFrame, chunk_size: int = 1_000_000, **binning
+) -> ScoreAggregate:
+    """Builds a score aggregate in a single streaming pass over chunks.
+
+    Args:
+        results_df: DataFrame with an ``affinity`` column.
+        chunk_size: The number of scores processed at once.
+        **binning: ``lower``, ``upper`` and ``bin_width`` for `ScoreAggregate`.
+
+    Returns:
+        The score aggregate.
+    """
+    aggregate = ScoreAggregate(**binning)
+    affinities = results_df["affinity"].to_numpy()
+    for start in range(0, len(affinities), chunk_size):
+        aggregate.update(affinities[start : start + chunk_size])
+    return aggregate
+
+
+def plot_score_distribution(
+    aggregate: ScoreAggregate, plot_path: Path, num_bins: int = 50
 ):
-    """Generates a statistical summary and a distribution plot of the docking scores.
+    """Renders the score distribution from an aggregate.
+
+    Fine histogram bins are merged into about ``num_bins`` display bins, and
+    the binned KDE is drawn on top at the same scale.
 
     Args:
-        results_df: DataFrame with the docking results.
-        output_dir: Path to the directory to write the output files.
+        aggregate: The score aggregate to plot.
+        plot_path: The path to write the image to.
+        num_bins: The approximate number of histogram bars.
     """
-    # Generate statistical summary
-    summary = results_df["affinity"].describe()
-    summary_path = output_dir / "statistical_summary.txt"
-    with open(summary_path, "w") as f:
-        f.write(summary.to_string())
+    # Plotting libraries are only needed here
+    import matplotlib.pyplot as plt
 
-    print(f"Statistical summary saved to {summary_path}")
+    used = np.flatnonzero(aggregate.counts)
+    first, last = (used[0], used[-1] + 1) if used.size else (0, 1)
+    group = max(1, -(-(last - first) // num_bins))
+    last = first + group * -(-(last - first) // group)
+    counts = np.zeros(last - first, dtype=float)
+    available = aggregate.counts[first:last]
+    counts[: len(available)] = available
+    bar_counts = counts.reshape(-1, group).sum(axis=1)
+    # Padded bars can run past the top bin, so edges are not sliced from it
+    edges = aggregate.lower + aggregate.bin_width * (
+        first + group * np.arange(len(bar_counts) + 1)
+    )
+    width = aggregate.bin_width * group
 
-    # Generate distribution plot
     plt.figure(figsize=(10, 6))
-    sns.histplot(results_df["affinity"], kde=True)
+    plt.bar(edges[:-1], bar_counts, width=width, align="edge", alpha=0.6)
+    smoothed = aggregate.smoothed_counts()[first:last] * group
+    centres = aggregate.edges[first:last] + aggregate.bin_width / 2
+    plt.plot(centres[: len(smoothed)], smoothed)
     plt.title("Distribution of Docking Scores")
     plt.xlabel("Binding Affinity (kcal/mol)")
     plt.ylabel("Frequency")
-    plot_path = output_dir / "docking_scores_distribution.png"
     plt.savefig(plot_path)
     plt.close()
 
+
+def generate_statistics_from_aggregate(aggregate: ScoreAggregate, output_dir: Path):
+    """Writes the statistical summary and distribution plot of an aggregate.
+
+    Args:
+        aggregate: The score aggregate, possibly merged from several shards.
+        output_dir: Path to the directory to write the output files.
+    """
+    summary = aggregate.describe()
+    summary_path = output_dir / "statistical_summary.txt"
+    with open(summary_path, "w") as f:
+        f.write(summary.to_string())
+        f.write(
+            f"\n\nQuantiles are accurate to within {aggregate.bin_width} kcal/mol "
+            f"for scores in [{aggregate.lower}, {aggregate.upper}].\n"
+        )
+
+    print(f"Statistical summary saved to {summary_path}")
+
+    plot_path = output_dir / "docking_scores_distribution.png"
+    plot_score_distribution(aggregate, plot_path)
+
     print(f"Distribution plot saved to {plot_path}")
+
+
+def generate_statistics(
+    results_df: pd.DataFrame, output_dir: Path
+):
+    """Generates a statistical summary and a distribution plot of the docking scores.
+
+    Statistics and plots are computed from a binned aggregate built in one
+    streaming pass, so memory and time stay flat for very large screens.
+
+    Args:
+        results_df: DataFrame with the docking results.
+        output_dir: Path to the directory to write the output files.
+    """
+    generate_statistics_from_aggregate(aggregate_scores(results_df), output_dir)
@@ -1,6 +1,327 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Default early-recognition settings (Truchon & Bayly, 2007; Mysinger, 2010)
+DEFAULT_PERCENTILES = (0.5, 1.0, 2.0, 5.0, 10.0)
+DEFAULT_ALPHA = 20.0
+DEFAULT_LOG_AUC_LAMBDA = 0.001
+
+
+def rank_by_score(actives, scores) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Sorts activity labels by docking score, best (lowest) score first.
+
+    Every metric in this module works on the output of this function, so a
+    screen is sorted exactly once however many metrics are computed.
+
+    Args:
+        actives: Array-like of activity labels (truthy for actives).
+        scores: Array-like of docking scores where lower is better.
+
+    Returns:
+        The ranked boolean activity labels and the ranked scores.
+    """
+    scores = np.asarray(scores, dtype=float)
+    order = np.argsort(scores, kind="stable")
+    return np.asarray(actives, dtype=bool)[order], scores[order]
+
+
+def enrichment_factors(ranked_actives: np.ndarray, percentiles) -> np.ndarray:
+    """
+    Calculates enrichment factors at several percentiles at once.
+
+    The top slice holds ``ceil(n * percentile / 100)`` compounds and is never
+    empty, so small screens and low percentiles do not divide by zero.
+
+    Args:
+        ranked_actives: Ranked activity labels, shape (n,) or (batch, n).
+        percentiles: The percentiles at which to calculate the enrichment.
+
+    Returns:
+        The enrichment factors with shape ``ranked_actives.shape[:-1] +
+        (len(percentiles),)``. NaN where the screen contains no actives.
+    """
+    n_total = ranked_actives.shape[-1]
+    n_top = np.ceil(n_total * np.asarray(percentiles, dtype=float) / 100)
+    n_top = np.clip(n_top, 1, n_total).astype(int)
+
+    hits = np.cumsum(ranked_actives, axis=-1)
+    n_actives_top = hits[..., n_top - 1]
+    n_actives_total = hits[..., -1:]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (n_actives_top / n_top) / (n_actives_total / n_total)
+
+
+def _average_ranks(ranked_scores: np.ndarray) -> np.ndarray:
+    """Returns 1-based ranks of sorted scores, averaging ranks over ties."""
+    n_total = ranked_scores.shape[-1]
+    positions = np.broadcast_to(np.arange(n_total), ranked_scores.shape)
+    changes = ranked_scores[..., 1:] != ranked_scores[..., :-1]
+    edge = np.ones(ranked_scores.shape[:-1] + (1,), dtype=bool)
+
+    # First and last position of each run of equal scores
+    run_start = np.where(np.concatenate([edge, changes], axis=-1), positions, 0)
+    run_start = np.maximum.accumulate(run_start, axis=-1)
+    run_end = np.where(np.concatenate([changes, edge], axis=-1), positions, n_total)
+    run_end = np.flip(np.minimum.accumulate(np.flip(run_end, -1), axis=-1), -1)
+    return (run_start + run_end) / 2 + 1
+
+
+def roc_auc(ranked_actives: np.ndarray, ranked_scores: np.ndarray) -> np.ndarray:
+    """
+    Calculates the area under the ROC curve from ranked labels and scores.
+
+    Uses the Mann-Whitney formulation with average ranks, so tied scores are
+    handled exactly like ``sklearn.metrics.roc_auc_score``. The scores must be
+    sorted, as returned by `rank_by_score`.
+
+    Args:
+        ranked_actives: Ranked activity labels, shape (n,) or (batch, n).
+        ranked_scores: The matching ranked scores.
+
+    Returns:
+        The AUC (a float for 1-D input). NaN without both actives and decoys.
+    """
+    n_total = ranked_actives.shape[-1]
+    n_actives = ranked_actives.sum(axis=-1)
+    n_decoys = n_total - n_actives
+    # Rank from worst to best so actives ranked first get the highest ranks
+    ranks = n_total + 1 - _average_ranks(ranked_scores)
+    rank_sum = np.where(ranked_actives, ranks, 0).sum(axis=-1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (rank_sum - n_actives * (n_actives + 1) / 2) / (n_actives * n_decoys)
+
+
+def log_auc(
+    ranked_actives: np.ndarray, lambda_: float = DEFAULT_LOG_AUC_LAMBDA
+) -> np.ndarray:
+    """
+    Calculates the semi-log ROC area over false positive rates [lambda_, 1].
+
+    The area is normalised by ``log10(1 / lambda_)`` so a perfect ranking
+    scores 1; a random ranking scores about 0.145 for the default lambda.
+
+    Args:
+        ranked_actives: Ranked activity labels, shape (n,) or (batch, n).
+        lambda_: The lowest false positive rate taken into account.
+
+    Returns:
+        The normalised logAUC. NaN without both actives and decoys.
+    """
+    decoys = ~ranked_actives
+    n_actives = ranked_actives.sum(axis=-1, keepdims=True)
+    n_decoys = decoys.sum(axis=-1, keepdims=True)
+    seen_actives = np.cumsum(ranked_actives, axis=-1)
+    seen_decoys = np.cumsum(decoys, axis=-1)
+
+    # Each decoy closes a horizontal ROC segment at the current TPR
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fpr_end = np.clip(seen_decoys / n_decoys, lambda_, 1.0)
+        fpr_start = np.clip((seen_decoys - 1) / n_decoys, lambda_, 1.0)
+        width = np.where(decoys, np.log10(fpr_end) - np.log10(fpr_start), 0.0)
+        area = (width * seen_actives).sum(axis=-1) / n_actives[..., 0]
+        return area / np.log10(1 / lambda_)
+
+
+def rie(ranked_actives: np.ndarray, alpha: float = DEFAULT_ALPHA) -> np.ndarray:
+    """
+    Calculates the Robust Initial Enhancement (RIE).
+
+    Args:
+        ranked_actives: Ranked activity labels, shape (n,) or (batch, n).
+        alpha: The exponential weighting factor.
+
+    Returns:
+        The RIE. NaN where the screen contains no actives.
+    """
+    n_total = ranked_actives.shape[-1]
+    n_actives = ranked_actives.sum(axis=-1)
+    weights = np.exp(-alpha * np.arange(1, n_total + 1) / n_total)
+    observed = (ranked_actives * weights).sum(axis=-1)
+    random = (n_actives / n_total) * (
+        (1 - np.exp(-alpha)) / (np.exp(alpha / n_total) - 1)
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return observed / random
+
+
+def bedroc(ranked_actives: np.ndarray, alpha: float = DEFAULT_ALPHA) -> np.ndarray:
+    """
+    Calculates the Boltzmann-Enhanced Discrimination of ROC (BEDROC).
+
+    Args:
+        ranked_actives: Ranked activity labels, shape (n,) or (batch, n).
+        alpha: The exponential weighting factor; 20 weights roughly the top 8%.
+
+    Returns:
+        The BEDROC score in [0, 1]. NaN where the screen contains no actives.
+    """
+    n_total = ranked_actives.shape[-1]
+    ratio = ranked_actives.sum(axis=-1) / n_total
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scale = (
+            ratio
+            * np.sinh(alpha / 2)
+            / (np.cosh(alpha / 2) - np.cosh(alpha / 2 - alpha * ratio))
+        )
+        offset = 1 / (1 - np.exp(alpha * (1 - ratio)))
+        return rie(ranked_actives, alpha) * scale + offset
+
+
+def _metric_table(
+    ranked_actives: np.ndarray,
+    ranked_scores: np.ndarray,
+    percentiles,
+    alpha: float,
+    log_auc_lambda: float,
+) -> dict[str, np.ndarray]:
+    """Computes every metric for ranked input of shape (n,) or (batch, n)."""
+    metrics = {"auc": roc_auc(ranked_actives, ranked_scores)}
+    efs = enrichment_factors(ranked_actives, percentiles)
+    for i, percentile in enumerate(percentiles):
+        metrics[f"ef_{percentile:g}"] = efs[..., i]
+    metrics["log_auc"] = log_auc(ranked_actives, log_auc_lambda)
+    metrics["bedroc"] = bedroc(ranked_actives, alpha)
+    metrics["rie"] = rie(ranked_actives, alpha)
+    return metrics
+
+
+def calculate_metrics(
+    df: pd.DataFrame,
+    active_column: str,
+    score_column: str,
+    percentiles=DEFAULT_PERCENTILES,
+    alpha: float = DEFAULT_ALPHA,
+    log_auc_lambda: float = DEFAULT_LOG_AUC_LAMBDA,
+) -> dict[str, float]:
+    """
+    Calculates all virtual-screening metrics for one screen after a single sort.
+
+    Args:
+        df: DataFrame with docking results.
+        active_column: Name of the column indicating active compounds.
+        score_column: Name of the column with docking scores (lower is better).
+        percentiles: The percentiles at which to calculate enrichment factors.
+        alpha: The weighting factor for BEDROC and RIE.
+        log_auc_lambda: The lowest false positive rate for logAUC.
+
+    Returns:
+        A dictionary mapping metric names (``auc``, ``ef_<percentile>``,
+        ``log_auc``, ``bedroc``, ``rie``) to their values.
+    """
+    ranked_actives, ranked_scores = rank_by_score(df[active_column], df[score_column])
+    metrics = _metric_table(
+        ranked_actives, ranked_scores, percentiles, alpha, log_auc_lambda
+    )
+    return {name: float(value) for name, value in metrics.items()}
+
+
+def bootstrap_metrics(
+    df: pd.DataFrame,
+    active_column: str,
+    score_column: str,
+    percentiles=DEFAULT_PERCENTILES,
+    alpha: float = DEFAULT_ALPHA,
+    log_auc_lambda: float = DEFAULT_LOG_AUC_LAMBDA,
+    n_bootstrap: int = 1000,
+    confidence: float = 0.95,
+    batch_size: int | None = None,
+    seed: int | None = None,
+) -> pd.DataFrame:
+    """
+    Calculates all metrics with percentile bootstrap confidence intervals.
+
+    Resamples are drawn as positions into the already ranked screen; sorting
+    the drawn positions yields each resample's ranking without re-sorting
+    scores. Resamples are evaluated in batches of shape (batch_size, n).
+
+    Args:
+        df: DataFrame with docking results.
+        active_column: Name of the column indicating active compounds.
+        score_column: Name of the column with docking scores (lower is better).
+        percentiles: The percentiles at which to calculate enrichment factors.
+        alpha: The weighting factor for BEDROC and RIE.
+        log_auc_lambda: The lowest false positive rate for logAUC.
+        n_bootstrap: The number of bootstrap resamples.
+        confidence: The confidence level of the intervals.
+        batch_size: Resamples evaluated at once. Defaults to batches of about
+            one million ranked entries, which keeps temporaries cache-friendly.
+        seed: Seed for the random number generator.
+
+    Returns:
+        A DataFrame indexed by metric with ``value``, ``ci_lower`` and
+        ``ci_upper`` columns.
+    """
+    ranked_actives, ranked_scores = rank_by_score(df[active_column], df[score_column])
+    n_total = len(ranked_actives)
+    if batch_size is None:
+        batch_size = max(1, 2**20 // max(n_total, 1))
+
+    rng = np.random.default_rng(seed)
+    samples: dict[str, list[np.ndarray]] = {}
+    for start in range(0, n_bootstrap, batch_size):
+        size = min(batch_size, n_bootstrap - start)
+        positions = rng.integers(0, n_total, size=(size, n_total), dtype=np.int32)
+        positions.sort(axis=1)
+        batch = _metric_table(
+            ranked_actives[positions],
+            ranked_scores[positions],
+            percentiles,
+            alpha,
+            log_auc_lambda,
+        )
+        for name, values in batch.items():
+            samples.setdefault(name, []).append(values)
+
+    point = calculate_metrics(
+        df, active_column, score_column, percentiles, alpha, log_auc_lambda
+    )
+    import pandas as pd
+
+    tail = (1 - confidence) / 2 * 100
+    rows = {}
+    for name, values in samples.items():
+        lower, upper = np.nanpercentile(np.concatenate(values), [tail, 100 - tail])
+        rows[name] = {"value": point[name], "ci_lower": lower, "ci_upper": upper}
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+
+def evaluate_targets(
+    df: pd.DataFrame,
+    target_column: str,
+    active_column: str,
+    score_column: str,
+    **kwargs,
+) -> pd.DataFrame:
+    """
+    Calculates all metrics for each benchmark target in a combined DataFrame.
+
+    Args:
+        df: DataFrame with docking results for many targets.
+        target_column: Name of the column identifying the target.
+        active_column: Name of the column indicating active compounds.
+        score_column: Name of the column with docking scores (lower is better).
+        **kwargs: Passed on to `calculate_metrics`.
+
+    Returns:
+        A DataFrame with one row of metrics per target.
+    """
+    import pandas as pd
+
+    rows = {
+        target: calculate_metrics(group, active_column, score_column, **kwargs)
+        for target, group in df.groupby(target_column, sort=True)
+    }
+    return pd.DataFrame.from_dict(rows, orient="index").rename_axis(target_column)
 
-import pandas as pd
-from sklearn.metrics import roc_auc_score
 
 def calculate_enrichment_factor(
     df: pd.DataFrame, active_column: str, score_column: str, percentile: float
@@ -17,18 +338,8 @@ def calculate_enrichment_factor(
     Returns:
         The enrichment factor.
     """
-    n_total = len(df)
-    n_actives_total = df[active_column].sum()
-
-    df_sorted = df.sort_values(score_column)
-    top_percentile_df = df_sorted.head(int(n_total * percentile / 100))
-
-    n_actives_top = top_percentile_df[active_column].sum()
-    enrichment_factor = (n_actives_top / len(top_percentile_df)) / (
-        n_actives_total / n_total
-    )
-
-    return enrichment_factor
+    ranked_actives, _ = rank_by_score(df[active_column], df[score_column])
+    return float(enrichment_factors(ranked_actives, [percentile])[0])
 
 def calculate_auc(df: pd.DataFrame, active_column: str, score_column: str) -> float:
     """
@@ -42,6 +353,5 @@ def calculate_auc(df: pd.DataFrame, active_column: str, score_column: str) -> fl
     Returns:
         The AUC score.
     """
-    y_true = df[active_column]
-    y_scores = -df[score_column]  # Negate scores because lower is better
-    return roc_auc_score(y_true, y_scores)
+    ranked_actives, ranked_scores = rank_by_score(df[active_column], df[score_column])
+    return float(roc_auc(ranked_actives, ranked_scores))
@@ -0,0 +1,260 @@
+# Active-Learning Prioritisation of Docking
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable
+
+import numpy as np
+from rdkit import Chem, DataStructs
+
+from .screening import dock_molecules
+from ..preprocessing.clustering import compute_fingerprints
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def fingerprint_matrix(
+    molecules: Iterable[Chem.Mol],
+    radius: int = 2,
+    fp_size: int = 2048,
+    num_threads: int = 0,
+) -> np.ndarray:
+    """
+    Computes Morgan fingerprints as a bit-packed matrix.
+
+    Rows are stored with `numpy.packbits`, eight bits per byte, so a library
+    of a million molecules takes 256 MB at the default size; batches are
+    unpacked to features only when they are needed.
+
+    Args:
+        molecules: An iterable of RDKit Mol objects.
+        radius: The Morgan radius.
+        fp_size: The fingerprint length in bits, a multiple of 8.
+        num_threads: Threads for fingerprint generation; 0 uses all cores.
+
+    Returns:
+        A uint8 array of shape ``(num_molecules, fp_size // 8)``.
+    """
+    bits = np.zeros(fp_size, dtype=np.uint8)
+    rows = []
+    for fp in compute_fingerprints(
+        molecules, radius=radius, fp_size=fp_size, num_threads=num_threads
+    ):
+        DataStructs.ConvertToNumpyArray(fp, bits)
+        rows.append(np.packbits(bits))
+    if not rows:
+        return np.zeros((0, fp_size // 8), dtype=np.uint8)
+    return np.vstack(rows)
+
+
+def default_surrogate(seed: int = 42):
+    """Returns the default surrogate, a random forest on fingerprint bits."""
+    # scikit-learn is only needed when active learning is used
+    from sklearn.ensemble import RandomForestRegressor
+
+    return RandomForestRegressor(
+        n_estimators=100, max_features="sqrt", n_jobs=-1, random_state=seed
+    )
+
+
+def predict_in_batches(model, features: np.ndarray, batch_size: int = 100_000):
+    """
+    Predicts scores for packed fingerprints, unpacking one batch at a time.
+
+    Args:
+        model: A fitted scikit-learn regressor.
+        features: Bit-packed fingerprints, see `fingerprint_matrix`.
+        batch_size: The number of molecules unpacked and predicted at once.
+
+    Returns:
+        The predicted score of each row.
+    """
+    predictions = np.empty(len(features))
+    for start in range(0, len(features), batch_size):
+        batch = np.unpackbits(features[start : start + batch_size], axis=1)
+        predictions[start : start + len(batch)] = model.predict(batch)
+    return predictions
+
+
+def active_learning_screen(
+    features: np.ndarray,
+    dock: Callable[[np.ndarray], dict[int, float]],
+    initial_size: int,
+    batch_size: int,
+    num_rounds: int = 5,
+    model=None,
+    prediction_batch_size: int = 100_000,
+    seed: int = 42,
+) -> tuple[dict[int, float], list[dict]]:
+    """
+    Docks a library in rounds, choosing each round with a surrogate model.
+
+    A random seed batch is docked first. After every round, the surrogate is
+    refitted on all scores so far and the ``batch_size`` undocked molecules
+    with the best (lowest) predicted scores are docked next. Failed dockings
+    are not retried.
+
+    Args:
+        features: Bit-packed fingerprints of the library, one row per molecule.
+        dock: Docks the molecules at the given indices and returns the scores
+            of those that succeeded, by index.
+        initial_size: The size of the random seed batch.
+        batch_size: The number of molecules docked in each later round.
+        num_rounds: The number of model-guided rounds after the seed batch.
+        model: A scikit-learn regressor, cloned before each fit. Defaults to
+            `default_surrogate`.
+        prediction_batch_size: The number of molecules predicted at once.
+        seed: Seed for the random seed batch and the default surrogate.
+
+    Returns:
+        The scores of all docked molecules by index, and one history entry per
+        round with the indices docked in it (``batch``) and running totals.
+    """
+    from sklearn.base import clone
+
+    if model is None:
+        model = default_surrogate(seed)
+
+    rng = np.random.default_rng(seed)
+    num_molecules = len(features)
+    docked = np.zeros(num_molecules, dtype=bool)
+    batch = rng.choice(
+        num_molecules, size=min(initial_size, num_molecules), replace=False
+    )
+    scores: dict[int, float] = {}
+    history = []
+    for round_index in range(num_rounds + 1):
+        docked[batch] = True
+        scores.update(dock(batch))
+        history.append(
+            {
+                "round": round_index,
+                "batch": batch.tolist(),
+                "docked": int(docked.sum()),
+                "scored": len(scores),
+                "best_score": min(scores.values(), default=None),
+            }
+        )
+
+        remaining = np.flatnonzero(~docked)
+        if round_index == num_rounds or remaining.size == 0 or not scores:
+            break
+
+        trained = np.fromiter(scores, dtype=np.int64, count=len(scores))
+        surrogate = clone(model).fit(
+            np.unpackbits(features[trained], axis=1),
+            np.fromiter(scores.values(), dtype=float, count=len(scores)),
+        )
+        predictions = predict_in_batches(
+            surrogate, features[remaining], prediction_batch_size
+        )
+        size = min(batch_size, remaining.size)
+        best = np.argpartition(predictions, size - 1)[:size]
+        batch = remaining[best[np.argsort(predictions[best])]]
+    return scores, history
+
+
+def run_active_learning_docking(
+    molecules: list[Chem.Mol],
+    protein_pdbqt: Path,
+    binding_site: dict,
+    output_dir: Path,
+    num_rounds: int = 5,
+    fraction: float = 0.01,
+    initial_fraction: float | None = None,
+    model=None,
+    seed: int = 42,
+    conformer_options: dict | None = None,
+    docking_options: dict | None = None,
+) -> tuple[dict[str, float], list[dict]]:
+    """
+    Docks the most promising part of a library using active learning.
+
+    Args:
+        molecules: The named molecules to screen, see `assign_names`.
+        protein_pdbqt: Path to the prepared protein file in PDBQT format.
+        binding_site: Dictionary defining the docking box (center and size).
+        output_dir: The pipeline output directory.
+        num_rounds: The number of model-guided rounds after the seed batch.
+        fraction: The fraction of the library docked in each guided round.
+        initial_fraction: The fraction docked in the random seed batch;
+            defaults to ``fraction``.
+        model: A scikit-learn regressor; defaults to `default_surrogate`.
+        seed: Seed for the random seed batch and the default surrogate.
+        conformer_options: Keyword arguments for `generate_conformers`.
+        docking_options: Extra keyword arguments for `run_parallel_docking`.
+
+    Returns:
+        The best docking score of every docked molecule by name, and the
+        per-round history with the compounds docked in each round
+        (``compounds``) in place of indices.
+    """
+    names = [mol.GetProp("_Name") for mol in molecules]
+    index = {name: i for i, name in enumerate(names)}
+    if initial_fraction is None:
+        initial_fraction = fraction
+
+    def dock(batch: np.ndarray) -> dict[int, float]:
+        print(f"Docking {len(batch)} of {len(molecules)} compounds")
+        scores = dock_molecules(
+            [molecules[i] for i in batch],
+            protein_pdbqt,
+            binding_site,
+            output_dir,
+            conformer_options,
+            docking_options,
+        )
+        return {index[name]: score for name, score in scores.items()}
+
+    scores, history = active_learning_screen(
+        fingerprint_matrix(molecules),
+        dock,
+        initial_size=max(1, round(len(molecules) * initial_fraction)),
+        batch_size=max(1, round(len(molecules) * fraction)),
+        num_rounds=num_rounds,
+        model=model,
+        seed=seed,
+    )
+    for entry in history:
+        entry["compounds"] = [names[i] for i in entry.pop("batch")]
+    return {names[i]: score for i, score in scores.items()}, history
+
+
+def recall_report(
+    history: list[dict], reference: pd.DataFrame, top_fraction: float = 0.01
+) -> pd.DataFrame:
+    """
+    Measures how much of a full screen's top hits each round has recovered.
+
+    Args:
+        history: Per-round history from `run_active_learning_docking`.
+        reference: Results of docking the full library, with ``compound`` and
+            ``affinity`` columns (such as ``ranked_results.csv``).
+        top_fraction: The fraction of the reference counted as top hits.
+
+    Returns:
+        One row per round with the number and fraction of the library docked
+        so far and the recall of the reference top hits.
+    """
+    import pandas as pd
+
+    best = reference.groupby("compound")["affinity"].min()
+    num_top = max(1, int(np.ceil(len(best) * top_fraction)))
+    top_hits = set(best.nsmallest(num_top).index)
+
+    rows = []
+    docked: set[str] = set()
+    for entry in history:
+        docked.update(entry["compounds"])
+        rows.append(
+            {
+                "round": entry["round"],
+                "docked": len(docked),
+                "fraction_docked": len(docked) / len(best),
+                "top_hits": num_top,
+                "recovered": len(top_hits & docked),
+                "recall": len(top_hits & docked) / num_top,
+            }
+        )
+    return pd.DataFrame(rows)
@@ -0,0 +1,315 @@
+# Blind Docking over Overlapping Sub-Boxes of the Protein Surface
+import csv
+import itertools
+import math
+from pathlib import Path
+
+import numpy as np
+
+from ..analysis.results import parse_score_remark
+from .parallel_dock import run_parallel_docking
+from .progress import SNAPSHOT_FILENAME
+
+SITES_DIRNAME = "blind_sites"
+SITES_SUMMARY = "blind_sites.csv"
+
+# PDBQT atom types of hydrogens, which are left out of pose comparisons
+HYDROGEN_TYPES = ("H", "HD", "HS")
+
+
+def receptor_coordinates(protein_pdbqt: Path) -> np.ndarray:
+    """Returns the heavy-atom coordinates of a PDBQT receptor, shape (n, 3)."""
+    coordinates = []
+    with open(protein_pdbqt) as f:
+        for line in f:
+            if line.startswith(("ATOM", "HETATM")):
+                if line[77:79].strip() in HYDROGEN_TYPES:
+                    continue
+                coordinates.append(
+                    (float(line[30:38]), float(line[38:46]), float(line[46:54]))
+                )
+    return np.array(coordinates, dtype=float).reshape(-1, 3)
+
+
+def surface_points(
+    atoms: np.ndarray,
+    spacing: float = 2.0,
+    min_distance: float = 3.0,
+    max_distance: float = 5.0,
+) -> np.ndarray:
+    """
+    Samples the shell around a protein where a ligand can bind.
+
+    Args:
+        atoms: Protein heavy-atom coordinates, shape (n, 3).
+        spacing: Grid spacing of the samples in Angstroms.
+        min_distance: Closest a sample may be to a protein atom.
+        max_distance: Farthest a sample may be from every protein atom.
+
+    Returns:
+        The grid points between ``min_distance`` and ``max_distance`` from
+        the nearest atom, shape (m, 3).
+    """
+    from scipy.spatial import cKDTree
+
+    lower = atoms.min(axis=0) - max_distance
+    upper = atoms.max(axis=0) + max_distance
+    axes = [np.arange(lo, hi + spacing, spacing) for lo, hi in zip(lower, upper)]
+    grid = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+    # Points beyond max_distance from every atom come back as inf; the bound
+    # is exclusive, so it is nudged to keep points exactly at max_distance
+    nearest, _ = cKDTree(atoms).query(
+        grid, distance_upper_bound=np.nextafter(max_distance, np.inf)
+    )
+    return grid[(nearest >= min_distance) & (nearest <= max_distance)]
+
+
+def tile_binding_sites(
+    protein_pdbqt: Path,
+    box_size: float = 20.0,
+    overlap: float = 0.25,
+) -> list[dict]:
+    """
+    Tiles the protein surface with overlapping docking boxes.
+
+    The protein's bounding box, padded by the binding shell, is covered by a
+    regular grid of cubic boxes that overlap by ``overlap`` of their edge.
+    Only boxes containing part of the shell (see `surface_points`) are kept,
+    so no search is wasted inside the protein core or in open solvent, and
+    every point of the shell lies in at least one box.
+
+    Args:
+        protein_pdbqt: Path to the prepared protein file in PDBQT format.
+        box_size: The edge of every sub-box in Angstroms.
+        overlap: Fraction of the edge shared by neighbouring boxes, so that
+            pockets on a box boundary are searched whole by a neighbour.
+
+    Returns:
+        The sub-boxes as binding site dictionaries.
+    """
+    if not 0 <= overlap < 1:
+        raise ValueError(f"The overlap must be in [0, 1), got {overlap}")
+    atoms = receptor_coordinates(protein_pdbqt)
+    if len(atoms) == 0:
+        raise ValueError(f"No receptor atoms found in {protein_pdbqt}")
+    shell = surface_points(atoms)
+
+    stride = box_size * (1 - overlap)
+    lower = shell.min(axis=0)
+    extent = shell.max(axis=0) - lower
+    counts = [max(1, math.ceil((edge - box_size) / stride) + 1) for edge in extent]
+    # Centre the tiling on the shell
+    origin = lower + (extent - ((np.array(counts) - 1) * stride + box_size)) / 2
+
+    sites = []
+    for index in itertools.product(*(range(count) for count in counts)):
+        low = origin + np.array(index) * stride
+        inside = np.all((shell >= low) & (shell <= low + box_size), axis=1)
+        if inside.any():
+            center = low + box_size / 2
+            sites.append(
+                {
+                    "center_x": float(center[0]),
+                    "center_y": float(center[1]),
+                    "center_z": float(center[2]),
+                    "size_x": float(box_size),
+                    "size_y": float(box_size),
+                    "size_z": float(box_size),
+                }
+            )
+    return sites
+
+
+def read_poses(pdbqt_file: Path) -> list[dict]:
+    """
+    Reads the poses of a docking output file.
+
+    Returns:
+        One dictionary per model with its ``score``, its PDBQT ``lines`` and
+        its heavy-atom ``coordinates``.
+    """
+    poses = []
+    lines = []
+    with open(pdbqt_file) as f:
+        for line in f:
+            if line.startswith("MODEL"):
+                lines = []
+            lines.append(line)
+            if line.startswith("ENDMDL"):
+                poses.append(lines)
+                lines = []
+    if lines and not poses:
+        # Single-pose output without MODEL records
+        poses.append(lines)
+
+    parsed = []
+    for lines in poses:
+        score = next(
+            (s for s in map(parse_score_remark, lines) if s is not None), None
+        )
+        coordinates = [
+            (float(line[30:38]), float(line[38:46]), float(line[46:54]))
+            for line in lines
+            if line.startswith(("ATOM", "HETATM"))
+            and line[77:79].strip() not in HYDROGEN_TYPES
+        ]
+        if score is not None:
+            parsed.append(
+                {
+                    "score": score,
+                    "lines": lines,
+                    "coordinates": np.array(coordinates, dtype=float),
+                }
+            )
+    return parsed
+
+
+def merge_poses(
+    site_poses: list[list[dict]], rmsd_threshold: float = 2.0
+) -> list[dict]:
+    """
+    Merges poses docked in several sub-boxes, dropping duplicates.
+
+    Poses are taken best score first, and a pose is dropped when it lies
+    within ``rmsd_threshold`` of a pose already kept; overlapping boxes
+    often find the same pose. Poses of one ligand share its atom order, so
+    the RMSD is computed in place without alignment.
+
+    Args:
+        site_poses: The poses of each sub-box, see `read_poses`.
+        rmsd_threshold: Heavy-atom RMSD in Angstroms below which poses are
+            duplicates.
+
+    Returns:
+        The distinct poses, best first, each with its ``site`` index.
+    """
+    candidates = sorted(
+        (
+            {**pose, "site": site}
+            for site, poses in enumerate(site_poses)
+            for pose in poses
+        ),
+        key=lambda pose: pose["score"],
+    )
+    kept = []
+    for pose in candidates:
+        duplicate = any(
+            len(pose["coordinates"]) == len(other["coordinates"])
+            and np.sqrt(
+                ((pose["coordinates"] - other["coordinates"]) ** 2)
+                .sum(axis=1)
+                .mean()
+            )
+            < rmsd_threshold
+            for other in kept
+        )
+        if not duplicate:
+            kept.append(pose)
+    return kept
+
+
+def write_poses(poses: list[dict], output_pdbqt: Path):
+    """Writes merged poses as models of one PDBQT file, tagged with their site."""
+    with open(output_pdbqt, "w") as f:
+        for model, pose in enumerate(poses, start=1):
+            f.write(f"MODEL {model}\n")
+            for line in pose["lines"]:
+                if line.startswith(("MODEL", "ENDMDL")):
+                    continue
+                f.write(line)
+                if parse_score_remark(line) is not None:
+                    f.write(f"REMARK NATURADOCK SITE {pose['site']}\n")
+            f.write("ENDMDL\n")
+
+
+def run_blind_docking(
+    protein_pdbqt: Path,
+    prepared_compounds: list[Path],
+    docking_results_dir: Path,
+    box_size: float = 20.0,
+    overlap: float = 0.25,
+    rmsd_threshold: float = 2.0,
+    **docking_options,
+) -> list[dict]:
+    """
+    Docks compounds over the whole protein surface in parallel sub-boxes.
+
+    Instead of one long search per ligand in a box around the whole protein,
+    every ligand is docked into each sub-box of `tile_binding_sites` as an
+    independent job. The short jobs keep every worker busy, and each search
+    space is small enough for the default exhaustiveness. A ligand's poses
+    from all sub-boxes are merged with `merge_poses` into
+    ``<compound>_docked.pdbqt``, so the usual analysis applies. The best
+    score and sub-box of every ligand are written to ``blind_sites.csv``.
+
+    Args:
+        protein_pdbqt: Path to the prepared protein file in PDBQT format.
+        prepared_compounds: List of paths to prepared compound files in PDBQT format.
+        docking_results_dir: Path to the directory to write the merged poses.
+        box_size: The edge of every sub-box in Angstroms.
+        overlap: Fraction of the edge shared by neighbouring sub-boxes.
+        rmsd_threshold: Heavy-atom RMSD below which poses are duplicates.
+        **docking_options: Passed on to `run_parallel_docking`; affinity
+            maps are computed for one box only and are not supported.
+
+    Returns:
+        One summary per docked ligand with its ``compound``, best
+        ``affinity``, best ``site`` and that site's centre.
+    """
+    sites = tile_binding_sites(protein_pdbqt, box_size, overlap)
+    print(
+        f"Blind docking into {len(sites)} sub-boxes of {box_size:g} A "
+        f"({len(sites) * len(prepared_compounds)} jobs)"
+    )
+    sites_dir = docking_results_dir / SITES_DIRNAME
+    sites_dir.mkdir(parents=True, exist_ok=True)
+    docking_options.setdefault("snapshot_path", docking_results_dir / SNAPSHOT_FILENAME)
+    run_parallel_docking(
+        protein_pdbqt=protein_pdbqt,
+        prepared_compounds=prepared_compounds,
+        binding_site=sites,
+        docking_results_dir=sites_dir,
+        **docking_options,
+    )
+
+    summaries = []
+    for compound_pdbqt in prepared_compounds:
+        site_poses = []
+        for site in range(len(sites)):
+            output_pdbqt = sites_dir / f"{compound_pdbqt.stem}_site{site}_docked.pdbqt"
+            site_poses.append(read_poses(output_pdbqt) if output_pdbqt.exists() else [])
+        poses = merge_poses(site_poses, rmsd_threshold)
+        if not poses:
+            continue
+        write_poses(poses, docking_results_dir / f"{compound_pdbqt.stem}_docked.pdbqt")
+        best = sites[poses[0]["site"]]
+        summaries.append(
+            {
+                "compound": compound_pdbqt.stem,
+                "affinity": poses[0]["score"],
+                "site": poses[0]["site"],
+                "center_x": best["center_x"],
+                "center_y": best["center_y"],
+                "center_z": best["center_z"],
+                "distinct_poses": len(poses),
+            }
+        )
+
+    summary_path = docking_results_dir.parent / SITES_SUMMARY
+    with open(summary_path, "w", newline="") as f:
+        writer = csv.DictWriter(
+            f,
+            fieldnames=[
+                "compound",
+                "affinity",
+                "site",
+                "center_x",
+                "center_y",
+                "center_z",
+                "distinct_poses",
+            ],
+        )
+        writer.writeheader()
+        writer.writerows(summaries)
+    print(f"Best sites of {len(summaries)} ligands saved to {summary_path}")
+    return summaries
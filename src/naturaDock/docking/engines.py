@@ -0,0 +1,206 @@
+# Docking Engine Registry
+import os
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass(frozen=True)
+class DockingEngine:
+    """
+    A Vina-compatible docking program and how to drive it.
+
+    Engines share Vina's command-line conventions (``--receptor``,
+    ``--ligand``, ``--out``, box, ``--cpu``, ``--exhaustiveness``,
+    ``--seed``) and write multi-model PDBQT output with one score remark per
+    pose. Differences are described by the fields below.
+
+    Attributes:
+        name: The name used on the command line and in TOML configs.
+        executables: Executable names searched for on the system PATH.
+        env_var: Environment variable overriding the executable path.
+        score_remark: The remark line prefix preceding each pose's score.
+        supports_maps: Whether precomputed affinity maps can be written with
+            ``--write_maps`` and loaded with ``--maps``.
+        supports_scoring: Whether ``--scoring`` selects the scoring function.
+    """
+
+    name: str
+    executables: tuple[str, ...]
+    env_var: str
+    score_remark: str = "REMARK VINA RESULT:"
+    supports_maps: bool = False
+    supports_scoring: bool = False
+
+    def find_executable(self) -> str:
+        """
+        Finds the engine executable, checking in order:
+        1. The engine's environment variable
+        2. System PATH
+        3. ``<executable>.exe`` in the project root (Windows local install)
+
+        Raises:
+            FileNotFoundError: If the executable cannot be found.
+        """
+        if self.env_var in os.environ:
+            return os.environ[self.env_var]
+
+        for executable in self.executables:
+            found = shutil.which(executable)
+            if found:
+                return found
+
+        project_root = Path(__file__).parent.parent.parent
+        for executable in self.executables:
+            local = project_root / f"{executable}.exe"
+            if local.exists():
+                return str(local)
+
+        raise FileNotFoundError(
+            f"{self.name} not found. Install it, add it to PATH, "
+            f"or set the {self.env_var} environment variable."
+        )
+
+    def build_command(
+        self,
+        executable: str,
+        protein_pdbqt: Path,
+        compound_pdbqt: Path,
+        binding_site: dict,
+        output_pdbqt: Path,
+        maps: Path | None = None,
+        exhaustiveness: int | None = None,
+        seed: int | None = None,
+        scoring: str | None = None,
+        cpu: int = 1,
+    ) -> list[str]:
+        """
+        Builds the command line docking one ligand.
+
+        Args:
+            executable: Path to the engine executable.
+            protein_pdbqt: Path to the prepared protein file in PDBQT format.
+            compound_pdbqt: Path to the prepared ligand file in PDBQT format.
+            binding_site: Dictionary defining the docking box (center and size).
+            output_pdbqt: Path to write the docked poses to.
+            maps: Precomputed affinity maps prefix replacing receptor and box.
+            exhaustiveness: Search exhaustiveness; the engine default if None.
+            seed: Random seed; the engine picks one if None.
+            scoring: Scoring function; the engine default if None.
+            cpu: The number of CPUs the engine may use.
+
+        Returns:
+            The command as a list of arguments.
+
+        Raises:
+            ValueError: If an option is not supported by the engine.
+        """
+        if maps is not None and not self.supports_maps:
+            raise ValueError(f"{self.name} does not support precomputed maps.")
+        if scoring is not None and not self.supports_scoring:
+            raise ValueError(f"{self.name} does not support --scoring.")
+
+        if maps is not None:
+            command = [
+                executable,
+                "--maps", str(maps),
+                "--ligand", str(compound_pdbqt),
+                "--out", str(output_pdbqt),
+                "--cpu", str(cpu),
+            ]
+        else:
+            command = [
+                executable,
+                "--receptor", str(protein_pdbqt),
+                "--ligand", str(compound_pdbqt),
+                "--out", str(output_pdbqt),
+                "--center_x", str(binding_site["center_x"]),
+                "--center_y", str(binding_site["center_y"]),
+                "--center_z", str(binding_site["center_z"]),
+                "--size_x", str(binding_site["size_x"]),
+                "--size_y", str(binding_site["size_y"]),
+                "--size_z", str(binding_site["size_z"]),
+                "--cpu", str(cpu),
+            ]
+        if exhaustiveness is not None:
+            command += ["--exhaustiveness", str(exhaustiveness)]
+        if seed is not None:
+            command += ["--seed", str(seed)]
+        if scoring is not None:
+            command += ["--scoring", scoring]
+        return command
+
+    def parse_score(self, pdbqt_file: Path) -> float | None:
+        """
+        Parses the best (first) pose's score from an output PDBQT file.
+
+        Args:
+            pdbqt_file: Path to the engine's output file.
+
+        Returns:
+            The score in kcal/mol, or None if not found.
+        """
+        with open(pdbqt_file, "r") as f:
+            for line in f:
+                if line.startswith(self.score_remark):
+                    return float(line[len(self.score_remark) :].split()[0])
+        return None
+
+
+ENGINES: dict[str, DockingEngine] = {}
+
+
+def register_engine(engine: DockingEngine) -> DockingEngine:
+    """Adds an engine to the registry, replacing any engine of the same name."""
+    ENGINES[engine.name] = engine
+    return engine
+
+
+def get_engine(name: str) -> DockingEngine:
+    """
+    Looks up a registered engine by name.
+
+    Raises:
+        ValueError: If no engine of that name is registered.
+    """
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown docking engine: {name}. "
+            f"Available engines: {', '.join(sorted(ENGINES))}"
+        ) from None
+
+
+register_engine(
+    DockingEngine(
+        name="vina",
+        executables=("vina",),
+        env_var="VINA_EXECUTABLE",
+        supports_maps=True,
+        supports_scoring=True,
+    )
+)
+register_engine(
+    DockingEngine(
+        name="qvina-w",
+        executables=("qvina-w", "qvinaw"),
+        env_var="QVINAW_EXECUTABLE",
+    )
+)
+register_engine(
+    DockingEngine(
+        name="qvina2",
+        executables=("qvina2.1", "qvina2"),
+        env_var="QVINA2_EXECUTABLE",
+    )
+)
+register_engine(
+    DockingEngine(
+        name="smina",
+        executables=("smina", "smina.static"),
+        env_var="SMINA_EXECUTABLE",
+        score_remark="REMARK minimizedAffinity",
+        supports_scoring=True,
+    )
+)
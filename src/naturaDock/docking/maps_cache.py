@@ -0,0 +1,246 @@
+# On-Disk Cache of Vina Affinity Maps
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import time
+from pathlib import Path
+
+from .vina_dock import get_vina_executable
+
+MAPS_PREFIX = "receptor"
+COMPLETE_MARKER = "complete"
+LOCK_SUFFIX = ".lock"
+
+
+def default_cache_dir() -> Path:
+    """Returns ``NATURADOCK_MAPS_CACHE`` or ``~/.cache/naturaDock/maps``."""
+    if "NATURADOCK_MAPS_CACHE" in os.environ:
+        return Path(os.environ["NATURADOCK_MAPS_CACHE"])
+    return Path.home() / ".cache" / "naturaDock" / "maps"
+
+
+def _file_digest(path: Path) -> str:
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def maps_key(
+    protein_pdbqt: Path,
+    binding_site: dict,
+    spacing: float = 0.375,
+    scoring: str = "vina",
+) -> str:
+    """
+    Computes the cache key of a set of affinity maps.
+
+    Args:
+        protein_pdbqt: Path to the prepared protein file in PDBQT format.
+        binding_site: Dictionary defining the docking box (center and size).
+        spacing: The grid spacing in Angstrom.
+        scoring: The Vina scoring function.
+
+    Returns:
+        A hex digest of the receptor contents, box, spacing and scoring function.
+    """
+    box = {key: round(float(value), 3) for key, value in sorted(binding_site.items())}
+    parameters = json.dumps(
+        {"box": box, "spacing": spacing, "scoring": scoring}, sort_keys=True
+    )
+    digest = hashlib.sha256(_file_digest(protein_pdbqt).encode("utf-8"))
+    digest.update(parameters.encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+def _write_maps(
+    protein_pdbqt: Path,
+    binding_site: dict,
+    maps_prefix: Path,
+    spacing: float,
+    scoring: str,
+):
+    """Runs Vina to compute the affinity maps of a receptor and box."""
+    command = [
+        get_vina_executable(),
+        "--receptor", str(protein_pdbqt),
+        "--center_x", str(binding_site["center_x"]),
+        "--center_y", str(binding_site["center_y"]),
+        "--center_z", str(binding_site["center_z"]),
+        "--size_x", str(binding_site["size_x"]),
+        "--size_y", str(binding_site["size_y"]),
+        "--size_z", str(binding_site["size_z"]),
+        "--spacing", str(spacing),
+        "--scoring", scoring,
+        "--write_maps", str(maps_prefix),
+    ]
+    print(f"Writing affinity maps: {' '.join(command)}")
+    try:
+        subprocess.run(command, capture_output=True, text=True, check=True)
+    except subprocess.CalledProcessError as e:
+        print(f"Vina map generation failed with exit code {e.returncode}")
+        print("Vina stderr:", e.stderr)
+        raise
+
+
+def _try_lock(lock_path: Path, stale_after: float) -> bool:
+    """Creates the lock file exclusively, breaking it if it is stale."""
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            if time.time() - lock_path.stat().st_mtime > stale_after:
+                print(f"Breaking stale maps cache lock: {lock_path}")
+                lock_path.unlink()
+        except FileNotFoundError:
+            pass
+        return False
+    with os.fdopen(fd, "w") as f:
+        f.write(str(os.getpid()))
+    return True
+
+
+def get_or_create_maps(
+    protein_pdbqt: Path,
+    binding_site: dict,
+    cache_dir: Path | None = None,
+    spacing: float = 0.375,
+    scoring: str = "vina",
+    lock_timeout: float = 3600.0,
+    poll_interval: float = 0.5,
+) -> Path:
+    """
+    Returns cached affinity maps for a receptor and box, computing them once.
+
+    Each entry is built in a private temporary directory and renamed into
+    place, so readers only ever see complete entries. An exclusive lock file
+    ensures that when many workers or runs start together, one computes the
+    maps and the others wait for it. Locks older than ``lock_timeout`` are
+    considered abandoned and broken.
+
+    Args:
+        protein_pdbqt: Path to the prepared protein file in PDBQT format.
+        binding_site: Dictionary defining the docking box (center and size).
+        cache_dir: The cache directory; defaults to `default_cache_dir`.
+        spacing: The grid spacing in Angstrom.
+        scoring: The Vina scoring function.
+        lock_timeout: Seconds after which another process's lock is broken.
+        poll_interval: Seconds between checks while waiting for the lock.
+
+    Returns:
+        The maps prefix to pass to Vina's ``--maps`` option.
+    """
+    cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    key = maps_key(protein_pdbqt, binding_site, spacing, scoring)
+    entry = cache_dir / key
+    lock_path = cache_dir / f"{key}{LOCK_SUFFIX}"
+
+    while not (entry / COMPLETE_MARKER).exists():
+        if not _try_lock(lock_path, lock_timeout):
+            time.sleep(poll_interval)
+            continue
+        try:
+            # Another process may have finished between our check and the lock
+            if (entry / COMPLETE_MARKER).exists():
+                break
+            tmp_entry = cache_dir / f".{key}.{os.getpid()}.tmp"
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            tmp_entry.mkdir()
+            try:
+                _write_maps(
+                    protein_pdbqt,
+                    binding_site,
+                    tmp_entry / MAPS_PREFIX,
+                    spacing,
+                    scoring,
+                )
+                (tmp_entry / "metadata.json").write_text(
+                    json.dumps(
+                        {
+                            "receptor": str(protein_pdbqt),
+                            "binding_site": binding_site,
+                            "spacing": spacing,
+                            "scoring": scoring,
+                        },
+                        indent=2,
+                    )
+                )
+                (tmp_entry / COMPLETE_MARKER).touch()
+                shutil.rmtree(entry, ignore_errors=True)
+                os.replace(tmp_entry, entry)
+            finally:
+                shutil.rmtree(tmp_entry, ignore_errors=True)
+            print(f"Affinity maps cached in {entry}")
+        finally:
+            lock_path.unlink(missing_ok=True)
+
+    # The marker's modification time records when the entry was last used
+    (entry / COMPLETE_MARKER).touch()
+    return entry / MAPS_PREFIX
+
+
+def _entry_size(entry: Path) -> int:
+    """Returns the total size in bytes of the files in a cache entry."""
+    return sum(path.stat().st_size for path in entry.rglob("*") if path.is_file())
+
+
+def evict_maps(
+    cache_dir: Path | None = None,
+    max_age_days: float | None = None,
+    max_size_gb: float | None = None,
+    keep: tuple[str, ...] = (),
+) -> list[Path]:
+    """
+    Removes cache entries unused for too long, then least recently used ones.
+
+    Args:
+        cache_dir: The cache directory; defaults to `default_cache_dir`.
+        max_age_days: Entries last used longer ago than this are removed.
+        max_size_gb: Least recently used entries are removed until the cache
+            is no larger than this.
+        keep: Keys of entries that must not be removed.
+
+    Returns:
+        The removed entries.
+    """
+    cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir()
+    if not cache_dir.is_dir():
+        return []
+
+    entries = []
+    for entry in cache_dir.iterdir():
+        marker = entry / COMPLETE_MARKER
+        if entry.name in keep or not marker.exists():
+            continue
+        entries.append((marker.stat().st_mtime, entry))
+    entries.sort()
+
+    removed = []
+    now = time.time()
+    if max_age_days is not None:
+        while entries and now - entries[0][0] > max_age_days * 86400:
+            removed.append(entries.pop(0)[1])
+    if max_size_gb is not None:
+        kept = [cache_dir / key for key in keep if (cache_dir / key).is_dir()]
+        sizes = {entry: _entry_size(entry) for _, entry in entries}
+        total = sum(sizes.values()) + sum(_entry_size(entry) for entry in kept)
+        while entries and total > max_size_gb * 1024**3:
+            entry = entries.pop(0)[1]
+            total -= sizes[entry]
+            removed.append(entry)
+
+    for entry in removed:
+        # Rename first so no reader can find a partially deleted entry
+        doomed = cache_dir / f".{entry.name}.{os.getpid()}.evicted"
+        try:
+            os.replace(entry, doomed)
+        except OSError:
+            continue
+        shutil.rmtree(doomed, ignore_errors=True)
+        print(f"Evicted affinity maps: {entry.name}")
+    return removed
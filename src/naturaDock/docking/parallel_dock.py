@@ -1,53 +1,197 @@
 
 import concurrent.futures
+import multiprocessing
 from pathlib import Path
+from typing import Sequence
 from tqdm import tqdm
 import psutil
 
+from .engines import get_engine
 from .vina_dock import run_vina_docking
+from .progress import DockingProgress, SNAPSHOT_FILENAME
+from .placement import CpuTopology, format_placement, pin_worker, plan_placement
+from .result_cache import ResultCache
 
 def run_parallel_docking(
     protein_pdbqt: Path,
-    prepared_compounds: list[Path],
-    binding_site: dict,
+    prepared_compounds: Sequence[Path],
+    binding_site: dict | list[dict],
     docking_results_dir: Path,
     num_workers: int | None = None,
-):
+    snapshot_path: Path | None = None,
+    snapshot_interval: float = 30.0,
+    top_k: int = 20,
+    maps: Path | None = None,
+    engine: str = "vina",
+    exhaustiveness: int | None = None,
+    seed: int | None = None,
+    scoring: str | None = None,
+    cpus_per_worker: int = 1,
+    pin_workers: bool = False,
+    avoid_smt: bool = False,
+    result_cache: Path | None = None,
+    progress: DockingProgress | None = None,
+) -> dict:
     """
-    Runs AutoDock Vina docking in parallel for a list of compounds.
+    Runs AutoDock Vina (or a registered derivative) in parallel for a list of
+    compounds.
+
+    While jobs complete, running aggregates (counts, throughput, ETA, top
+    hits and a score histogram) are periodically written to a JSON snapshot
+    that `naturaDock status` can read.
 
     Args:
         protein_pdbqt: Path to the prepared protein file in PDBQT format.
-        prepared_compounds: List of paths to prepared compound files in PDBQT format.
-        binding_site: Dictionary defining the docking box (center and size).
+        prepared_compounds: Paths to prepared compound files in PDBQT format,
+                            taken one at a time as jobs are submitted (see
+                            `PackedLibrary.prepared`).
+        binding_site: Dictionary defining the docking box (center and size), or
+                      a list of boxes. With a list, every compound is docked
+                      into every box as a separate job whose output is named
+                      ``<compound>_site<k>_docked.pdbqt``.
         docking_results_dir: Path to the directory to write the docked pose output files.
-        num_workers: The number of parallel workers to use. If None, it will default to 
-                     the number of available CPU cores.
+        num_workers: The number of parallel workers to use. If None, it will default to
+                     the number of physical CPU cores divided by ``cpus_per_worker``.
+        snapshot_path: Where to write progress snapshots. Defaults to
+                       ``progress.json`` in the docking results directory.
+        snapshot_interval: Minimum number of seconds between snapshots.
+        top_k: The number of best-scoring compounds kept in the snapshot.
+        maps: Precomputed affinity maps prefix shared by every job, see
+              `get_or_create_maps`.
+        engine: The name of the docking engine, see `docking.engines`.
+        exhaustiveness: Search exhaustiveness; the engine default if None.
+        seed: Random seed passed to every job; the engine picks one if None.
+        scoring: Scoring function; the engine default if None.
+        cpus_per_worker: CPUs each docking job may use (the engine's ``--cpu``).
+        pin_workers: Pin every worker, and the engine processes it starts, to
+                     its own CPUs within one NUMA node, see `plan_placement`.
+        avoid_smt: When pinning, use one hardware thread per core only.
+        result_cache: Directory of a `ResultCache`. Ligands already docked
+                      with the same receptor, box and settings are copied
+                      from it instead of being docked; new results are added.
+        progress: Progress to carry on, such as a queue worker's across its
+                  batches; its total grows by this call's jobs and the snapshot
+                  arguments are ignored.
+
+    Returns:
+        The final progress snapshot.
     """
+    docking_engine = get_engine(engine)
     if num_workers is None:
-        num_workers = psutil.cpu_count(logical=False)
+        num_workers = max(1, psutil.cpu_count(logical=False) // cpus_per_worker)
+    if snapshot_path is None:
+        snapshot_path = docking_results_dir / SNAPSHOT_FILENAME
+
+    boxes = [binding_site] if isinstance(binding_site, dict) else binding_site
 
-    with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
-        futures = []
+    def jobs():
+        # Ligands are taken as jobs are submitted, so lazily written files
+        # (see `PackedLibrary.prepared`) are written just ahead of docking
         for compound_pdbqt in prepared_compounds:
-            output_pdbqt = (
-                docking_results_dir / f"{compound_pdbqt.stem}_docked.pdbqt"
-            )
+            for site in range(len(boxes)):
+                name = (
+                    compound_pdbqt.stem
+                    if isinstance(binding_site, dict)
+                    else f"{compound_pdbqt.stem}_site{site}"
+                )
+                yield name, compound_pdbqt, site
+
+    num_jobs = len(prepared_compounds) * len(boxes)
+
+    if progress is None:
+        progress = DockingProgress(num_jobs, snapshot_path, snapshot_interval, top_k)
+    else:
+        progress.total += num_jobs
+    progress.write_snapshot()
+
+    caches = None
+    if result_cache is not None:
+        # Cache keys cover the box, so every box has its own key prefix
+        cache = ResultCache(
+            result_cache,
+            protein_pdbqt,
+            boxes[0],
+            engine,
+            exhaustiveness,
+            seed,
+            scoring,
+            cpus_per_worker,
+        )
+        caches = [cache] + [cache.for_site(box) for box in boxes[1:]]
+
+    pool_options = {}
+    if pin_workers:
+        topology = CpuTopology.detect()
+        layout = plan_placement(topology, num_workers, cpus_per_worker, avoid_smt)
+        if layout:
+            print(format_placement(topology, layout))
+            num_workers = len(layout)
+            cpu_sets = multiprocessing.Queue()
+            for cpus in layout:
+                cpu_sets.put(cpus)
+            pool_options = {"initializer": pin_worker, "initargs": (cpu_sets,)}
+        else:
+            print("Warning: no CPU set fits a worker; running without pinning.")
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=num_workers, **pool_options
+    ) as executor, tqdm(total=num_jobs, desc="Running parallel docking") as bar:
+        pending = {}
+
+        def finish(future):
+            compound, output_pdbqt, site, key = pending.pop(future)
+            affinity = None
+            try:
+                future.result()
+                affinity = docking_engine.parse_score(output_pdbqt)
+            except Exception as e:
+                print(f"An error occurred during docking: {e}")
+            progress.record(compound, affinity)
+            if caches is not None and affinity is not None:
+                caches[site].store(key, output_pdbqt)
+            bar.update()
+
+        for name, compound_pdbqt, site in jobs():
+            output_pdbqt = docking_results_dir / f"{name}_docked.pdbqt"
+            key = None
+            if caches is not None:
+                key = caches[site].key(compound_pdbqt)
+                if caches[site].fetch(key, output_pdbqt):
+                    affinity = docking_engine.parse_score(output_pdbqt)
+                    progress.record(name, affinity, cached=True)
+                    bar.update()
+                    continue
             future = executor.submit(
                 run_vina_docking,
                 protein_pdbqt=protein_pdbqt,
                 compound_pdbqt=compound_pdbqt,
-                binding_site=binding_site,
+                binding_site=boxes[site],
                 output_pdbqt=output_pdbqt,
+                maps=maps,
+                engine=engine,
+                exhaustiveness=exhaustiveness,
+                seed=seed,
+                scoring=scoring,
+                cpu=cpus_per_worker,
             )
-            futures.append(future)
+            pending[future] = (name, output_pdbqt, site, key)
+            # Jobs in flight are bounded, keeping the workers busy without
+            # submitting (and preparing the ligands of) the whole library
+            if len(pending) >= 4 * num_workers:
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    finish(future)
+        for future in concurrent.futures.as_completed(list(pending)):
+            finish(future)
 
-        for future in tqdm(
-            concurrent.futures.as_completed(futures),
-            total=len(prepared_compounds),
-            desc="Running parallel docking",
-        ):
-            try:
-                future.result()
-            except Exception as e:
-                print(f"An error occurred during docking: {e}")
+    if caches is not None:
+        hits = sum(cache.hits for cache in caches)
+        misses = sum(cache.misses for cache in caches)
+        print(
+            f"Result cache: {hits} hits, {misses} misses "
+            f"({hits / max(1, hits + misses):.0%} hit rate)"
+        )
+    progress.write_snapshot()
+    return progress.snapshot()
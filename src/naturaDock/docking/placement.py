@@ -0,0 +1,171 @@
+# CPU Affinity and NUMA-Aware Placement of Docking Workers
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import psutil
+
+SYSFS_ROOT = Path("/sys/devices/system")
+
+
+def parse_cpu_list(text: str) -> list[int]:
+    """Parses a Linux CPU list such as ``0-3,8,10-11``."""
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def allowed_cpus() -> list[int]:
+    """Returns the CPUs this process may run on."""
+    try:
+        return sorted(psutil.Process().cpu_affinity())
+    except AttributeError:
+        # cpu_affinity is unavailable on macOS
+        return list(range(psutil.cpu_count()))
+
+
+@dataclass(frozen=True)
+class CpuTopology:
+    """
+    The CPUs available to this process, grouped by NUMA node and core.
+
+    Attributes:
+        nodes: One entry per NUMA node, each a tuple of cores, each a tuple
+            of the core's hardware threads (SMT siblings).
+    """
+
+    nodes: tuple[tuple[tuple[int, ...], ...], ...]
+
+    @classmethod
+    def detect(
+        cls, sysfs_root: Path = SYSFS_ROOT, cpus: list[int] | None = None
+    ) -> "CpuTopology":
+        """
+        Reads the topology from sysfs, restricted to the allowed CPUs.
+
+        Without sysfs (other than Linux), every CPU is treated as its own
+        core on a single node.
+
+        Args:
+            sysfs_root: The ``/sys/devices/system`` directory.
+            cpus: The usable CPUs; defaults to this process's affinity.
+        """
+        cpus = set(allowed_cpus() if cpus is None else cpus)
+
+        node_cpus = [
+            parse_cpu_list((node / "cpulist").read_text())
+            for node in sorted(
+                (sysfs_root / "node").glob("node[0-9]*"),
+                key=lambda node: int(node.name[4:]),
+            )
+        ]
+        if not node_cpus:
+            node_cpus = [sorted(cpus)]
+
+        nodes = []
+        for node in node_cpus:
+            cores = {}
+            for cpu in node:
+                if cpu not in cpus:
+                    continue
+                topology = sysfs_root / "cpu" / f"cpu{cpu}" / "topology"
+                siblings_file = topology / "thread_siblings_list"
+                if siblings_file.exists():
+                    siblings = parse_cpu_list(siblings_file.read_text())
+                else:
+                    siblings = [cpu]
+                core = tuple(s for s in siblings if s in cpus)
+                cores[min(siblings)] = core
+            if cores:
+                nodes.append(tuple(cores[key] for key in sorted(cores)))
+        return cls(tuple(nodes))
+
+
+def plan_placement(
+    topology: CpuTopology,
+    num_workers: int,
+    cpus_per_worker: int = 1,
+    avoid_smt: bool = False,
+) -> list[tuple[int, ...]]:
+    """
+    Assigns each docking worker a dedicated set of CPUs.
+
+    A worker's CPUs always come from a single NUMA node, and workers are
+    spread over the nodes in turn. Within a node the first hardware thread
+    of every core is handed out before any SMT sibling, and a worker holds
+    either first threads or siblings, never both; CPUs left over at either
+    level are not used. With ``avoid_smt`` siblings are not used at all.
+    Workers that do not fit without sharing CPUs are dropped.
+
+    Args:
+        topology: The CPU topology, see `CpuTopology.detect`.
+        num_workers: The number of workers requested.
+        cpus_per_worker: CPUs per worker, passed to the engine as ``--cpu``.
+        avoid_smt: Use one hardware thread per core only.
+
+    Returns:
+        One CPU set per placed worker.
+    """
+    node_slots = []
+    for cores in topology.nodes:
+        depth = 1 if avoid_smt else max(len(core) for core in cores)
+        slots = []
+        for k in range(depth):
+            # One thread level at a time, so no worker pairs a first thread
+            # with the sibling of another worker's core
+            cpus = [core[k] for core in cores if k < len(core)]
+            slots += [
+                tuple(sorted(cpus[i : i + cpus_per_worker]))
+                for i in range(0, len(cpus) - cpus_per_worker + 1, cpus_per_worker)
+            ]
+        node_slots.append(slots)
+
+    layout = []
+    while len(layout) < num_workers and any(node_slots):
+        for slots in node_slots:
+            if slots and len(layout) < num_workers:
+                layout.append(slots.pop(0))
+    if len(layout) < num_workers:
+        print(
+            f"Warning: only {len(layout)} of {num_workers} workers fit on "
+            f"dedicated CPUs with {cpus_per_worker} CPUs each."
+        )
+    return layout
+
+
+def format_placement(topology: CpuTopology, layout: list[tuple[int, ...]]) -> str:
+    """Formats a worker layout with the NUMA node of each worker."""
+    node_of = {
+        cpu: index
+        for index, cores in enumerate(topology.nodes)
+        for core in cores
+        for cpu in core
+    }
+    lines = [
+        f"Worker placement: {len(layout)} workers on {len(topology.nodes)} "
+        f"NUMA node(s)"
+    ]
+    for worker, cpus in enumerate(layout):
+        lines.append(
+            f"  worker {worker}: node {node_of[cpus[0]]}, "
+            f"CPUs {','.join(map(str, cpus))}"
+        )
+    return "\n".join(lines)
+
+
+def pin_worker(cpu_sets):
+    """
+    Pool initializer pinning a worker process to the next free CPU set.
+
+    Docking engines started by the worker inherit its affinity.
+
+    Args:
+        cpu_sets: A multiprocessing queue holding one CPU set per worker.
+    """
+    cpus = cpu_sets.get()
+    psutil.Process().cpu_affinity(list(cpus))
+    print(f"Docking worker {os.getpid()} pinned to CPUs {list(cpus)}")
@@ -0,0 +1,283 @@
+# Live Docking Progress Snapshots
+import heapq
+import json
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from ..analysis.statistics import ScoreAggregate
+
+SNAPSHOT_FILENAME = "progress.json"
+
+
+class DockingProgress:
+    """
+    Running aggregates of a docking run, updated as each job completes.
+
+    Keeps the completed and failed counts, throughput, ETA, a top-K heap of
+    the best scores and a score histogram, and periodically writes them to a
+    small JSON snapshot that can be read without touching any pose file.
+    """
+
+    def __init__(
+        self,
+        total: int,
+        snapshot_path: Path | None = None,
+        snapshot_interval: float = 30.0,
+        top_k: int = 20,
+    ):
+        """
+        Args:
+            total: The number of docking jobs in the run.
+            snapshot_path: Where to write snapshots, or None to disable them.
+            snapshot_interval: Minimum number of seconds between snapshots.
+            top_k: The number of best-scoring compounds to keep.
+        """
+        self.total = total
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.top_k = top_k
+        self.completed = 0
+        self.failed = 0
+        self.cached = 0
+        self.histogram = ScoreAggregate(bin_width=0.1)
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.monotonic()
+        self._last_snapshot = float("-inf")
+        # Min-heap on -affinity: the root is the worst of the kept hits
+        self._top_hits: list[tuple[float, str]] = []
+
+    def record(self, compound: str, affinity: float | None, cached: bool = False):
+        """
+        Records a finished job and writes a snapshot if one is due.
+
+        Args:
+            compound: The compound name.
+            affinity: The best docking score, or None if the job failed.
+            cached: Whether the result came from the result cache.
+        """
+        self.cached += cached
+        if affinity is None:
+            self.failed += 1
+        else:
+            self.completed += 1
+            self.histogram.update([affinity])
+            entry = (-affinity, compound)
+            if len(self._top_hits) < self.top_k:
+                heapq.heappush(self._top_hits, entry)
+            elif entry > self._top_hits[0]:
+                heapq.heapreplace(self._top_hits, entry)
+
+        if time.monotonic() - self._last_snapshot >= self.snapshot_interval:
+            self.write_snapshot()
+
+    def snapshot(self) -> dict:
+        """Returns the current state as a JSON-serialisable dictionary."""
+        elapsed = time.monotonic() - self._start
+        done = self.completed + self.failed
+        throughput = done / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - done
+        return {
+            "started_at": self.started_at.isoformat(),
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            "finished": remaining <= 0,
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cached": self.cached,
+            "elapsed_seconds": elapsed,
+            "ligands_per_second": throughput,
+            "eta_seconds": remaining / throughput if throughput > 0 else None,
+            "top_k": self.top_k,
+            "top_hits": [
+                {"compound": compound, "affinity": -neg_affinity}
+                for neg_affinity, compound in sorted(self._top_hits, reverse=True)
+            ],
+            "histogram": self.histogram.to_dict(),
+        }
+
+    def write_snapshot(self):
+        """Atomically writes the current snapshot, if a path was given."""
+        if self.snapshot_path is None:
+            return
+        write_snapshot(self.snapshot_path, self.snapshot())
+        self._last_snapshot = time.monotonic()
+
+
+def write_snapshot(path: Path, data: dict):
+    """
+    Writes a snapshot atomically so readers never see a partial file.
+
+    Args:
+        path: The snapshot path.
+        data: The snapshot dictionary.
+    """
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(data))
+    os.replace(tmp_path, path)
+
+
+def find_snapshots(path: Path) -> list[Path]:
+    """
+    Locates the progress snapshots for an output or docking results directory.
+
+    A single run writes ``progress.json``; every worker of a queued run writes
+    its own ``progress_<worker>.json`` next to it.
+
+    Args:
+        path: A pipeline output directory, docking results directory or a
+            snapshot file itself.
+
+    Returns:
+        The paths to the snapshot files.
+
+    Raises:
+        FileNotFoundError: If no snapshot exists.
+    """
+    if path.is_file():
+        return [path]
+    for directory in [path, path / "docking_results"]:
+        snapshots = sorted(directory.glob("progress*.json"))
+        if snapshots:
+            return snapshots
+    raise FileNotFoundError(f"No docking progress snapshot found in: {path}")
+
+
+def merge_snapshots(snapshots: list[dict]) -> dict:
+    """
+    Merges the snapshots of workers docking the same run concurrently.
+
+    Counts add up, throughput is the sum of the workers' throughputs, and the
+    score histograms and top hits are combined.
+
+    Args:
+        snapshots: The snapshot dictionaries.
+
+    Returns:
+        A snapshot of the whole run.
+    """
+    if len(snapshots) == 1:
+        return snapshots[0]
+    histogram = ScoreAggregate.from_dict(snapshots[0]["histogram"])
+    for data in snapshots[1:]:
+        histogram.merge(ScoreAggregate.from_dict(data["histogram"]))
+    total, completed, failed, cached, throughput = (
+        sum(data.get(key, 0) for data in snapshots)
+        for key in ("total", "completed", "failed", "cached", "ligands_per_second")
+    )
+    remaining = total - completed - failed
+    top_k = max(data.get("top_k", len(data["top_hits"])) for data in snapshots)
+    return {
+        "started_at": min(data["started_at"] for data in snapshots),
+        "updated_at": max(data["updated_at"] for data in snapshots),
+        "finished": all(data["finished"] for data in snapshots),
+        "total": total,
+        "completed": completed,
+        "failed": failed,
+        "cached": cached,
+        "elapsed_seconds": max(data["elapsed_seconds"] for data in snapshots),
+        "ligands_per_second": throughput,
+        "eta_seconds": remaining / throughput if throughput > 0 else None,
+        "top_k": top_k,
+        "top_hits": heapq.nsmallest(
+            top_k,
+            (hit for data in snapshots for hit in data["top_hits"]),
+            key=lambda hit: hit["affinity"],
+        ),
+        "histogram": histogram.to_dict(),
+    }
+
+
+def with_queue_counts(data: dict, counts: dict[str, int]) -> dict:
+    """
+    Takes a queued run's total, state and ETA from its work queue.
+
+    Workers only count the jobs they have claimed, so jobs still pending in
+    the queue are missing from their snapshots.
+
+    Args:
+        data: The merged snapshot of the workers.
+        counts: The queue's job counts per state, see `WorkQueue.counts`.
+
+    Returns:
+        The snapshot with the queue's total and counts.
+    """
+    remaining = counts["pending"] + counts["leased"]
+    throughput = data["ligands_per_second"]
+    return {
+        **data,
+        "finished": remaining == 0,
+        "total": sum(counts.values()),
+        "eta_seconds": remaining / throughput if throughput > 0 else None,
+        "queue": counts,
+    }
+
+
+def read_snapshot(path: Path) -> dict:
+    """
+    Reads and merges the snapshots found by `find_snapshots`.
+
+    When the run docks through a work queue, found next to the snapshots or
+    in the output directory above them, its counts give the total and ETA.
+    """
+    from .work_queue import QUEUE_FILENAME, WorkQueue
+
+    snapshots = find_snapshots(path)
+    data = merge_snapshots([json.loads(snapshot.read_text()) for snapshot in snapshots])
+    for directory in [snapshots[0].parent, snapshots[0].parent.parent]:
+        if (directory / QUEUE_FILENAME).is_file():
+            queue = WorkQueue(directory / QUEUE_FILENAME, create=False)
+            return with_queue_counts(data, queue.counts())
+    return data
+
+
+def _format_duration(seconds: float | None) -> str:
+    """Formats a duration in seconds as h:mm:ss."""
+    if seconds is None:
+        return "unknown"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def format_snapshot(data: dict) -> str:
+    """
+    Formats a snapshot as a human-readable status report.
+
+    Args:
+        data: The snapshot dictionary.
+
+    Returns:
+        The report text.
+    """
+    done = data["completed"] + data["failed"]
+    percent = 100 * done / data["total"] if data["total"] else 100.0
+    state = "finished" if data["finished"] else "running"
+    lines = [
+        f"Status: {state} (updated {data['updated_at']})",
+        f"Progress: {done}/{data['total']} ({percent:.1f}%), "
+        f"{data['failed']} failed, {data.get('cached', 0)} from the result cache",
+        f"Throughput: {data['ligands_per_second'] * 3600:.1f} ligands/hour",
+        f"Elapsed: {_format_duration(data['elapsed_seconds'])}, "
+        f"ETA: {_format_duration(data['eta_seconds'])}",
+    ]
+    if "queue" in data:
+        queue = data["queue"]
+        lines.append(
+            f"Queue: {queue['pending']} pending, {queue['leased']} leased, "
+            f"{queue['done']} done, {queue['failed']} failed"
+        )
+
+    histogram = ScoreAggregate.from_dict(data["histogram"])
+    if histogram.count:
+        lines.append(
+            f"Scores: best {histogram.minimum:.2f}, "
+            f"median {histogram.quantile(0.5):.2f}, "
+            f"worst {histogram.maximum:.2f} kcal/mol"
+        )
+    if data["top_hits"]:
+        lines.append("Top hits:")
+        for rank, hit in enumerate(data["top_hits"], start=1):
+            lines.append(f"  {rank:>3}. {hit['compound']:<40} {hit['affinity']:>8.2f}")
+    return "\n".join(lines)
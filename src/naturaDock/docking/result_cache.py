@@ -0,0 +1,204 @@
+# Content-Addressed Cache of Docking Results Across Runs
+import copy
+import functools
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+from .engines import get_engine
+from .maps_cache import _file_digest
+
+RESULT_SUFFIX = ".pdbqt"
+
+
+def default_cache_dir() -> Path:
+    """Returns ``NATURADOCK_RESULT_CACHE`` or ``~/.cache/naturaDock/results``."""
+    if "NATURADOCK_RESULT_CACHE" in os.environ:
+        return Path(os.environ["NATURADOCK_RESULT_CACHE"])
+    return Path.home() / ".cache" / "naturaDock" / "results"
+
+
+@functools.lru_cache(maxsize=None)
+def engine_version(executable: str) -> str:
+    """
+    Identifies the build of a docking engine executable.
+
+    Returns:
+        The output of ``--version``, or a digest of the executable if it
+        does not report one.
+    """
+    try:
+        result = subprocess.run(
+            [executable, "--version"],
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=60,
+        )
+        version = (result.stdout or result.stderr).strip()
+        if version:
+            return version
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return _file_digest(Path(executable))
+
+
+class ResultCache:
+    """
+    Docked poses stored under a hash of everything that determines them.
+
+    A job's key covers the receptor and ligand PDBQT contents, the box, the
+    engine and its version, exhaustiveness, seed, scoring function and CPU
+    count. The cached value is the engine's output file with its poses and
+    scores. Entries are written to a temporary file and renamed into place,
+    so concurrent runs never see partial entries. Two runs storing the same
+    key write identical content. Hits refresh the entry's modification time,
+    which `evict_results` uses to drop the least recently used entries.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path | None,
+        protein_pdbqt: Path,
+        binding_site: dict,
+        engine: str = "vina",
+        exhaustiveness: int | None = None,
+        seed: int | None = None,
+        scoring: str | None = None,
+        cpu: int = 1,
+    ):
+        """
+        Args:
+            cache_dir: The cache directory; defaults to `default_cache_dir`.
+            protein_pdbqt: Path to the prepared protein file in PDBQT format.
+            binding_site: Dictionary defining the docking box (center and size).
+            engine: The name of the docking engine.
+            exhaustiveness: Search exhaustiveness; the engine default if None.
+            seed: Random seed; the engine picks one if None.
+            scoring: Scoring function; the engine default if None.
+            cpu: The number of CPUs per docking job.
+        """
+        self.cache_dir = (
+            Path(cache_dir) if cache_dir is not None else default_cache_dir()
+        )
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        # Everything except the ligand is shared by the run's jobs
+        self._run = {
+            "receptor": _file_digest(protein_pdbqt),
+            "engine": engine,
+            "version": engine_version(get_engine(engine).find_executable()),
+            "exhaustiveness": exhaustiveness,
+            "seed": seed,
+            "scoring": scoring,
+            "cpu": cpu,
+        }
+        self._set_box(binding_site)
+
+    def _set_box(self, binding_site: dict):
+        self._run["box"] = {
+            key: round(float(value), 3) for key, value in sorted(binding_site.items())
+        }
+        self._run_key = json.dumps(self._run, sort_keys=True)
+
+    def for_site(self, binding_site: dict) -> "ResultCache":
+        """
+        Returns a cache for another box of the same run.
+
+        The receptor digest and engine version are reused rather than
+        computed again, which matters for blind docking over many sub-boxes.
+        Hits and misses are counted separately.
+        """
+        cache = copy.copy(self)
+        cache.hits = cache.misses = 0
+        cache._run = dict(self._run)
+        cache._set_box(binding_site)
+        return cache
+
+    def key(self, compound_pdbqt: Path) -> str:
+        """Returns the cache key of docking a ligand in this run."""
+        digest = hashlib.sha256(self._run_key.encode("utf-8"))
+        digest.update(_file_digest(compound_pdbqt).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _entry(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}{RESULT_SUFFIX}"
+
+    def fetch(self, key: str, output_pdbqt: Path) -> bool:
+        """
+        Copies a cached result to ``output_pdbqt`` and counts a hit or miss.
+
+        Returns:
+            Whether the result was cached.
+        """
+        entry = self._entry(key)
+        try:
+            shutil.copyfile(entry, output_pdbqt)
+            os.utime(entry)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def store(self, key: str, output_pdbqt: Path):
+        """Adds a finished job's output file to the cache."""
+        entry = self._entry(key)
+        entry.parent.mkdir(exist_ok=True)
+        tmp_entry = entry.with_name(f".{entry.name}.{os.getpid()}.tmp")
+        try:
+            shutil.copyfile(output_pdbqt, tmp_entry)
+            os.replace(tmp_entry, entry)
+        finally:
+            tmp_entry.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        """Returns the run's hit and miss counts and hit rate."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def evict_results(cache_dir: Path | None = None, max_size_gb: float = 10.0) -> int:
+    """
+    Removes the least recently used results until the cache fits its size.
+
+    Args:
+        cache_dir: The cache directory; defaults to `default_cache_dir`.
+        max_size_gb: The maximum total size of the cached results.
+
+    Returns:
+        The number of removed results.
+    """
+    cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir()
+    if not cache_dir.is_dir():
+        return 0
+
+    entries = []
+    for entry in cache_dir.glob(f"*/*{RESULT_SUFFIX}"):
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry))
+    entries.sort()
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, entry in entries:
+        if total <= max_size_gb * 1024**3:
+            break
+        # Readers copying the entry keep their open file on POSIX systems
+        entry.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    if removed:
+        print(f"Evicted {removed} cached docking results")
+    return removed
@@ -0,0 +1,165 @@
+# Staged Docking of Library Subsets
+
+import re
+from pathlib import Path
+from typing import Iterable
+
+from rdkit import Chem
+
+from .parallel_dock import run_parallel_docking
+from ..analysis.results import parse_vina_result
+from ..preprocessing.compounds import (
+    compound_name,
+    generate_conformers,
+    prepare_compounds,
+)
+
+
+def assign_names(molecules: Iterable[Chem.Mol]) -> list[Chem.Mol]:
+    """
+    Gives every unnamed molecule a stable ``compound_<i>`` name.
+
+    Staged screens dock a library in several rounds, so names must not
+    depend on a molecule's position within a round.
+
+    Args:
+        molecules: An iterable of RDKit Mol objects.
+
+    Returns:
+        The molecules as a list, all with a non-empty ``_Name``.
+    """
+    mols = list(molecules)
+    for i, mol in enumerate(mols):
+        mol.SetProp("_Name", compound_name(mol, i))
+    return mols
+
+
+def dock_molecules(
+    molecules: Iterable[Chem.Mol],
+    protein_pdbqt: Path,
+    binding_site: dict,
+    output_dir: Path,
+    conformer_options: dict | None = None,
+    docking_options: dict | None = None,
+) -> dict[str, float]:
+    """
+    Generates conformers for, prepares and docks a set of named molecules.
+
+    Prepared ligands and poses go to ``prepared_compounds`` and
+    ``docking_results`` in the output directory, exactly as in a full run, so
+    rounds accumulate and `aggregate_results` sees every docked molecule.
+
+    Args:
+        molecules: An iterable of named RDKit Mol objects.
+        protein_pdbqt: Path to the prepared protein file in PDBQT format.
+        binding_site: Dictionary defining the docking box (center and size).
+        output_dir: The pipeline output directory.
+        conformer_options: Keyword arguments for `generate_conformers`.
+        docking_options: Extra keyword arguments for `run_parallel_docking`,
+            such as ``num_workers``.
+
+    Returns:
+        The best docking score of each successfully docked molecule, by name.
+    """
+    prepared_dir = output_dir / "prepared_compounds"
+    docking_results_dir = output_dir / "docking_results"
+    prepared_dir.mkdir(exist_ok=True)
+    docking_results_dir.mkdir(exist_ok=True)
+
+    prepared = prepare_compounds(
+        generate_conformers(molecules, **(conformer_options or {})), prepared_dir
+    )
+    run_parallel_docking(
+        protein_pdbqt=protein_pdbqt,
+        prepared_compounds=prepared,
+        binding_site=binding_site,
+        docking_results_dir=docking_results_dir,
+        **(docking_options or {}),
+    )
+
+    scores: dict[str, float] = {}
+    for compound_pdbqt in prepared:
+        output_pdbqt = docking_results_dir / f"{compound_pdbqt.stem}_docked.pdbqt"
+        if not output_pdbqt.exists():
+            continue
+        affinity = parse_vina_result(output_pdbqt)
+        if affinity is None:
+            continue
+        # Conformer ensembles are docked as <name>_conf<k>
+        name = re.sub(r"_conf\d+$", "", compound_pdbqt.stem)
+        scores[name] = min(affinity, scores.get(name, affinity))
+    return scores
+
+
+def run_cluster_expansion_docking(
+    molecules: list[Chem.Mol],
+    labels,
+    representatives: list[int],
+    protein_pdbqt: Path,
+    binding_site: dict,
+    output_dir: Path,
+    expand_fraction: float = 0.1,
+    conformer_options: dict | None = None,
+    docking_options: dict | None = None,
+) -> dict[str, float]:
+    """
+    Docks cluster representatives, then the members of the best clusters.
+
+    Args:
+        molecules: The named molecules that were clustered.
+        labels: The cluster label of each molecule.
+        representatives: The index of each cluster's representative.
+        protein_pdbqt: Path to the prepared protein file in PDBQT format.
+        binding_site: Dictionary defining the docking box (center and size).
+        output_dir: The pipeline output directory.
+        expand_fraction: The fraction of clusters, best representative score
+            first, whose remaining members are docked in the second round;
+            any positive fraction expands at least one cluster.
+        conformer_options: Keyword arguments for `generate_conformers`.
+        docking_options: Extra keyword arguments for `run_parallel_docking`.
+
+    Returns:
+        The best docking score of every docked molecule, by name.
+    """
+    names = [mol.GetProp("_Name") for mol in molecules]
+    print(
+        f"Docking {len(representatives)} cluster representatives "
+        f"of {len(molecules)} compounds"
+    )
+    scores = dock_molecules(
+        [molecules[i] for i in representatives],
+        protein_pdbqt,
+        binding_site,
+        output_dir,
+        conformer_options,
+        docking_options,
+    )
+
+    docked_clusters = [
+        cluster
+        for cluster, representative in enumerate(representatives)
+        if names[representative] in scores
+    ]
+    docked_clusters.sort(key=lambda cluster: scores[names[representatives[cluster]]])
+    num_expanded = int(round(len(representatives) * expand_fraction))
+    if expand_fraction > 0:
+        num_expanded = max(1, num_expanded)
+    expanded = set(docked_clusters[:num_expanded])
+    members = [
+        mol
+        for i, (mol, label) in enumerate(zip(molecules, labels))
+        if label in expanded and i != representatives[label]
+    ]
+    if members:
+        print(f"Expanding {len(expanded)} best clusters: {len(members)} members")
+        scores.update(
+            dock_molecules(
+                members,
+                protein_pdbqt,
+                binding_site,
+                output_dir,
+                conformer_options,
+                docking_options,
+            )
+        )
+    return scores
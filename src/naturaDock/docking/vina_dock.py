@@ -1,9 +1,9 @@
 # AutoDock Vina Docking Execution
 import subprocess
-import shutil
-import os
 from pathlib import Path
 
+from .engines import get_engine
+
 
 def get_vina_executable() -> str:
     """
@@ -12,24 +12,7 @@ def get_vina_executable() -> str:
     2. System PATH (works on Linux/Mac after apt/brew install)
     3. vina.exe in the project root (Windows local install)
     """
-    # 1. Environment variable override
-    if "VINA_EXECUTABLE" in os.environ:
-        return os.environ["VINA_EXECUTABLE"]
-
-    # 2. System PATH
-    vina = shutil.which("vina")
-    if vina:
-        return vina
-
-    # 3. Windows fallback - vina.exe next to project root
-    local = Path(__file__).parent.parent.parent / "vina.exe"
-    if local.exists():
-        return str(local)
-
-    raise FileNotFoundError(
-        "AutoDock Vina not found. Install it, add it to PATH, "
-        "or set the VINA_EXECUTABLE environment variable."
-    )
+    return get_engine("vina").find_executable()
 
 
 def run_vina_docking(
@@ -37,40 +20,50 @@ def run_vina_docking(
     compound_pdbqt: Path,
     binding_site: dict,
     output_pdbqt: Path,
+    maps: Path | None = None,
+    engine: str = "vina",
+    exhaustiveness: int | None = None,
+    seed: int | None = None,
+    scoring: str | None = None,
+    cpu: int = 1,
 ):
     """
-    Constructs and runs the AutoDock Vina docking command.
+    Constructs and runs the docking command of AutoDock Vina or a derivative.
+
+    When precomputed affinity maps are given (see `get_or_create_maps`), Vina
+    loads them instead of the receptor and the box is taken from the maps.
+    The engine is looked up in the registry, see `docking.engines`.
     """
-    vina_executable = get_vina_executable()
+    docking_engine = get_engine(engine)
+    vina_executable = docking_engine.find_executable()
 
-    command = [
+    command = docking_engine.build_command(
         vina_executable,
-        "--receptor", str(protein_pdbqt),
-        "--ligand", str(compound_pdbqt),
-        "--out", str(output_pdbqt),
-        "--center_x", str(binding_site["center_x"]),
-        "--center_y", str(binding_site["center_y"]),
-        "--center_z", str(binding_site["center_z"]),
-        "--size_x", str(binding_site["size_x"]),
-        "--size_y", str(binding_site["size_y"]),
-        "--size_z", str(binding_site["size_z"]),
-        "--cpu", "1",
-    ]
+        protein_pdbqt,
+        compound_pdbqt,
+        binding_site,
+        output_pdbqt,
+        maps=maps,
+        exhaustiveness=exhaustiveness,
+        seed=seed,
+        scoring=scoring,
+        cpu=cpu,
+    )
 
-    print(f"Executing Vina command: {' '.join(command)}")
+    print(f"Executing {engine} command: {' '.join(command)}")
     try:
         result = subprocess.run(command, capture_output=True, text=True, check=True)
-        print("Vina stdout:", result.stdout)
-        print("Vina stderr:", result.stderr)
+        print(f"{engine} stdout:", result.stdout)
+        print(f"{engine} stderr:", result.stderr)
         return result
     except FileNotFoundError:
         print(
             f"Error: '{vina_executable}' not found. "
-            "Please ensure AutoDock Vina is installed and in your PATH."
+            f"Please ensure {engine} is installed and in your PATH."
         )
         raise
     except subprocess.CalledProcessError as e:
-        print(f"Vina execution failed with exit code {e.returncode}")
-        print("Vina stdout:", e.stdout)
-        print("Vina stderr:", e.stderr)
-        raise
\ No newline at end of file
+        print(f"{engine} execution failed with exit code {e.returncode}")
+        print(f"{engine} stdout:", e.stdout)
+        print(f"{engine} stderr:", e.stderr)
+        raise
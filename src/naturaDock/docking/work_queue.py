@@ -0,0 +1,346 @@
+# Shared Work Queue for Multi-Host Docking
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+
+QUEUE_FILENAME = "queue.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS config (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    ligand TEXT NOT NULL UNIQUE,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    affinity REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_expires);
+"""
+
+
+def default_worker_id() -> str:
+    """Returns an identifier unique to this host and process."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    A durable docking job queue with time-limited leases.
+
+    Jobs live in a SQLite database, typically on a filesystem shared by all
+    hosts. Workers claim batches under a lease, extend it with heartbeats
+    while docking, and report each job as done or failed. A lease that is not
+    renewed in time expires and its jobs are handed to the next worker, so a
+    crashed worker's jobs are never left undone. Failed jobs are retried
+    until ``max_attempts`` is reached.
+
+    Every call opens its own short-lived connection and claims run in an
+    immediate transaction, so one queue can be used from several threads,
+    processes and hosts. The rollback journal is used rather than WAL, which
+    does not work over network filesystems. Another backend, such as a small
+    queue server, only needs to provide the same methods.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_attempts: int = 3,
+        timeout: float = 60.0,
+        create: bool = True,
+    ):
+        """
+        Args:
+            path: The queue database, or a directory containing ``queue.sqlite``.
+            max_attempts: Claims of a job before it is marked as failed.
+            timeout: Seconds to wait for another process's database lock.
+            create: Create the queue if it does not exist. Workers open an
+                existing queue only, so a mistyped path is not silently
+                turned into a new, empty queue.
+
+        Raises:
+            FileNotFoundError: If ``create`` is False and there is no queue.
+        """
+        path = Path(path)
+        self.path = path / QUEUE_FILENAME if path.is_dir() else path
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self._mode = "rwc" if create else "rw"
+        if not create and not self.path.is_file():
+            raise FileNotFoundError(
+                f"No work queue found at {self.path}; start the run with "
+                f"--queue before adding workers."
+            )
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> closing[sqlite3.Connection]:
+        """Opens a connection in autocommit mode; transactions are explicit."""
+        uri = f"{self.path.resolve().as_uri()}?mode={self._mode}"
+        return closing(
+            sqlite3.connect(uri, timeout=self.timeout, isolation_level=None, uri=True)
+        )
+
+    def configure(self, **config):
+        """Stores the run configuration (JSON-serialisable values) for workers."""
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value)) for key, value in config.items()],
+            )
+
+    def config(self) -> dict:
+        """Returns the run configuration stored by `configure`."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT key, value FROM config").fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def enqueue(self, ligands: list[Path]) -> int:
+        """
+        Adds prepared ligands as pending jobs; ligands already queued are skipped.
+
+        Returns:
+            The number of jobs added.
+        """
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs (ligand) VALUES (?)",
+                [(str(Path(ligand).resolve()),) for ligand in ligands],
+            )
+            return conn.total_changes - before
+
+    def claim(
+        self, worker_id: str, batch_size: int, lease_seconds: float
+    ) -> list[tuple[int, Path]]:
+        """
+        Leases up to ``batch_size`` pending or expired jobs to a worker.
+
+        Returns:
+            The claimed jobs as ``(job_id, ligand_path)`` pairs.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose last lease expired after too many attempts fail
+                conn.execute(
+                    "UPDATE jobs SET state = 'failed', lease_owner = NULL, "
+                    "error = 'lease expired' WHERE state = 'leased' "
+                    "AND lease_expires < ? AND attempts >= ?",
+                    (now, self.max_attempts),
+                )
+                rows = conn.execute(
+                    "SELECT id, ligand FROM jobs WHERE state = 'pending' "
+                    "OR (state = 'leased' AND lease_expires < ?) "
+                    "ORDER BY id LIMIT ?",
+                    (now, batch_size),
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE jobs SET state = 'leased', lease_owner = ?, "
+                    "lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                    [(worker_id, now + lease_seconds, job_id) for job_id, _ in rows],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return [(job_id, Path(ligand)) for job_id, ligand in rows]
+
+    def heartbeat(
+        self, worker_id: str, job_ids: list[int], lease_seconds: float
+    ) -> int:
+        """
+        Extends the worker's leases on the given jobs.
+
+        Returns:
+            The number of leases still held; jobs whose lease already expired
+            and went to another worker are not extended.
+        """
+        expires = time.time() + lease_seconds
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "UPDATE jobs SET lease_expires = ? "
+                "WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                [(expires, job_id, worker_id) for job_id in job_ids],
+            )
+            return conn.total_changes - before
+
+    def complete(self, worker_id: str, job_id: int, affinity: float):
+        """Marks a job leased by the worker as done with its score."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = 'done', affinity = ?, lease_owner = NULL "
+                "WHERE id = ? AND lease_owner = ?",
+                (affinity, job_id, worker_id),
+            )
+
+    def fail(self, worker_id: str, job_id: int, error: str):
+        """Returns a failed job to the queue, or marks it failed for good."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET lease_owner = NULL, error = ?, "
+                "state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END "
+                "WHERE id = ? AND lease_owner = ?",
+                (error, self.max_attempts, job_id, worker_id),
+            )
+
+    def counts(self) -> dict[str, int]:
+        """Returns the number of jobs in each state."""
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+            ).fetchall()
+        counts.update(rows)
+        return counts
+
+
+def _keep_leases(
+    queue: WorkQueue,
+    worker_id: str,
+    job_ids: list[int],
+    lease_seconds: float,
+    interval: float,
+    stop: threading.Event,
+):
+    """Renews the worker's leases every ``interval`` seconds until stopped."""
+    while not stop.wait(interval):
+        try:
+            queue.heartbeat(worker_id, job_ids, lease_seconds)
+        except sqlite3.Error as e:
+            print(f"Heartbeat failed: {e}")
+
+
+def run_worker(
+    queue_path: Path,
+    worker_id: str | None = None,
+    num_workers: int | None = None,
+    batch_size: int | None = None,
+    lease_seconds: float = 600.0,
+    heartbeat_interval: float | None = None,
+    poll_interval: float = 10.0,
+) -> dict[str, int]:
+    """
+    Claims and docks batches from a work queue until every job is finished.
+
+    Each batch is docked with `run_parallel_docking`, writing poses to the
+    run's docking results directory exactly as a single-host run does, while
+    a background thread renews the batch's leases. When no job is available
+    but others are still leased, the worker waits, so it can pick up jobs
+    whose leases expire.
+
+    Args:
+        queue_path: The queue database or the directory containing it; it
+            must already exist.
+        worker_id: Identifies this worker's leases; defaults to host and PID.
+        num_workers: Parallel docking processes; defaults to the physical cores.
+        batch_size: Jobs claimed at once; defaults to four per process.
+        lease_seconds: How long a lease lasts without a heartbeat.
+        heartbeat_interval: Seconds between heartbeats; a third of the lease
+            by default.
+        poll_interval: Seconds to wait when no job is available.
+
+    Returns:
+        The final job counts per state.
+
+    Raises:
+        FileNotFoundError: If there is no queue at ``queue_path``.
+    """
+    import psutil
+
+    from .engines import get_engine
+    from .parallel_dock import run_parallel_docking
+    from .progress import DockingProgress
+
+    queue = WorkQueue(queue_path, create=False)
+    config = queue.config()
+    worker_id = worker_id or default_worker_id()
+    docking_results_dir = Path(config["docking_results_dir"])
+    docking_options = config.get("docking_options", {})
+    num_workers = num_workers or max(
+        1,
+        psutil.cpu_count(logical=False) // docking_options.get("cpus_per_worker", 1),
+    )
+    batch_size = batch_size or 4 * num_workers
+    heartbeat_interval = heartbeat_interval or lease_seconds / 3
+    engine = get_engine(docking_options.get("engine", "vina"))
+    if "maps" in docking_options and not Path(docking_options["maps"]).parent.is_dir():
+        # The submitting host's maps cache is not shared with this one
+        from .maps_cache import get_or_create_maps
+
+        docking_options["maps"] = get_or_create_maps(
+            Path(config["protein_pdbqt"]),
+            config["binding_site"],
+            scoring=docking_options.get("scoring") or "vina",
+        )
+
+    # One snapshot per worker, counting every batch it docks
+    progress = DockingProgress(
+        0,
+        docking_results_dir / f"progress_{worker_id.replace(':', '_')}.json",
+        docking_options.get("snapshot_interval", 30.0),
+    )
+    while True:
+        jobs = queue.claim(worker_id, batch_size, lease_seconds)
+        if not jobs:
+            counts = queue.counts()
+            if counts["pending"] == 0 and counts["leased"] == 0:
+                return counts
+            time.sleep(poll_interval)
+            continue
+
+        print(f"Worker {worker_id} claimed {len(jobs)} jobs")
+        stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=_keep_leases,
+            args=(
+                queue,
+                worker_id,
+                [job_id for job_id, _ in jobs],
+                lease_seconds,
+                heartbeat_interval,
+                stop,
+            ),
+            daemon=True,
+        )
+        heartbeat.start()
+        try:
+            run_parallel_docking(
+                protein_pdbqt=Path(config["protein_pdbqt"]),
+                prepared_compounds=[ligand for _, ligand in jobs],
+                binding_site=config["binding_site"],
+                docking_results_dir=docking_results_dir,
+                num_workers=num_workers,
+                progress=progress,
+                **docking_options,
+            )
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        for job_id, ligand in jobs:
+            output_pdbqt = docking_results_dir / f"{ligand.stem}_docked.pdbqt"
+            affinity = (
+                engine.parse_score(output_pdbqt) if output_pdbqt.exists() else None
+            )
+            if affinity is None:
+                queue.fail(worker_id, job_id, "no docking result")
+            else:
+                queue.complete(worker_id, job_id, affinity)
+        counts = queue.counts()
+        print(
+            f"Queue: {counts['pending']} pending, {counts['leased']} leased, "
+            f"{counts['done']} done, {counts['failed']} failed"
+        )
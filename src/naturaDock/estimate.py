@@ -0,0 +1,361 @@
+# Dry-Run Cost Estimation and Time-Budget Planning
+from __future__ import annotations
+
+import math
+import random
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+# Vina, QuickVina and Smina all default to an exhaustiveness of 8
+DEFAULT_EXHAUSTIVENESS = 8
+
+# Calibration ligands are docked in alternating box sizes so that the cost
+# model can extrapolate to smaller boxes
+CALIBRATION_BOX_SCALES = (1.0, 0.7)
+
+
+def ligand_features(mol) -> tuple[int, int]:
+    """Returns the rotatable bond and heavy atom counts of a molecule."""
+    from rdkit.Chem import Descriptors
+
+    return Descriptors.NumRotatableBonds(mol), mol.GetNumHeavyAtoms()
+
+
+def box_volume(binding_site: dict) -> float:
+    """Returns the docking box volume in cubic Angstrom."""
+    return binding_site["size_x"] * binding_site["size_y"] * binding_site["size_z"]
+
+
+def scale_box(binding_site: dict, scale: float) -> dict:
+    """Returns the binding site with each box edge multiplied by ``scale``."""
+    return {
+        **binding_site,
+        "size_x": binding_site["size_x"] * scale,
+        "size_y": binding_site["size_y"] * scale,
+        "size_z": binding_site["size_z"] * scale,
+    }
+
+
+def calibrate(
+    molecules: list,
+    protein_pdbqt: Path,
+    binding_site: dict,
+    work_dir: Path,
+    sample_size: int = 20,
+    conformer_options: dict | None = None,
+    engine: str = "vina",
+    exhaustiveness: int | None = None,
+    scoring: str | None = None,
+    cpus_per_worker: int = 1,
+    box_scales: tuple[float, ...] = CALIBRATION_BOX_SCALES,
+    seed: int = 42,
+) -> list[dict]:
+    """
+    Times preparation and docking of a random sample of the library.
+
+    Each sampled molecule goes through the regular `generate_conformers`,
+    `prepare_compounds` and `run_vina_docking` stages one at a time, docking
+    with the CPUs each worker of the real run gets, cycling through
+    ``box_scales``.
+
+    Args:
+        molecules: The filtered library.
+        protein_pdbqt: Path to the prepared protein file in PDBQT format.
+        binding_site: Dictionary defining the docking box (center and size).
+        work_dir: Directory for the calibration's prepared files and poses.
+        sample_size: The number of molecules to time.
+        conformer_options: Keyword arguments for `generate_conformers`.
+        engine: The docking engine name.
+        exhaustiveness: Search exhaustiveness; the engine default if None.
+        scoring: Scoring function; the engine default if None.
+        cpus_per_worker: CPUs each docking job uses (the engine's ``--cpu``),
+            as in the run being estimated.
+        box_scales: Box edge scale factors cycled through the sample.
+        seed: Seed for sampling.
+
+    Returns:
+        One measurement per sampled molecule with its features, box volume,
+        exhaustiveness, ``prepare_seconds``, ``dock_seconds`` and whether all
+        of its dockings succeeded (``docked``).
+    """
+    from naturaDock.docking.vina_dock import run_vina_docking
+    from naturaDock.preprocessing.compounds import (
+        generate_conformers,
+        prepare_compounds,
+    )
+
+    prepared_dir = work_dir / "prepared_compounds"
+    docking_dir = work_dir / "docking_results"
+    prepared_dir.mkdir(parents=True, exist_ok=True)
+    docking_dir.mkdir(parents=True, exist_ok=True)
+
+    sample = random.Random(seed).sample(molecules, min(sample_size, len(molecules)))
+    measurements = []
+    for i, mol in enumerate(sample):
+        start = time.perf_counter()
+        prepared = prepare_compounds(
+            generate_conformers([mol], **(conformer_options or {})), prepared_dir
+        )
+        prepare_seconds = time.perf_counter() - start
+
+        site = scale_box(binding_site, box_scales[i % len(box_scales)])
+        docked = bool(prepared)
+        start = time.perf_counter()
+        for compound_pdbqt in prepared:
+            try:
+                run_vina_docking(
+                    protein_pdbqt,
+                    compound_pdbqt,
+                    site,
+                    docking_dir / f"{compound_pdbqt.stem}_docked.pdbqt",
+                    engine=engine,
+                    exhaustiveness=exhaustiveness,
+                    scoring=scoring,
+                    cpu=cpus_per_worker,
+                )
+            except Exception as e:
+                print(f"Calibration docking failed: {e}")
+                docked = False
+        dock_seconds = time.perf_counter() - start
+
+        rotatable_bonds, heavy_atoms = ligand_features(mol)
+        measurements.append(
+            {
+                "rotatable_bonds": rotatable_bonds,
+                "heavy_atoms": heavy_atoms,
+                "box_volume": box_volume(site),
+                "exhaustiveness": exhaustiveness or DEFAULT_EXHAUSTIVENESS,
+                "prepare_seconds": prepare_seconds,
+                "dock_seconds": dock_seconds,
+                "docked": docked,
+            }
+        )
+    return measurements
+
+
+@dataclass
+class CostModel:
+    """
+    Per-ligand cost model fitted on calibration measurements.
+
+    Docking time is modelled as
+    ``log t = b0 + b1 * rotatable_bonds + b2 * heavy_atoms + b3 * log(volume)``
+    at the calibration exhaustiveness and scaled linearly with
+    exhaustiveness, since single-core Vina runs its Monte Carlo chains one
+    after another. Preparation time is the calibration mean.
+    """
+
+    coefficients: np.ndarray
+    exhaustiveness: int
+    prepare_seconds: float
+    samples: int
+
+    @classmethod
+    def fit(cls, measurements: list[dict]) -> CostModel:
+        """
+        Fits the model by least squares on the successful measurements.
+
+        Raises:
+            ValueError: If no calibration docking succeeded.
+        """
+        docked = [m for m in measurements if m["docked"] and m["dock_seconds"] > 0]
+        if not docked:
+            raise ValueError(
+                "Cannot fit a cost model: no calibration docking succeeded."
+            )
+
+        X = np.array(
+            [
+                [
+                    1.0,
+                    m["rotatable_bonds"],
+                    m["heavy_atoms"],
+                    math.log(m["box_volume"]),
+                ]
+                for m in docked
+            ]
+        )
+        y = np.log([m["dock_seconds"] for m in docked])
+        if len(np.unique(X[:, 3])) < 2:
+            # Without volume variation the box size effect cannot be estimated
+            X[:, 3] = 0.0
+        if len(docked) < 2 * X.shape[1]:
+            # Too few samples to separate the ligand features from noise
+            X[:, 1:3] = 0.0
+        coefficients, *_ = np.linalg.lstsq(X, y, rcond=None)
+        return cls(
+            coefficients=coefficients,
+            exhaustiveness=docked[0]["exhaustiveness"],
+            prepare_seconds=float(
+                np.mean([m["prepare_seconds"] for m in measurements])
+            ),
+            samples=len(docked),
+        )
+
+    def dock_seconds(
+        self, features: np.ndarray, binding_site: dict, exhaustiveness: int
+    ) -> np.ndarray:
+        """
+        Predicts single-core docking seconds per ligand.
+
+        Args:
+            features: An (n, 2) array of rotatable bond and heavy atom counts.
+            binding_site: The docking box.
+            exhaustiveness: The search exhaustiveness.
+
+        Returns:
+            The predicted seconds for each ligand.
+        """
+        features = np.asarray(features, dtype=float).reshape(-1, 2)
+        b0, b1, b2, b3 = self.coefficients
+        log_seconds = (
+            b0
+            + b1 * features[:, 0]
+            + b2 * features[:, 1]
+            + b3 * math.log(box_volume(binding_site))
+        )
+        return np.exp(log_seconds) * exhaustiveness / self.exhaustiveness
+
+
+def project_wall_time(
+    model: CostModel,
+    features: np.ndarray,
+    binding_site: dict,
+    exhaustiveness: int,
+    num_workers: int,
+) -> dict:
+    """
+    Projects the run time of screening a library.
+
+    Preparation runs in the main process; docking is spread over the workers.
+
+    Args:
+        model: The fitted cost model.
+        features: An (n, 2) array of rotatable bond and heavy atom counts.
+        binding_site: The docking box.
+        exhaustiveness: The search exhaustiveness.
+        num_workers: The number of parallel docking workers.
+
+    Returns:
+        The number of ligands and the projected preparation, total docking
+        CPU and wall-clock seconds.
+    """
+    prepare_seconds = model.prepare_seconds * len(features)
+    dock_cpu_seconds = float(
+        model.dock_seconds(features, binding_site, exhaustiveness).sum()
+    )
+    return {
+        "ligands": len(features),
+        "exhaustiveness": exhaustiveness,
+        "box_size": [binding_site[f"size_{axis}"] for axis in "xyz"],
+        "prepare_seconds": prepare_seconds,
+        "dock_cpu_seconds": dock_cpu_seconds,
+        "wall_seconds": prepare_seconds + dock_cpu_seconds / num_workers,
+    }
+
+
+def plan_for_budget(
+    model: CostModel,
+    features: np.ndarray,
+    binding_site: dict,
+    num_workers: int,
+    budget_seconds: float,
+    max_exhaustiveness: int = DEFAULT_EXHAUSTIVENESS,
+    exhaustiveness_options: tuple[int, ...] = (32, 16, 8, 4, 2, 1),
+    box_scales: tuple[float, ...] = (1.0, 0.9, 0.8, 0.7),
+    min_exhaustiveness: int = 4,
+) -> dict:
+    """
+    Picks the exhaustiveness and box size that fit a time budget.
+
+    The configured box is kept if any exhaustiveness of at least
+    ``min_exhaustiveness`` fits; otherwise the box is shrunk step by step.
+    At each box size the highest exhaustiveness that fits is chosen. If
+    nothing fits, the cheapest setting is returned.
+
+    Args:
+        model: The fitted cost model.
+        features: An (n, 2) array of rotatable bond and heavy atom counts.
+        binding_site: The configured docking box.
+        num_workers: The number of parallel docking workers.
+        budget_seconds: The wall-clock budget.
+        max_exhaustiveness: The highest exhaustiveness considered.
+        exhaustiveness_options: The exhaustiveness values considered.
+        box_scales: The box edge scale factors considered, largest first.
+        min_exhaustiveness: The lowest exhaustiveness accepted before the box
+            is shrunk.
+
+    Returns:
+        The projection of the chosen setting (see `project_wall_time`) with
+        its ``box_scale``, ``binding_site`` and whether it ``fits``.
+    """
+    options = sorted(
+        (e for e in exhaustiveness_options if e <= max_exhaustiveness), reverse=True
+    )
+    cheapest = None
+    for lowest in (min_exhaustiveness, 1):
+        for scale in box_scales:
+            site = scale_box(binding_site, scale)
+            for exhaustiveness in options:
+                if exhaustiveness < lowest:
+                    break
+                projection = project_wall_time(
+                    model, features, site, exhaustiveness, num_workers
+                )
+                projection.update(box_scale=scale, binding_site=site)
+                if projection["wall_seconds"] <= budget_seconds:
+                    return {**projection, "fits": True}
+                if (
+                    cheapest is None
+                    or projection["wall_seconds"] < cheapest["wall_seconds"]
+                ):
+                    cheapest = projection
+    return {**cheapest, "fits": False}
+
+
+def _format_hours(seconds: float) -> str:
+    """Formats seconds as hours, or minutes or seconds for short times."""
+    if seconds < 60:
+        return f"{seconds:.1f} s"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f} min"
+    return f"{seconds / 3600:.1f} h"
+
+
+def format_estimate(
+    projection: dict, model: CostModel, num_workers: int, plan: dict | None = None
+) -> str:
+    """
+    Formats a projection and optional budget plan as a report.
+
+    Args:
+        projection: The projection for the configured settings.
+        model: The fitted cost model.
+        num_workers: The number of parallel docking workers.
+        plan: The result of `plan_for_budget`, if a budget was given.
+
+    Returns:
+        The report text.
+    """
+    lines = [
+        f"Calibrated on {model.samples} ligands",
+        f"Library: {projection['ligands']} ligands after filtering",
+        f"Settings: exhaustiveness {projection['exhaustiveness']}, box "
+        + " x ".join(f"{size:.1f}" for size in projection["box_size"])
+        + f" A, {num_workers} workers",
+        f"Preparation: {_format_hours(projection['prepare_seconds'])}",
+        f"Docking: {_format_hours(projection['dock_cpu_seconds'])} CPU time",
+        f"Projected wall time: {_format_hours(projection['wall_seconds'])}",
+    ]
+    if plan is not None:
+        verdict = "fits" if plan["fits"] else "does NOT fit"
+        lines += [
+            f"Budget plan ({verdict}): exhaustiveness {plan['exhaustiveness']}, box "
+            + " x ".join(f"{size:.1f}" for size in plan["box_size"])
+            + f" A ({plan['box_scale']:.0%} of configured), "
+            f"{_format_hours(plan['wall_seconds'])}",
+        ]
+    return "\n".join(lines)
@@ -1,28 +1,279 @@
 import argparse
+import csv
+import json
+import sys
 import toml
 from pathlib import Path
 
+from naturaDock.docking.engines import ENGINES, get_engine
 
-from naturaDock.preprocessing.protein import (
-    load_protein,
-    validate_protein,
-    prepare_protein,
-    define_binding_site,
-)
-from naturaDock.preprocessing.compounds import (
-    load_compounds,
-    filter_compounds,
-    generate_conformers,
-    prepare_compounds,
-)
-from naturaDock.docking.parallel_dock import run_parallel_docking
-from naturaDock.analysis.results import aggregate_results
-from naturaDock.analysis.export import rank_and_export_results
-from naturaDock.analysis.statistics import generate_statistics
-
-
-def main():
+
+def status(argv: list[str] | None = None):
+    """Prints the live progress of a docking run from its snapshot file."""
+    parser = argparse.ArgumentParser(
+        prog="naturaDock status",
+        description="Show progress and current top hits of a docking run.",
+    )
+    parser.add_argument(
+        "output_dir",
+        type=Path,
+        help="Pipeline output directory, docking results directory or snapshot.",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Print the raw snapshot as JSON."
+    )
+    args = parser.parse_args(argv)
+
+    from naturaDock.docking.progress import read_snapshot, format_snapshot
+
+    snapshot = read_snapshot(args.output_dir)
+    print(json.dumps(snapshot, indent=2) if args.json else format_snapshot(snapshot))
+
+
+def worker(argv: list[str] | None = None):
+    """Docks jobs from a run's work queue until the queue is drained."""
+    parser = argparse.ArgumentParser(
+        prog="naturaDock worker",
+        description="Claim and dock batches from a shared work queue.",
+    )
+    parser.add_argument(
+        "queue",
+        type=Path,
+        help="Pipeline output directory of a --queue run, or its queue.sqlite.",
+    )
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        default=None,
+        help="Number of parallel docking processes on this host.",
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=None,
+        help="Jobs claimed at once (default: four per process).",
+    )
+    parser.add_argument(
+        "--lease_seconds",
+        type=float,
+        default=600.0,
+        help="Seconds a claimed batch is held without a heartbeat.",
+    )
+    parser.add_argument(
+        "--worker_id", help="Name of this worker (default: host name and PID)."
+    )
+    args = parser.parse_args(argv)
+
+    from naturaDock.docking.work_queue import run_worker
+
+    counts = run_worker(
+        args.queue,
+        worker_id=args.worker_id,
+        num_workers=args.num_workers,
+        batch_size=args.batch_size,
+        lease_seconds=args.lease_seconds,
+    )
+    print(f"Queue drained: {counts['done']} done, {counts['failed']} failed")
+
+
+def pack(argv: list[str] | None = None):
+    """Converts a compound library into a packed, ready-to-dock library."""
+    parser = argparse.ArgumentParser(
+        prog="naturaDock pack",
+        description="Embed and prepare a library once into a packed .ndpack file.",
+    )
+    parser.add_argument(
+        "library",
+        type=Path,
+        nargs="+",
+        help="Compound library files, directories or globs (SDF, SMI, MOL2).",
+    )
+    parser.add_argument("output", type=Path, help="Packed library to write.")
+    parser.add_argument(
+        "--num_conformers",
+        type=int,
+        default=1,
+        help="Number of conformers to generate and store per molecule.",
+    )
+    parser.add_argument(
+        "--conformer_rms",
+        type=float,
+        default=0.5,
+        help="RMSD threshold (Angstroms) for pruning duplicate conformers.",
+    )
+    parser.add_argument(
+        "--embed_timeout",
+        type=float,
+        default=None,
+        help="Time limit (seconds) per conformer embedding attempt; a molecule "
+        "retried with random coordinates may take twice as long.",
+    )
+    parser.add_argument(
+        "--max_embed_iterations",
+        type=int,
+        default=0,
+        help="Maximum RDKit embedding attempts per conformer (0 for default).",
+    )
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        default=None,
+        help="Number of packing processes (default: physical cores).",
+    )
+    args = parser.parse_args(argv)
+
+    from naturaDock.preprocessing.packed import pack_library
+
+    pack_library(
+        args.library,
+        args.output,
+        conformer_options={
+            "num_conformers": args.num_conformers,
+            "num_threads": 1,
+            "prune_rms_threshold": args.conformer_rms,
+            "embed_timeout": args.embed_timeout,
+            "max_embed_iterations": args.max_embed_iterations,
+        },
+        num_workers=args.num_workers,
+    )
+
+
+def index(argv: list[str] | None = None):
+    """Builds a persistent fingerprint index of a compound library."""
+    parser = argparse.ArgumentParser(
+        prog="naturaDock index",
+        description="Fingerprint a library once for fast similarity searches.",
+    )
+    parser.add_argument(
+        "library",
+        type=Path,
+        nargs="+",
+        help="Compound library files, directories or globs (SDF, SMI, MOL2).",
+    )
+    parser.add_argument("index_dir", type=Path, help="Index directory to write.")
+    parser.add_argument(
+        "--radius", type=int, default=2, help="Morgan fingerprint radius."
+    )
+    parser.add_argument(
+        "--fp_size", type=int, default=2048, help="Fingerprint length in bits."
+    )
+    parser.add_argument(
+        "--load_workers",
+        type=int,
+        default=1,
+        help="Library files decompressed and parsed in parallel.",
+    )
+    args = parser.parse_args(argv)
+
+    from naturaDock.preprocessing.similarity import build_fingerprint_index
+
+    build_fingerprint_index(
+        args.library,
+        args.index_dir,
+        radius=args.radius,
+        fp_size=args.fp_size,
+        load_workers=args.load_workers,
+    )
+
+
+def similar(argv: list[str] | None = None):
+    """Writes the library analogs of docking hits as a SMILES file."""
+    parser = argparse.ArgumentParser(
+        prog="naturaDock similar",
+        description="Find analogs of hits in a fingerprint index.",
+    )
+    parser.add_argument("index_dir", type=Path, help="Index of 'naturaDock index'.")
+    parser.add_argument("output", type=Path, help="SMILES file of analogs to write.")
+    queries = parser.add_mutually_exclusive_group(required=True)
+    queries.add_argument(
+        "--hits",
+        type=Path,
+        help="ranked_results.csv of a docking run; its top hits are the queries.",
+    )
+    queries.add_argument(
+        "--queries",
+        type=Path,
+        nargs="+",
+        help="Query compound files (SDF, SMI, MOL2).",
+    )
+    parser.add_argument(
+        "--top_hits",
+        type=int,
+        default=10,
+        help="Number of best-ranked hits used as queries with --hits.",
+    )
+    parser.add_argument(
+        "--top_n", type=int, default=50, help="Analogs kept per query."
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=None,
+        help="Minimum Tanimoto similarity of an analog.",
+    )
+    parser.add_argument(
+        "--num_threads",
+        type=int,
+        default=None,
+        help="Threads for the queries (default: all cores).",
+    )
+    args = parser.parse_args(argv)
+
+    from naturaDock.preprocessing.similarity import FingerprintIndex, expand_hits
+
+    fingerprint_index = FingerprintIndex(args.index_dir)
+    exclude = []
+    if args.hits is not None:
+        with open(args.hits, newline="") as f:
+            names = [row["compound"] for row in csv.DictReader(f)][: args.top_hits]
+        found = fingerprint_index.find(names)
+        missing = [name for name in names if name not in found]
+        if missing:
+            print(f"Warning: {len(missing)} hits are not in the index: {missing}")
+        exclude = [found[name] for name in names if name in found]
+        query_fingerprints = fingerprint_index.fingerprints(exclude)
+    else:
+        from naturaDock.preprocessing.compounds import load_compounds
+
+        query_fingerprints = fingerprint_index.query_fingerprints(
+            list(load_compounds(args.queries))
+        )
+    if len(query_fingerprints) == 0:
+        print("No queries to search with.")
+        return
+
+    analogs = expand_hits(
+        fingerprint_index,
+        query_fingerprints,
+        top_n=args.top_n,
+        threshold=args.threshold,
+        exclude=exclude,
+        num_threads=args.num_threads,
+    )
+    fingerprint_index.write_compounds([record for record, _ in analogs], args.output)
+    print(
+        f"{len(analogs)} analogs of {len(query_fingerprints)} queries saved to "
+        f"{args.output}; dock them with 'naturaDock -l {args.output}'"
+    )
+
+
+# Subcommands, dispatched on the first command-line argument
+COMMANDS = {
+    "index": index,
+    "pack": pack,
+    "similar": similar,
+    "status": status,
+    "worker": worker,
+}
+
+
+def main(argv: list[str] | None = None):
     """Main function to run the naturaDock pipeline."""
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+
     parser = argparse.ArgumentParser(
         description="naturaDock - A virtual screening pipeline for natural products."
     )
@@ -39,7 +290,17 @@ def main():
         "-l",
         "--ligands",
         type=Path,
-        help="Path to the compound library file (SDF, SMI, MOL2).",
+        nargs="+",
+        help=(
+            "Compound library: SDF, SMI or MOL2 files (optionally .gz or .zst), "
+            "directories or globs of them, or a packed .ndpack library."
+        ),
+    )
+    parser.add_argument(
+        "--load_workers",
+        type=int,
+        default=1,
+        help="Library files decompressed and parsed in parallel.",
     )
     parser.add_argument(
         "-o", "--output", type=Path, help="Path to the output directory."
@@ -62,6 +323,29 @@ def main():
         default=60.0,
         help="Size of the binding site in the Z dimension.",
     )
+    parser.add_argument(
+        "--blind",
+        action="store_true",
+        help="Dock into overlapping sub-boxes tiling the whole protein surface.",
+    )
+    parser.add_argument(
+        "--blind_box_size",
+        type=float,
+        default=20.0,
+        help="Edge (Angstroms) of each blind-docking sub-box.",
+    )
+    parser.add_argument(
+        "--blind_overlap",
+        type=float,
+        default=0.25,
+        help="Fraction of the edge shared by neighbouring sub-boxes.",
+    )
+    parser.add_argument(
+        "--blind_rmsd",
+        type=float,
+        default=2.0,
+        help="RMSD (Angstroms) below which poses from different sub-boxes merge.",
+    )
     parser.add_argument(
         "--max_mol_weight",
         type=float,
@@ -86,12 +370,191 @@ def main():
         default=5.0,
         help="Maximum logP for compound filtering.",
     )
+    parser.add_argument(
+        "--num_conformers",
+        type=int,
+        default=1,
+        help="Number of conformers to generate and dock per molecule.",
+    )
+    parser.add_argument(
+        "--conformer_threads",
+        type=int,
+        default=0,
+        help="RDKit threads for conformer ensembles (0 uses all cores).",
+    )
+    parser.add_argument(
+        "--conformer_rms",
+        type=float,
+        default=0.5,
+        help="RMSD threshold (Angstroms) for pruning duplicate conformers.",
+    )
+    parser.add_argument(
+        "--embed_timeout",
+        type=float,
+        default=None,
+        help="Time limit (seconds) per conformer embedding attempt; a molecule "
+        "retried with random coordinates may take twice as long.",
+    )
+    parser.add_argument(
+        "--max_embed_iterations",
+        type=int,
+        default=0,
+        help="Maximum RDKit embedding attempts per conformer (0 for default).",
+    )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        default="vina",
+        choices=sorted(ENGINES),
+        help="Docking engine (AutoDock Vina or a Vina derivative).",
+    )
+    parser.add_argument(
+        "--exhaustiveness",
+        type=int,
+        default=None,
+        help="Search exhaustiveness (engine default if not set).",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Random seed for docking (random if not set).",
+    )
+    parser.add_argument(
+        "--scoring",
+        type=str,
+        default=None,
+        help="Scoring function, e.g. vinardo (vina and smina only).",
+    )
+    parser.add_argument(
+        "--estimate",
+        action="store_true",
+        help="Estimate the run time from a calibration sample and exit.",
+    )
+    parser.add_argument(
+        "--time_budget",
+        type=float,
+        default=None,
+        help="Wall-clock budget in hours; exhaustiveness and box size are "
+        "chosen to fit it.",
+    )
+    parser.add_argument(
+        "--calibration_size",
+        type=int,
+        default=20,
+        help="Number of compounds timed for --estimate and --time_budget.",
+    )
+    parser.add_argument(
+        "--maps_cache",
+        type=Path,
+        default=None,
+        help="Directory for caching Vina affinity maps across runs "
+        "(requires Vina 1.2+; disabled by default).",
+    )
+    parser.add_argument(
+        "--maps_cache_max_age",
+        type=float,
+        default=90,
+        help="Days after which unused cached maps are evicted.",
+    )
+    parser.add_argument(
+        "--maps_cache_max_size",
+        type=float,
+        default=20,
+        help="Maximum size of the maps cache in GB.",
+    )
+    parser.add_argument(
+        "--result_cache",
+        type=Path,
+        default=None,
+        help="Directory for reusing docking results across runs "
+        "(disabled by default).",
+    )
+    parser.add_argument(
+        "--result_cache_max_size",
+        type=float,
+        default=10,
+        help="Maximum size of the result cache in GB.",
+    )
+    parser.add_argument(
+        "--cluster_threshold",
+        type=float,
+        default=None,
+        help="Tanimoto similarity for clustering compounds; docks cluster "
+        "representatives first (disabled by default).",
+    )
+    parser.add_argument(
+        "--expand_fraction",
+        type=float,
+        default=0.1,
+        help="Fraction of best-scoring clusters whose members are docked next.",
+    )
+    parser.add_argument(
+        "--active_learning_rounds",
+        type=int,
+        default=0,
+        help="Model-guided docking rounds after a random seed batch "
+        "(0 docks the full library).",
+    )
+    parser.add_argument(
+        "--active_learning_fraction",
+        type=float,
+        default=0.01,
+        help="Fraction of the library docked in each active learning round.",
+    )
+    parser.add_argument(
+        "--active_learning_reference",
+        type=Path,
+        default=None,
+        help="Ranked results of a full screen to report active learning "
+        "recall against.",
+    )
     parser.add_argument(
         "--export_format",
         type=str,
         default="csv",
         help="Format for exporting ranked results (csv or xlsx).",
     )
+    parser.add_argument(
+        "--export_sdf",
+        action="store_true",
+        help="Export the docked poses as SDF with bond orders and scores.",
+    )
+    parser.add_argument(
+        "--sdf_top_k",
+        type=int,
+        default=None,
+        help="Number of best-ranked compounds exported to SDF (default: all).",
+    )
+    parser.add_argument(
+        "--sdf_poses",
+        type=int,
+        default=1,
+        help="Poses exported to SDF per compound, best first.",
+    )
+    parser.add_argument(
+        "--sdf_compression",
+        choices=["gzip", "zstd"],
+        default=None,
+        help="Compress the exported SDF files.",
+    )
+    parser.add_argument(
+        "--contacts",
+        action="store_true",
+        help="Add residue-level interaction fingerprints to the results.",
+    )
+    parser.add_argument(
+        "--contact_constraints",
+        nargs="+",
+        default=None,
+        help="Required interactions as RESIDUE[:INTERACTION], e.g. A:ASP25:hbond "
+        "(implies --contacts).",
+    )
+    parser.add_argument(
+        "--require_constraints",
+        action="store_true",
+        help="Only export poses that satisfy all contact constraints.",
+    )
     parser.add_argument(
         "--skip_analysis",
         action="store_true",
@@ -103,6 +566,40 @@ def main():
         default=None,
         help="Number of parallel workers for docking.",
     )
+    parser.add_argument(
+        "--cpus_per_worker",
+        type=int,
+        default=1,
+        help="CPUs each docking job may use (the engine's --cpu).",
+    )
+    parser.add_argument(
+        "--pin_workers",
+        action="store_true",
+        help="Pin each docking worker to dedicated CPUs within one NUMA node.",
+    )
+    parser.add_argument(
+        "--avoid_smt",
+        action="store_true",
+        help="When pinning workers, use one hardware thread per core.",
+    )
+    parser.add_argument(
+        "--snapshot_interval",
+        type=float,
+        default=30.0,
+        help="Seconds between progress snapshots read by 'naturaDock status'.",
+    )
+    parser.add_argument(
+        "--queue",
+        action="store_true",
+        help="Dock through a work queue that 'naturaDock worker' processes "
+        "on other hosts can join.",
+    )
+    parser.add_argument(
+        "--lease_seconds",
+        type=float,
+        default=600.0,
+        help="Seconds a queued batch is held without a heartbeat.",
+    )
     parser.add_argument(
         "--log-file", type=Path, default="naturaDock.log", help="Path to the log file."
     )
@@ -110,13 +607,13 @@ def main():
         "--verbose", action="store_true", help="Enable verbose logging to the console."
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Load config file if provided
     if args.config:
         config = toml.load(args.config)
         parser.set_defaults(**config)
-        args = parser.parse_args()
+        args = parser.parse_args(argv)
 
     # Validate required arguments
     required_args = ["protein", "ligands", "output"]
@@ -124,69 +621,436 @@ def main():
         if not getattr(args, arg):
             raise ValueError(f"Missing required argument: --{arg}")
 
+    # Stage modules pull in RDKit, pandas, PDBFixer and plotting libraries, so
+    # each stage imports its own dependencies just before it runs
+    from naturaDock.stages import StageGraph
+
     # Create output directory if it doesn't exist
     args.output.mkdir(exist_ok=True)
 
-    # 1. Load and validate protein
-    print("--- Loading and Validating Protein ---")
-    protein_structure = load_protein(args.protein)
-    validate_protein(args.protein)
-
-    # 2. Prepare protein
-    print("--- Preparing Protein ---")
-    protein_pdbqt = args.output / f"{args.protein.stem}.pdbqt"
-    prepare_protein(args.protein, protein_pdbqt)
-
-    # 3. Load and filter compounds
-    print("--- Loading and Filtering Compounds ---")
-    compounds = load_compounds(args.ligands)
-    filtered_compounds = filter_compounds(
-        compounds,
-        max_mol_weight=args.max_mol_weight,
-        max_rotatable_bonds=args.max_rotatable_bonds,
-        min_logp=args.min_logp,
-        max_logp=args.max_logp,
-    )
-
-    # 4. Generate conformers
-    print("--- Generating Conformers ---")
-    compounds_with_conformers = generate_conformers(filtered_compounds)
-
-    # 5. Prepare compounds
-    print("--- Preparing Compounds ---")
-    prepared_compounds_dir = args.output / "prepared_compounds"
-    prepared_compounds_dir.mkdir(exist_ok=True)
-    prepared_compounds = prepare_compounds(
-        compounds_with_conformers, prepared_compounds_dir
-    )
-
-    # 6. Define binding site
-    binding_site = define_binding_site(
-        protein_structure,
-        size_x=args.size_x,
-        size_y=args.size_y,
-        size_z=args.size_z,
-    )
-
-    # 7. Run docking
-    print("--- Running Docking ---")
+    quarantine = []
+    conformer_options = {
+        "num_conformers": args.num_conformers,
+        "num_threads": args.conformer_threads,
+        "prune_rms_threshold": args.conformer_rms,
+        "embed_timeout": args.embed_timeout,
+        "max_embed_iterations": args.max_embed_iterations,
+        "quarantine": quarantine,
+    }
+    engine = get_engine(args.engine)
+    docking_options = {
+        "num_workers": args.num_workers,
+        "snapshot_interval": args.snapshot_interval,
+        "engine": engine.name,
+        "exhaustiveness": args.exhaustiveness,
+        "seed": args.seed,
+        "scoring": args.scoring,
+        "cpus_per_worker": args.cpus_per_worker,
+        "pin_workers": args.pin_workers,
+        "avoid_smt": args.avoid_smt,
+        "result_cache": args.result_cache,
+    }
     docking_results_dir = args.output / "docking_results"
-    docking_results_dir.mkdir(exist_ok=True)
-
-    run_parallel_docking(
-        protein_pdbqt=protein_pdbqt,
-        prepared_compounds=prepared_compounds,
-        binding_site=binding_site,
-        docking_results_dir=docking_results_dir,
-        num_workers=args.num_workers,
+    # Cluster expansion and active learning embed compounds while docking
+    screen_whole_library = (
+        args.cluster_threshold is None and args.active_learning_rounds <= 0
     )
+    if args.blind and (not screen_whole_library or args.queue):
+        raise ValueError(
+            "--blind cannot be combined with --cluster_threshold, "
+            "--active_learning_rounds or --queue"
+        )
+    use_maps = args.maps_cache is not None and engine.supports_maps
+    if args.maps_cache is not None and not use_maps:
+        print(
+            f"Warning: {engine.name} cannot load affinity maps; not using the cache."
+        )
+    elif use_maps and args.blind:
+        print("Warning: blind docking uses many boxes; not using the maps cache.")
+        use_maps = False
+
+    # The receptor and ligand branches are independent until docking, so
+    # they run as concurrent stages of a dependency graph
+    graph = StageGraph()
+
+    def receptor():
+        from naturaDock.preprocessing.protein import (
+            load_protein,
+            validate_protein,
+            prepare_protein,
+            define_binding_site,
+        )
+
+        # 1. Load and validate protein
+        print("--- Loading and Validating Protein ---")
+        protein_structure = load_protein(args.protein)
+        validate_protein(args.protein)
+
+        # 2. Prepare protein
+        print("--- Preparing Protein ---")
+        protein_pdbqt = args.output / f"{args.protein.stem}.pdbqt"
+        prepare_protein(args.protein, protein_pdbqt)
+
+        # 4. Define binding site
+        binding_site = define_binding_site(
+            protein_structure,
+            size_x=args.size_x,
+            size_y=args.size_y,
+            size_z=args.size_z,
+        )
+        return {"pdbqt": protein_pdbqt, "binding_site": binding_site}
+
+    def compounds():
+        # 3. Load and filter compounds
+        print("--- Loading and Filtering Compounds ---")
+        from naturaDock.preprocessing.compounds import (
+            load_compounds,
+            filter_compounds,
+        )
+        from naturaDock.preprocessing.packed import PACK_SUFFIX, PackedLibrary
+
+        # A single library in the config file is not wrapped in a list
+        ligands = args.ligands if isinstance(args.ligands, list) else [args.ligands]
+        if len(ligands) == 1 and Path(ligands[0]).suffix == PACK_SUFFIX:
+            # Descriptors, conformers and PDBQT were computed by 'naturaDock pack'
+            packed = PackedLibrary(ligands[0])
+            selected = packed.select(
+                max_mol_weight=args.max_mol_weight,
+                max_rotatable_bonds=args.max_rotatable_bonds,
+                min_logp=args.min_logp,
+                max_logp=args.max_logp,
+            )
+            print(
+                f"{len(selected)} of {len(packed)} packed compounds pass the filters"
+            )
+            molecules = packed.molecules(selected)
+            args.num_conformers = packed.conformer_options.get("num_conformers", 1)
+        else:
+            packed = selected = None
+            molecules = filter_compounds(
+                load_compounds(ligands, num_workers=args.load_workers),
+                max_mol_weight=args.max_mol_weight,
+                max_rotatable_bonds=args.max_rotatable_bonds,
+                min_logp=args.min_logp,
+                max_logp=args.max_logp,
+            )
+        if not screen_whole_library or args.estimate or args.time_budget is not None:
+            # Later stages iterate over the molecules more than once
+            molecules = list(molecules)
+        return {"molecules": molecules, "packed": packed, "selected": selected}
+
+    def ligands(compounds):
+        prepared_compounds_dir = args.output / "prepared_compounds"
+        prepared_compounds_dir.mkdir(exist_ok=True)
+        if compounds["packed"] is not None:
+            # 5-6. The packed PDBQT of the selected compounds, each written
+            # out as docking reaches it
+            return compounds["packed"].prepared(
+                prepared_compounds_dir, compounds["selected"]
+            )
+
+        from naturaDock.preprocessing.compounds import (
+            generate_conformers,
+            prepare_compounds,
+        )
+
+        # 5. Generate conformers
+        print("--- Generating Conformers ---")
+        compounds_with_conformers = generate_conformers(
+            compounds["molecules"], **conformer_options
+        )
+
+        # 6. Prepare compounds
+        print("--- Preparing Compounds ---")
+        return prepare_compounds(compounds_with_conformers, prepared_compounds_dir)
+
+    def estimate(receptor, compounds):
+        # Time a calibration sample through preparation and docking
+        print("--- Estimating Run Time ---")
+        import psutil
+        from naturaDock.estimate import (
+            DEFAULT_EXHAUSTIVENESS,
+            CostModel,
+            calibrate,
+            format_estimate,
+            ligand_features,
+            plan_for_budget,
+            project_wall_time,
+        )
+
+        # Workers as run_parallel_docking will start them
+        num_workers = args.num_workers or max(
+            1, psutil.cpu_count(logical=False) // args.cpus_per_worker
+        )
+        exhaustiveness = args.exhaustiveness or DEFAULT_EXHAUSTIVENESS
+        measurements = calibrate(
+            compounds["molecules"],
+            receptor["pdbqt"],
+            receptor["binding_site"],
+            args.output / "calibration",
+            sample_size=args.calibration_size,
+            conformer_options={**conformer_options, "quarantine": None},
+            engine=engine.name,
+            exhaustiveness=exhaustiveness,
+            scoring=args.scoring,
+            cpus_per_worker=args.cpus_per_worker,
+        )
+        model = CostModel.fit(measurements)
+        features = [ligand_features(mol) for mol in compounds["molecules"]]
+        projection = project_wall_time(
+            model, features, receptor["binding_site"], exhaustiveness, num_workers
+        )
+        plan = None
+        if args.time_budget is not None:
+            plan = plan_for_budget(
+                model,
+                features,
+                receptor["binding_site"],
+                num_workers,
+                args.time_budget * 3600,
+                max_exhaustiveness=max(exhaustiveness, DEFAULT_EXHAUSTIVENESS),
+            )
+        print(format_estimate(projection, model, num_workers, plan))
+        estimate_path = args.output / "estimate.json"
+        with open(estimate_path, "w") as f:
+            json.dump(
+                {
+                    "calibration": measurements,
+                    "projection": projection,
+                    "plan": plan,
+                },
+                f,
+                indent=2,
+                default=float,
+            )
+        print(f"Estimate saved to {estimate_path}")
+        return plan
+
+    def docking_box(receptor, estimate=None) -> dict:
+        # The box planned for the time budget replaces the receptor's box
+        return estimate["binding_site"] if estimate else receptor["binding_site"]
+
+    def maps(receptor, estimate=None):
+        from naturaDock.docking.maps_cache import evict_maps, get_or_create_maps
+
+        maps = get_or_create_maps(
+            receptor["pdbqt"],
+            docking_box(receptor, estimate),
+            cache_dir=args.maps_cache,
+            scoring=args.scoring or "vina",
+        )
+        evict_maps(
+            args.maps_cache,
+            max_age_days=args.maps_cache_max_age,
+            max_size_gb=args.maps_cache_max_size,
+            keep=(maps.parent.name,),
+        )
+        return maps
+
+    def docking(receptor, compounds, ligands=None, estimate=None, maps=None):
+        # 7. Dock the library, or part of it
+        protein_pdbqt = receptor["pdbqt"]
+        binding_site = docking_box(receptor, estimate)
+        if estimate:
+            docking_options["exhaustiveness"] = estimate["exhaustiveness"]
+        if maps is not None:
+            docking_options["maps"] = maps
+
+        if args.cluster_threshold is not None:
+            # 5. Cluster compounds, dock representatives, then expand best clusters
+            print("--- Clustering Compounds ---")
+            from naturaDock.preprocessing.clustering import cluster_molecules
+            from naturaDock.docking.screening import (
+                assign_names,
+                run_cluster_expansion_docking,
+            )
+
+            molecules = assign_names(compounds["molecules"])
+            labels, representatives = cluster_molecules(
+                molecules, similarity_threshold=args.cluster_threshold
+            )
+
+            print("--- Running Docking ---")
+            run_cluster_expansion_docking(
+                molecules,
+                labels,
+                representatives,
+                protein_pdbqt,
+                binding_site,
+                args.output,
+                expand_fraction=args.expand_fraction,
+                conformer_options=conformer_options,
+                docking_options=docking_options,
+            )
+        elif args.active_learning_rounds > 0:
+            # 5. Dock a random seed batch, then the surrogate model's best picks
+            print("--- Running Active Learning Docking ---")
+            import pandas as pd
+            from naturaDock.docking.active_learning import (
+                recall_report,
+                run_active_learning_docking,
+            )
+            from naturaDock.docking.screening import assign_names
+
+            _, history = run_active_learning_docking(
+                assign_names(compounds["molecules"]),
+                protein_pdbqt,
+                binding_site,
+                args.output,
+                num_rounds=args.active_learning_rounds,
+                fraction=args.active_learning_fraction,
+                conformer_options=conformer_options,
+                docking_options=docking_options,
+            )
+            rounds_path = args.output / "active_learning_rounds.csv"
+            pd.DataFrame(
+                [
+                    {key: value for key, value in entry.items() if key != "compounds"}
+                    for entry in history
+                ]
+            ).to_csv(rounds_path, index=False)
+            print(f"Active learning rounds saved to {rounds_path}")
+            if args.active_learning_reference is not None:
+                report = recall_report(
+                    history, pd.read_csv(args.active_learning_reference)
+                )
+                report_path = args.output / "active_learning_recall.csv"
+                report.to_csv(report_path, index=False)
+                print(report.to_string(index=False))
+                print(f"Recall report saved to {report_path}")
+        else:
+            print("--- Running Docking ---")
+            from naturaDock.docking.parallel_dock import run_parallel_docking
+
+            docking_results_dir.mkdir(exist_ok=True)
+
+            if args.blind:
+                from naturaDock.docking.blind import run_blind_docking
+
+                run_blind_docking(
+                    protein_pdbqt,
+                    ligands,
+                    docking_results_dir,
+                    box_size=args.blind_box_size,
+                    overlap=args.blind_overlap,
+                    rmsd_threshold=args.blind_rmsd,
+                    **docking_options,
+                )
+            elif args.queue:
+                from naturaDock.docking.work_queue import (
+                    QUEUE_FILENAME,
+                    WorkQueue,
+                    run_worker,
+                )
+
+                # Workers on other hosts read everything they need from the queue
+                queue = WorkQueue(args.output / QUEUE_FILENAME)
+                queue.configure(
+                    protein_pdbqt=str(protein_pdbqt.resolve()),
+                    binding_site={k: float(v) for k, v in binding_site.items()},
+                    docking_results_dir=str(docking_results_dir.resolve()),
+                    docking_options={
+                        key: str(value) if isinstance(value, Path) else value
+                        for key, value in docking_options.items()
+                        if key != "num_workers"
+                    },
+                )
+                added = queue.enqueue(ligands)
+                print(
+                    f"Queued {added} jobs in {queue.path}; more hosts can join "
+                    f"with 'naturaDock worker {args.output}'"
+                )
+                run_worker(
+                    queue.path,
+                    num_workers=args.num_workers,
+                    lease_seconds=args.lease_seconds,
+                )
+            else:
+                run_parallel_docking(
+                    protein_pdbqt=protein_pdbqt,
+                    prepared_compounds=ligands,
+                    binding_site=binding_site,
+                    docking_results_dir=docking_results_dir,
+                    **docking_options,
+                )
+
+    graph.add("receptor", receptor)
+    graph.add("compounds", compounds)
+    docking_requires = ["receptor", "compounds"]
+    if args.estimate or args.time_budget is not None:
+        graph.add("estimate", estimate, requires=("receptor", "compounds"))
+        docking_requires.append("estimate")
+    if not args.estimate:
+        if screen_whole_library:
+            graph.add("ligands", ligands, requires=("compounds",))
+            docking_requires.append("ligands")
+        if use_maps:
+            maps_requires = [
+                dep for dep in ("receptor", "estimate") if dep in graph.stages
+            ]
+            graph.add("maps", maps, requires=maps_requires)
+            docking_requires.append("maps")
+        graph.add("docking", docking, requires=docking_requires)
+
+    results = graph.run()
+    print(graph.format_timings())
+    graph.save_timings(args.output / "stage_timings.json")
+    if args.estimate:
+        return
+    protein_pdbqt = results["receptor"]["pdbqt"]
+
+    if args.result_cache is not None:
+        from naturaDock.docking.result_cache import evict_results
+
+        evict_results(args.result_cache, max_size_gb=args.result_cache_max_size)
+
+    if quarantine:
+        quarantine_path = args.output / "quarantine.csv"
+        with open(quarantine_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(quarantine[0]))
+            writer.writeheader()
+            writer.writerows(quarantine)
+        print(f"{len(quarantine)} molecules quarantined, see {quarantine_path}")
 
     # 8. Run analysis
     if not args.skip_analysis:
         print("--- Running Analysis ---")
+        from naturaDock.analysis.results import (
+            aggregate_results,
+            collapse_conformer_results,
+        )
+        from naturaDock.analysis.export import rank_and_export_results
+        from naturaDock.analysis.statistics import generate_statistics
+
         results_df = aggregate_results(docking_results_dir)
+        if (args.contacts or args.contact_constraints) and not results_df.empty:
+            from naturaDock.analysis.contacts import analyze_contacts
+
+            results_df = analyze_contacts(
+                results_df,
+                docking_results_dir,
+                protein_pdbqt,
+                constraints=args.contact_constraints or (),
+            )
+            if args.require_constraints:
+                results_df = results_df[results_df["passes_constraints"]]
+                print(f"{len(results_df)} poses satisfy the contact constraints")
+        if args.num_conformers > 1:
+            results_df = collapse_conformer_results(results_df)
         if not results_df.empty:
             rank_and_export_results(results_df, args.output, args.export_format)
+            if args.export_sdf:
+                from naturaDock.analysis.sdf_export import export_poses_sdf
+
+                export_poses_sdf(
+                    results_df,
+                    docking_results_dir,
+                    args.output,
+                    top_k=args.sdf_top_k,
+                    max_poses=args.sdf_poses,
+                    num_workers=args.num_workers,
+                    compression=args.sdf_compression,
+                )
             generate_statistics(results_df, args.output)
         else:
             print("No results to analyze.")
@@ -0,0 +1,347 @@
+# Fingerprint Clustering for Library Reduction
+
+from itertools import islice
+from typing import Iterable, Iterator, NamedTuple
+import numpy as np
+from rdkit import Chem, DataStructs
+from rdkit.Chem import rdFingerprintGenerator
+
+from .similarity import pack_fingerprints, popcount
+
+
+def compute_fingerprints(
+    molecules: Iterable[Chem.Mol],
+    radius: int = 2,
+    fp_size: int = 2048,
+    chunk_size: int = 10_000,
+    num_threads: int = 0,
+) -> Iterator[DataStructs.ExplicitBitVect]:
+    """
+    Computes Morgan fingerprints in multithreaded chunks.
+
+    Args:
+        molecules: An iterable of RDKit Mol objects.
+        radius: The Morgan radius (2 corresponds to ECFP4).
+        fp_size: The fingerprint length in bits.
+        chunk_size: The number of molecules fingerprinted per RDKit call.
+        num_threads: Threads RDKit uses per chunk; 0 uses all cores.
+
+    Yields:
+        One ExplicitBitVect per molecule, in input order.
+    """
+    generator = rdFingerprintGenerator.GetMorganGenerator(
+        radius=radius, fpSize=fp_size
+    )
+    iterator = iter(molecules)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield from generator.GetFingerprints(chunk, numThreads=num_threads)
+
+
+# Candidate pairs checked at a time, bounding temporary memory
+PAIR_CHUNK = 1 << 17
+
+
+class _Packed(NamedTuple):
+    """Packed fingerprints with their popcounts, in total and per word."""
+
+    words: np.ndarray
+    counts: np.ndarray
+    word_counts: np.ndarray
+
+    @classmethod
+    def of(cls, fingerprints: list[DataStructs.ExplicitBitVect]) -> "_Packed":
+        words = pack_fingerprints(fingerprints, fingerprints[0].GetNumBits())
+        word_counts = popcount(words[..., None]).astype(np.uint8)
+        return cls(words, word_counts.sum(axis=1, dtype=np.int64), word_counts)
+
+
+def _grow(array: np.ndarray, size: int) -> np.ndarray:
+    """Returns ``array`` with room for ``size`` rows, doubling its capacity."""
+    if size <= len(array):
+        return array
+    grown = np.empty((max(size, 2 * len(array)),) + array.shape[1:], array.dtype)
+    grown[: len(array)] = array
+    return grown
+
+
+def _postings(rows: np.ndarray, bits: np.ndarray, num_bits: int) -> tuple:
+    """Groups (row, bit) entries by bit: the start of each bit and the rows."""
+    order = np.lexsort((rows, bits))
+    starts = np.searchsorted(bits[order], np.arange(num_bits + 1))
+    return starts, rows[order]
+
+
+def _shared_bit_pairs(rows: np.ndarray, bits: np.ndarray, postings: tuple):
+    """
+    Yields the (row, posting row) pairs sharing a bit, in chunks.
+
+    A pair sharing several bits is yielded once for each.
+
+    Args:
+        rows: The query row of each (row, bit) entry.
+        bits: The bit of each entry.
+        postings: See `_postings`.
+    """
+    starts, posting_rows = postings
+    sizes = starts[bits + 1] - starts[bits]
+    keep = sizes > 0
+    rows, bits, sizes = rows[keep], bits[keep], sizes[keep]
+    ends = np.cumsum(sizes)
+    begin = 0
+    while begin < len(rows):
+        # Whole entries, up to PAIR_CHUNK pairs (or one larger entry)
+        done = ends[begin - 1] if begin else 0
+        stop = max(begin + 1, int(np.searchsorted(ends, done + PAIR_CHUNK, "right")))
+        chunk_sizes = sizes[begin:stop]
+        offsets = np.arange(chunk_sizes.sum()) - np.repeat(
+            np.cumsum(chunk_sizes) - chunk_sizes, chunk_sizes
+        )
+        positions = np.repeat(starts[bits[begin:stop]], chunk_sizes) + offsets
+        yield np.repeat(rows[begin:stop], chunk_sizes), posting_rows[positions]
+        begin = stop
+
+
+def _tanimoto(common: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Tanimoto similarities from shared and total bit counts; 0 for two empty."""
+    union = a + b - common
+    return np.divide(common, union, out=np.zeros(common.shape), where=union > 0)
+
+
+def _best_per_row(rows, others, similarities):
+    """Keeps each row's most similar other, the lowest-numbered on ties."""
+    order = np.lexsort((others, -similarities, rows))
+    rows, others, similarities = rows[order], others[order], similarities[order]
+    first = np.flatnonzero(np.diff(rows, prepend=-1))
+    return rows[first], others[first], similarities[first]
+
+
+class _CentroidIndex:
+    """
+    Packed centroid fingerprints with an inverted index of their prefixes.
+
+    Bits are ranked rarest first, by their frequency in the first block. Two
+    fingerprints with ``a`` and ``b`` bits set and a Tanimoto similarity of
+    at least ``t`` share at least ``t * max(a, b)`` bits, so the rarest bit
+    they share is among the first ``a - ceil(t * a) + 1`` ranked bits of one
+    and the first ``b - ceil(t * b) + 1`` of the other (prefix filtering).
+    Only centroids sharing such a prefix bit with a fingerprint are
+    candidates, and only those the popcount bounds allow are compared.
+    """
+
+    def __init__(self, threshold: float, num_bits: int):
+        self.threshold = threshold
+        self.num_bits = num_bits
+        self.order = None
+        self.centroids = None
+        self.size = 0
+        # Posting lists in pieces, merged like a binary counter
+        self.pieces: list[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+
+    def prefixes(self, block: _Packed) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the (row, bit) entries of each row's prefix bits."""
+        bits = np.unpackbits(block.words.view(np.uint8), axis=1, bitorder="little")
+        if self.order is None:
+            self.order = np.argsort(bits.sum(axis=0), kind="stable")
+        rows, columns = np.nonzero(bits[:, self.order])
+        # The rank of each set bit within its row, counting from 1
+        positions = np.arange(1, len(rows) + 1) - np.repeat(
+            np.cumsum(block.counts) - block.counts, block.counts
+        )
+        # Rounded down, which only lengthens the prefixes
+        overlap = np.ceil(self.threshold * block.counts - 1e-9).astype(np.int64)
+        prefix = positions <= (block.counts - overlap + 1)[rows]
+        return rows[prefix], self.order[columns[prefix]]
+
+    def similarities(self, block: _Packed, rows, others, targets: _Packed):
+        """
+        Returns the candidate pairs reaching the threshold and their similarity.
+
+        Pairs are bounded by their popcounts, then by the sum of their
+        per-word minimum popcounts, before their packed words are compared.
+        """
+        t = self.threshold
+        a, b = block.counts[rows], targets.counts[others]
+        keep = np.minimum(a, b) >= t * np.maximum(a, b) - 1e-9
+        rows, others, a, b = rows[keep], others[keep], a[keep], b[keep]
+        shared = np.minimum(block.word_counts[rows], targets.word_counts[others])
+        keep = shared.sum(axis=1, dtype=np.int64) * (1 + t) >= t * (a + b) - 1e-9
+        rows, others, a, b = rows[keep], others[keep], a[keep], b[keep]
+        common = popcount(block.words[rows] & targets.words[others])
+        similarities = _tanimoto(common, a, b)
+        close = similarities >= t
+        return rows[close], others[close], similarities[close]
+
+    def nearest(self, block: _Packed, prefix_rows, prefix_bits):
+        """
+        Finds each row's most similar centroid, the lowest label on ties.
+
+        Returns:
+            The best similarity and the label of each row, or -1 for rows
+            no centroid reaches the threshold for.
+        """
+        best = np.full(len(block.words), -1.0)
+        best_labels = np.full(len(block.words), -1, dtype=np.int64)
+        for starts, labels, _ in self.pieces:
+            for rows, others in _shared_bit_pairs(
+                prefix_rows, prefix_bits, (starts, labels)
+            ):
+                rows, others, similarities = _best_per_row(
+                    *self.similarities(block, rows, others, self.centroids)
+                )
+                better = (similarities > best[rows]) | (
+                    (similarities == best[rows]) & (others < best_labels[rows])
+                )
+                best[rows[better]] = similarities[better]
+                best_labels[rows[better]] = others[better]
+        return best, best_labels
+
+    def add(self, block: _Packed, leader: np.ndarray, prefix_rows, prefix_bits):
+        """Adds the leader rows of a block as centroids, labelled in order."""
+        stop = self.size + int(leader.sum())
+        if self.centroids is None:
+            self.centroids = _Packed(*(field[:0] for field in block))
+        self.centroids = _Packed(*(_grow(field, stop) for field in self.centroids))
+        for field, values in zip(self.centroids, block):
+            field[self.size : stop] = values[leader]
+        in_leader = leader[prefix_rows]
+        labels = self.size + np.cumsum(leader) - 1
+        self.size = stop
+        self.pieces.append(
+            self._piece(labels[prefix_rows[in_leader]], prefix_bits[in_leader])
+        )
+        while len(self.pieces) > 1 and len(self.pieces[-2][1]) <= 2 * len(
+            self.pieces[-1][1]
+        ):
+            _, labels_b, bits_b = self.pieces.pop()
+            _, labels_a, bits_a = self.pieces.pop()
+            self.pieces.append(
+                self._piece(
+                    np.concatenate([labels_a, labels_b]),
+                    np.concatenate([bits_a, bits_b]),
+                )
+            )
+
+    def _piece(self, labels, bits):
+        starts, labels = _postings(labels, bits, self.num_bits)
+        return starts, labels, np.sort(bits, kind="stable")
+
+
+def sphere_exclusion_clusters(
+    fingerprints: Iterable[DataStructs.ExplicitBitVect],
+    similarity_threshold: float = 0.6,
+    block_size: int = 4096,
+) -> tuple[np.ndarray, list[int]]:
+    """
+    Clusters fingerprints by leader-based sphere exclusion.
+
+    Fingerprints are visited in order; each is assigned to its most similar
+    existing centroid when that similarity reaches the threshold, otherwise it
+    becomes a new centroid. Fingerprints are packed into 64-bit words and
+    processed in blocks. A block is compared with the centroids that can
+    reach the threshold, found by prefix filtering and popcount bounds (see
+    `_CentroidIndex`), and then with the centroids created within the block,
+    in order. Candidate pairs are checked in chunks, so memory is bounded by
+    the block size and the packed centroids, and the fingerprints can be
+    streamed from `compute_fingerprints`.
+
+    Args:
+        fingerprints: An iterable of fingerprints.
+        similarity_threshold: Minimum Tanimoto similarity to join a cluster.
+        block_size: The number of fingerprints packed and compared at once.
+
+    Returns:
+        The cluster label of each fingerprint and, for each cluster, the index
+        of its centroid (its representative).
+    """
+    iterator = iter(fingerprints)
+    if similarity_threshold <= 0:
+        # Every similarity reaches the threshold, so all join the first
+        count = sum(1 for _ in iterator)
+        return np.zeros(count, dtype=np.int64), [0] if count else []
+
+    labels = []
+    centroids: list[int] = []
+    index = None
+    offset = 0
+    while fps := list(islice(iterator, block_size)):
+        block = _Packed.of(fps)
+        if index is None:
+            index = _CentroidIndex(similarity_threshold, block.words.shape[1] * 64)
+        prefix_rows, prefix_bits = index.prefixes(block)
+        best, block_labels = index.nearest(block, prefix_rows, prefix_bits)
+        claimed = best >= 0
+
+        # Close pairs within the block, of a row and an earlier row
+        pairs = [(np.zeros(0, dtype=np.int64),) * 2 + (np.zeros(0),)]
+        postings = _postings(prefix_rows, prefix_bits, index.num_bits)
+        for rows, others in _shared_bit_pairs(prefix_rows, prefix_bits, postings):
+            earlier = others < rows
+            pairs.append(
+                index.similarities(block, rows[earlier], others[earlier], block)
+            )
+        pair_rows, pair_others, pair_similarities = map(np.concatenate, zip(*pairs))
+        order = np.lexsort((pair_others, pair_rows))
+        pair_rows = pair_rows[order]
+        pair_others = pair_others[order]
+        pair_similarities = pair_similarities[order]
+        pair_starts = np.searchsorted(pair_rows, np.arange(len(fps) + 1))
+
+        # Rows no earlier centroid claims become centroids in order, unless a
+        # centroid created earlier in the block claims them
+        leader = np.zeros(len(fps), dtype=bool)
+        for row in np.flatnonzero(~claimed).tolist():
+            start, stop = pair_starts[row], pair_starts[row + 1]
+            if start < stop:
+                others = pair_others[start:stop]
+                similarities = np.where(
+                    leader[others], pair_similarities[start:stop], -1.0
+                )
+                top = int(similarities.argmax())
+                if similarities[top] >= 0:
+                    block_labels[row] = block_labels[others[top]]
+                    continue
+            block_labels[row] = len(centroids)
+            centroids.append(offset + row)
+            leader[row] = True
+
+        # Claimed rows may be closer to a centroid created earlier in the block
+        candidate = claimed[pair_rows] & leader[pair_others]
+        rows, others, similarities = _best_per_row(
+            pair_rows[candidate], pair_others[candidate], pair_similarities[candidate]
+        )
+        better = similarities > best[rows]
+        block_labels[rows[better]] = block_labels[others[better]]
+
+        index.add(block, leader, prefix_rows, prefix_bits)
+        labels.append(block_labels)
+        offset += len(fps)
+    if not labels:
+        return np.zeros(0, dtype=np.int64), centroids
+    return np.concatenate(labels), centroids
+
+
+def cluster_molecules(
+    molecules: list[Chem.Mol],
+    similarity_threshold: float = 0.6,
+    radius: int = 2,
+    fp_size: int = 2048,
+    num_threads: int = 0,
+) -> tuple[np.ndarray, list[int]]:
+    """
+    Clusters molecules by Morgan fingerprint similarity.
+
+    Args:
+        molecules: A list of RDKit Mol objects.
+        similarity_threshold: Minimum Tanimoto similarity to join a cluster.
+        radius: The Morgan radius.
+        fp_size: The fingerprint length in bits.
+        num_threads: Threads for fingerprint generation; 0 uses all cores.
+
+    Returns:
+        The cluster label of each molecule and the index of each cluster's
+        representative, see `sphere_exclusion_clusters`.
+    """
+    fingerprints = compute_fingerprints(
+        molecules, radius=radius, fp_size=fp_size, num_threads=num_threads
+    )
+    return sphere_exclusion_clusters(fingerprints, similarity_threshold)
@@ -1,77 +1,612 @@
 # Compound Library Preprocessing
 
+from collections import deque
 from pathlib import Path
-from typing import Iterable, Iterator
+from typing import BinaryIO, Iterable, Iterator
 from rdkit import Chem
 from rdkit.Chem import AllChem
 from rdkit.Chem import Descriptors
 import subprocess
 from .utils.utils import get_meeko_path
 
+import glob
+import gzip
+import io
+import math
+import multiprocessing
+import pickle
 import sys
 import tempfile
 
 
-def load_compounds(library_path: Path) -> Iterator[Chem.Mol]:
+# Molecule properties recording where a library molecule was read from
+SOURCE_PROP = "naturaDock_source"
+RECORD_PROP = "naturaDock_record"
+
+LIBRARY_FORMATS = {
+    ".sdf": "sdf",
+    ".smi": "smiles",
+    ".smiles": "smiles",
+    ".mol2": "mol2",
+}
+COMPRESSIONS = {".gz": "gzip", ".zst": "zstd", ".zstd": "zstd"}
+
+
+def compound_name(mol: Chem.Mol, index: int) -> str:
+    """
+    Returns the name a molecule is prepared and docked under.
+
+    This is the molecule's title, or ``compound_<index>`` for an untitled
+    molecule. `load_compounds` names untitled molecules by their position in
+    the whole library, so names do not depend on the filters applied later.
+    """
+    name = mol.GetProp("_Name") if mol.HasProp("_Name") else ""
+    return name or f"compound_{index}"
+
+
+def _library_format(path: Path) -> tuple[str, str | None]:
+    """
+    Identifies a library file's format and compression from its suffixes.
+
+    Raises:
+        ValueError: If the file format is unsupported.
+    """
+    suffixes = [suffix.lower() for suffix in path.suffixes]
+    compression = COMPRESSIONS.get(suffixes[-1]) if suffixes else None
+    if compression is not None:
+        suffixes.pop()
+    file_format = LIBRARY_FORMATS.get(suffixes[-1]) if suffixes else None
+    if file_format is None:
+        raise ValueError(f"Unsupported file format: {''.join(path.suffixes)}")
+    return file_format, compression
+
+
+def library_files(library) -> list[Path]:
+    """
+    Expands a compound library into its files.
+
+    Args:
+        library: A library file, a directory of library files, a glob
+            pattern, or a list of any of these.
+
+    Returns:
+        The library files in order; directories and globs are sorted.
+
+    Raises:
+        FileNotFoundError: If a file does not exist or a directory or glob
+            contains no library files.
+    """
+    entries = [library] if isinstance(library, (str, Path)) else list(library)
+    files = []
+    for entry in entries:
+        path = Path(entry)
+        if path.is_dir():
+            found = []
+            for child in sorted(path.iterdir()):
+                try:
+                    _library_format(child)
+                except ValueError:
+                    continue
+                found.append(child)
+        elif path.exists():
+            found = [path]
+        elif any(char in str(entry) for char in "*?["):
+            found = sorted(Path(match) for match in glob.glob(str(entry)))
+        else:
+            raise FileNotFoundError(f"Compound library not found at: {path}")
+        if not found:
+            raise FileNotFoundError(f"No compound library files in: {entry}")
+        files.extend(found)
+    return files
+
+
+def _open_library(path: Path, compression: str | None) -> BinaryIO:
+    """Opens a library file, decompressing gzip or zstd on the fly."""
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError(
+                "Reading .zst libraries requires the zstandard package "
+                "(pip install zstandard)."
+            ) from e
+        return zstandard.open(path, "rb")
+    return open(path, "rb")
+
+
+def _smiles_records(stream: BinaryIO) -> Iterator[Chem.Mol | None]:
+    """
+    Parses SMILES lines with an optional name; None if unparsable.
+
+    In tab-separated lines the name is the second column, so it may contain
+    spaces; otherwise it is the first word after the SMILES.
+    """
+    for line in io.TextIOWrapper(stream):
+        fields = line.rstrip("\r\n").split("\t") if "\t" in line else line.split()
+        if not fields or not fields[0].strip():
+            continue
+        mol = Chem.MolFromSmiles(fields[0].strip())
+        if mol is not None and len(fields) > 1 and fields[1].strip():
+            mol.SetProp("_Name", fields[1].strip())
+        yield mol
+
+
+def _read_library_file(path: Path) -> Iterator[Chem.Mol]:
+    """
+    Streams the molecules of one library file, tagged with their origin.
+
+    Every molecule gets the file in ``naturaDock_source`` and its record
+    index in the file in ``naturaDock_record``; records that fail to parse
+    are skipped but still counted.
+    """
+    file_format, compression = _library_format(path)
+    with _open_library(path, compression) as stream:
+        if file_format == "sdf":
+            records = Chem.ForwardSDMolSupplier(stream)
+        elif file_format == "smiles":
+            records = _smiles_records(stream)
+        else:
+            # RDKit's Mol2 parser can be less robust; this is a basic implementation.
+            # For production, a more robust parser might be needed.
+            records = [Chem.MolFromMol2Block(stream.read().decode())]
+        for record, mol in enumerate(records):
+            if mol is None:
+                continue
+            mol.SetProp(SOURCE_PROP, str(path))
+            mol.SetIntProp(RECORD_PROP, record)
+            yield mol
+
+
+def _process_context():
     """
-    Loads a compound library from a file, supporting SDF, MOL2, and SMILES.
+    Returns the multiprocessing context for this module's child processes.
+
+    The pipeline prepares ligands on one thread while the receptor is
+    prepared on another, and a child forked from a threaded process can
+    deadlock on a lock another thread held, such as the import lock or one
+    of OpenMM's. Children are forked from a single-threaded fork server
+    instead, with this module preloaded, or spawned where there is none.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _parsing_worker(path: Path, spool_path: Path, conn, batch_size: int):
+    """
+    Child process parsing one library file into a spool of Mol binaries.
+
+    Batches are pickled one after another into ``spool_path``; None is sent
+    on ``conn`` once the file is complete, or the exception that stopped it.
+    """
+    try:
+        with open(spool_path, "wb") as spool:
+            batch = []
+            for mol in _read_library_file(path):
+                batch.append(mol.ToBinary(Chem.PropertyPickleOptions.AllProps))
+                if len(batch) == batch_size:
+                    pickle.dump(batch, spool, protocol=pickle.HIGHEST_PROTOCOL)
+                    batch = []
+            pickle.dump(batch, spool, protocol=pickle.HIGHEST_PROTOCOL)
+        conn.send(None)
+    except Exception as e:
+        conn.send(e)
+    finally:
+        conn.close()
+
+
+def _read_spool(spool_path: Path) -> Iterator[Chem.Mol]:
+    """Yields the molecules of a spool written by `_parsing_worker`."""
+    with open(spool_path, "rb") as spool:
+        while True:
+            try:
+                batch = pickle.load(spool)
+            except EOFError:
+                return
+            for binary in batch:
+                yield Chem.Mol(binary)
+
+
+def _read_library_files_parallel(
+    files: list[Path], num_workers: int, batch_size: int
+) -> Iterator[Chem.Mol]:
+    """
+    Decompresses and parses several files at once, yielding in file order.
+
+    Each of up to ``num_workers`` child processes parses a whole file into a
+    temporary spool, so files are parsed in parallel however slowly they are
+    consumed. A worker for the next file starts once the oldest spool has
+    been read, bounding the spools on disk to ``num_workers`` files.
+    """
+    context = _process_context()
+    pending = enumerate(files)
+    workers = deque()
+
+    with tempfile.TemporaryDirectory(prefix="naturaDock_spool_") as spool_dir:
+
+        def start_next():
+            index, path = next(pending, (None, None))
+            if path is None:
+                return
+            spool_path = Path(spool_dir) / f"{index}.pickle"
+            parent_conn, child_conn = context.Pipe(duplex=False)
+            process = context.Process(
+                target=_parsing_worker,
+                args=(path, spool_path, child_conn, batch_size),
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            workers.append((path, spool_path, process, parent_conn))
+
+        try:
+            for _ in range(num_workers):
+                start_next()
+            while workers:
+                path, spool_path, process, conn = workers[0]
+                try:
+                    error = conn.recv()
+                except EOFError:
+                    raise RuntimeError(f"Parsing {path} stopped unexpectedly")
+                if error is not None:
+                    raise error
+                yield from _read_spool(spool_path)
+                workers.popleft()
+                conn.close()
+                process.join()
+                spool_path.unlink()
+                start_next()
+        finally:
+            # The consumer stopped early or a file failed
+            for _, _, process, conn in workers:
+                process.kill()
+                process.join()
+                conn.close()
+
+
+def load_compounds(
+    library_path, num_workers: int = 1, batch_size: int = 256
+) -> Iterator[Chem.Mol]:
+    """
+    Loads a compound library, supporting SDF, MOL2, and SMILES.
+
+    Libraries can be split over many files and compressed with gzip
+    (``.sdf.gz``, ``.smi.gz``) or zstd (``.zst``, with the ``zstandard``
+    package). Compressed files are decompressed while they are parsed,
+    without temporary files. Each molecule is tagged with its source file
+    (``naturaDock_source``) and record index in that file
+    (``naturaDock_record``). Untitled molecules are named after their
+    position in the library, see `compound_name`.
 
     Args:
-        library_path: The file path to the compound library.
+        library_path: A library file, a directory of library files, a glob
+            pattern, or a list of any of these.
+        num_workers: Files decompressed and parsed at once in child
+            processes; 1 parses in this process.
+        batch_size: Molecules a child process pickles at a time.
 
     Returns:
-        An iterator of RDKit Mol objects.
+        An iterator of RDKit Mol objects, in file and record order.
 
     Raises:
         FileNotFoundError: If the library file does not exist.
         ValueError: If the file format is unsupported.
     """
-    if not library_path.exists():
-        raise FileNotFoundError(f"Compound library not found at: {library_path}")
-
-    file_ext = library_path.suffix.lower()
-    if file_ext == ".sdf":
-        supplier = Chem.SDMolSupplier(str(library_path))
-    elif file_ext in [".smi", ".smiles"]:
-        supplier = Chem.SmilesMolSupplier(str(library_path), titleLine=False)
-    elif file_ext == ".mol2":
-        # RDKit's Mol2 parser can be less robust; this is a basic implementation.
-        # For production, a more robust parser might be needed.
-        mol = Chem.MolFromMol2File(str(library_path))
-        supplier = [mol] if mol else []
+    files = library_files(library_path)
+    for path in files:
+        _library_format(path)
+
+    if num_workers > 1 and len(files) > 1:
+        molecules = _read_library_files_parallel(
+            files, min(num_workers, len(files)), batch_size
+        )
     else:
-        raise ValueError(f"Unsupported file format: {file_ext}")
+        molecules = (mol for path in files for mol in _read_library_file(path))
+    return _named(molecules)
+
 
-    # Filter out None values in case of parsing errors
-    return (mol for mol in supplier if mol is not None)
+def _named(molecules: Iterator[Chem.Mol]) -> Iterator[Chem.Mol]:
+    """Gives untitled molecules their `compound_name` in library order."""
+    for index, mol in enumerate(molecules):
+        mol.SetProp("_Name", compound_name(mol, index))
+        yield mol
 
 
-def generate_conformers(molecules: Iterator[Chem.Mol]) -> Iterator[Chem.Mol]:
+def _prune_conformers(
+    mol: Chem.Mol, energies: list[float], rms_threshold: float
+) -> None:
     """
-    Generates a 3D conformer for each molecule and optimizes its geometry.
+    Removes near-duplicate conformers in place, keeping the lowest-energy ones.
 
     Args:
-        molecules: An iterator of RDKit Mol objects.
+        mol: An RDKit Mol with several conformers.
+        energies: The force-field energy of each conformer, in conformer order.
+        rms_threshold: Conformers within this heavy-atom RMSD (in Angstroms) of
+            a lower-energy conformer are removed.
+    """
+    heavy = Chem.RemoveHs(mol)
+    conf_ids = [conf.GetId() for conf in mol.GetConformers()]
+    kept = []
+    for i in sorted(range(len(conf_ids)), key=lambda i: energies[i]):
+        if all(
+            AllChem.GetConformerRMS(heavy, conf_ids[j], conf_ids[i]) > rms_threshold
+            for j in kept
+        ):
+            kept.append(i)
+    for i in set(range(len(conf_ids))) - set(kept):
+        mol.RemoveConformer(conf_ids[i])
 
-    Yields:
-        RDKit Mol objects with an embedded 3D conformer.
+
+def _embed_parameters(
+    num_threads: int = 0,
+    prune_rms_threshold: float = 0.5,
+    timeout: int = 0,
+    max_iterations: int = 0,
+    use_random_coords: bool = False,
+):
+    """Builds ETKDGv3 embedding parameters with the pipeline's fixed seed."""
+    params = AllChem.ETKDGv3()
+    params.randomSeed = 42
+    params.numThreads = num_threads
+    params.pruneRmsThresh = prune_rms_threshold
+    params.timeout = timeout
+    params.maxIterations = max_iterations
+    params.useRandomCoords = use_random_coords
+    return params
+
+
+def _generate_conformer_ensemble(
+    mol_with_hs: Chem.Mol, num_conformers: int, params
+) -> bool:
     """
-    for mol in molecules:
+    Embeds and optimizes several conformers in place using RDKit's threads.
+
+    Returns:
+        Whether at least one conformer was generated.
+    """
+    if not AllChem.EmbedMultipleConfs(mol_with_hs, num_conformers, params):
+        return False
+
+    if AllChem.MMFFHasAllMoleculeParams(mol_with_hs):
+        results = AllChem.MMFFOptimizeMoleculeConfs(
+            mol_with_hs, numThreads=params.numThreads
+        )
+    else:
+        results = AllChem.UFFOptimizeMoleculeConfs(
+            mol_with_hs, numThreads=params.numThreads
+        )
+    # Optimization can pull distinct starting geometries onto the same minimum
+    _prune_conformers(
+        mol_with_hs, [energy for _, energy in results], params.pruneRmsThresh
+    )
+    return True
+
+
+def _embed_molecule(
+    mol: Chem.Mol,
+    num_conformers: int = 1,
+    num_threads: int = 0,
+    prune_rms_threshold: float = 0.5,
+    timeout: int = 0,
+    max_iterations: int = 0,
+    use_random_coords: bool = False,
+) -> Chem.Mol | None:
+    """
+    Adds hydrogens to a molecule, embeds it in 3D and optimizes its geometry.
+
+    Returns:
+        The embedded molecule, or None if embedding or optimization failed.
+    """
+    # Add hydrogens
+    mol_with_hs = Chem.AddHs(mol)
+    params = _embed_parameters(
+        num_threads, prune_rms_threshold, timeout, max_iterations, use_random_coords
+    )
+    if num_conformers > 1:
+        if not _generate_conformer_ensemble(mol_with_hs, num_conformers, params):
+            return None
+        return mol_with_hs
+
+    # Generate 3D conformer
+    if timeout or max_iterations or use_random_coords:
+        status = AllChem.EmbedMolecule(mol_with_hs, params)
+    else:
+        status = AllChem.EmbedMolecule(mol_with_hs, randomSeed=42)
+    if status == -1:
+        # Conformer generation failed
+        return None
+    # Optimize the geometry
+    if AllChem.UFFOptimizeMolecule(mol_with_hs) == -1:
+        # Optimization failed
+        return None
+    return mol_with_hs
+
+
+def _embedding_worker(conn):
+    """Child-process loop embedding molecules received over a pipe."""
+    conn.send("ready")
+    while True:
         try:
-            # Add hydrogens
-            mol_with_hs = Chem.AddHs(mol)
-            # Generate 3D conformer
-            if AllChem.EmbedMolecule(mol_with_hs, randomSeed=42) == -1:
-                # Conformer generation failed
-                continue
-            # Optimize the geometry
-            if AllChem.UFFOptimizeMolecule(mol_with_hs) == -1:
-                # Optimization failed
-                continue
-            yield mol_with_hs
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        binary, options = message
+        try:
+            result = _embed_molecule(Chem.Mol(binary), **options)
         except Exception:
-            # Skip molecules that fail for any reason during processing
-            continue
+            result = None
+        conn.send(
+            result.ToBinary(Chem.PropertyPickleOptions.AllProps) if result else None
+        )
+
+
+class _GuardedEmbedder:
+    """
+    Runs embeddings in a child process that is killed when over its budget.
+
+    RDKit's own embedding timeout does not cover force-field optimization or
+    every stalled code path, so the wall-clock budget is enforced here. The
+    worker is restarted transparently after a kill.
+    """
+
+    def __init__(self):
+        self._process = None
+        self._conn = None
+
+    def _start(self):
+        context = _process_context()
+        parent_conn, child_conn = context.Pipe()
+        self._process = context.Process(
+            target=_embedding_worker, args=(child_conn,), daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        # Start-up time must not count against the first molecule's budget
+        self._conn.recv()
+
+    def embed(self, mol: Chem.Mol, time_limit: float, **options) -> Chem.Mol | None:
+        """
+        Embeds a molecule in the worker process.
+
+        Raises:
+            TimeoutError: If the worker did not finish within ``time_limit``.
+        """
+        if self._process is None or not self._process.is_alive():
+            self._start()
+        self._conn.send((mol.ToBinary(Chem.PropertyPickleOptions.AllProps), options))
+        if not self._conn.poll(time_limit):
+            self.close()
+            raise TimeoutError(f"Embedding exceeded {time_limit} s")
+        binary = self._conn.recv()
+        return Chem.Mol(binary) if binary else None
+
+    def close(self):
+        """Stops the worker process."""
+        if self._process is not None:
+            self._process.kill()
+            self._process.join()
+            self._conn.close()
+        self._process = None
+        self._conn = None
+
+
+def _guarded_embed(
+    embedder: _GuardedEmbedder,
+    mol: Chem.Mol,
+    time_limit: float,
+    options: dict,
+    quarantine: list | None,
+) -> Chem.Mol | None:
+    """
+    Embeds a molecule under a time limit, falling back to random coordinates.
+
+    The limit applies to each attempt, so a molecule that needs the fallback
+    may take up to twice ``time_limit``. Molecules that fail or exceed the
+    limit are recorded in ``quarantine``.
+    """
+    try:
+        result = embedder.embed(mol, time_limit, **options)
+        reason = "embedding failed"
+    except TimeoutError:
+        result = None
+        reason = "timeout"
+    if result is not None:
+        return result
+
+    # Random-coordinate embedding avoids the eigenvalue-based start that
+    # stalls on many macrocycles; a stalled first attempt used up the whole
+    # limit, so the retry gets a fresh one
+    try:
+        result = embedder.embed(mol, time_limit, **options, use_random_coords=True)
+    except TimeoutError:
+        result = None
+    if result is not None:
+        result.SetProp("naturaDock_embedding", "random_coords")
+
+    if quarantine is not None:
+        quarantine.append(
+            {
+                "name": mol.GetProp("_Name") if mol.HasProp("_Name") else "",
+                "smiles": Chem.MolToSmiles(mol),
+                "reason": reason,
+                "fallback": "random_coords" if result is not None else "none",
+            }
+        )
+    return result
+
+
+def generate_conformers(
+    molecules: Iterator[Chem.Mol],
+    num_conformers: int = 1,
+    num_threads: int = 0,
+    prune_rms_threshold: float = 0.5,
+    embed_timeout: float | None = None,
+    max_embed_iterations: int = 0,
+    quarantine: list | None = None,
+) -> Iterator[Chem.Mol]:
+    """
+    Generates 3D conformers for each molecule and optimizes their geometry.
+
+    With ``num_conformers > 1`` an ensemble is embedded with
+    ``EmbedMultipleConfs``, optimized with MMFF (UFF when MMFF parameters are
+    missing) and pruned of near-duplicates; all surviving conformers stay on
+    the returned molecule.
+
+    With ``embed_timeout`` set, each molecule is embedded and optimized in a
+    worker process under that wall-clock limit. Molecules that fail or run
+    over are retried once, under the same limit, with random-coordinate
+    embedding and recorded in ``quarantine``; fallback geometries carry a
+    ``naturaDock_embedding`` property.
+
+    Args:
+        molecules: An iterator of RDKit Mol objects.
+        num_conformers: The number of conformers to embed per molecule.
+        num_threads: Threads RDKit uses for ensemble embedding and
+            optimization; 0 uses all available cores.
+        prune_rms_threshold: Heavy-atom RMSD (in Angstroms) below which
+            ensemble conformers are considered duplicates.
+        embed_timeout: Time limit in seconds for each embedding attempt of a
+            molecule, or None for none.
+        max_embed_iterations: Maximum embedding attempts per conformer
+            (0 uses RDKit's default).
+        quarantine: A list that receives a dictionary (name, smiles, reason,
+            fallback) for every molecule that failed or exceeded the budget.
+
+    Yields:
+        RDKit Mol objects with one or more embedded 3D conformers.
+    """
+    options = {
+        "num_conformers": num_conformers,
+        "num_threads": num_threads,
+        "prune_rms_threshold": prune_rms_threshold,
+        "timeout": math.ceil(embed_timeout) if embed_timeout else 0,
+        "max_iterations": max_embed_iterations,
+    }
+    embedder = _GuardedEmbedder() if embed_timeout else None
+    try:
+        for mol in molecules:
+            if embedder is not None:
+                mol_with_hs = _guarded_embed(
+                    embedder, mol, embed_timeout, options, quarantine
+                )
+            else:
+                try:
+                    mol_with_hs = _embed_molecule(mol, **options)
+                except Exception:
+                    # Skip molecules that fail for any reason during processing
+                    continue
+            if mol_with_hs is not None:
+                yield mol_with_hs
+    finally:
+        if embedder is not None:
+            embedder.close()
 
 
 def filter_compounds(
@@ -111,6 +646,9 @@ def prepare_compounds(molecules: Iterable[Chem.Mol], output_dir: Path) -> list[P
     """
     Prepares a list of compounds for docking, saving them as PDBQT files using Meeko.
 
+    Molecules carrying several conformers are written as one file per
+    conformer, named ``<name>_conf<k>.pdbqt``.
+
     Args:
         molecules: A list of RDKit Mol objects.
         output_dir: The directory to save the PDBQT files.
@@ -121,58 +659,100 @@ def prepare_compounds(molecules: Iterable[Chem.Mol], output_dir: Path) -> list[P
     prepared_paths = []
     mols = list(molecules)
     for i, mol in enumerate(mols):
-        mol_name = (
-            mol.GetProp("_Name")
-            if mol.HasProp("_Name") and mol.GetProp("_Name")
-            else f"compound_{i}"
+        mol_name = compound_name(mol, i)
+        conf_ids = [conf.GetId() for conf in mol.GetConformers()]
+        if len(conf_ids) > 1:
+            jobs = [
+                (f"{mol_name}_conf{k}", conf_id) for k, conf_id in enumerate(conf_ids)
+            ]
+        else:
+            jobs = [(mol_name, -1)]
+        for job_name, conf_id in jobs:
+            output_path = _prepare_compound(mol, conf_id, job_name, output_dir)
+            if output_path is not None:
+                prepared_paths.append(output_path)
+
+    return prepared_paths
+
+
+def _prepare_compound(
+    mol: Chem.Mol, conf_id: int, mol_name: str, output_dir: Path
+) -> Path | None:
+    """
+    Prepares a single conformer of a molecule with Meeko.
+
+    Returns:
+        The path to the PDBQT file, or None if preparation failed.
+    """
+    output_path = output_dir / f"{mol_name}.pdbqt"
+
+    tmp_file_path = None
+    try:
+        # Convert molecule to SDF format in memory
+        sdf_data = Chem.MolToMolBlock(mol, confId=conf_id)
+
+        with tempfile.NamedTemporaryFile(
+            mode="w+", delete=False, suffix=".sdf"
+        ) as tmp_file:
+            tmp_file.write(sdf_data)
+            tmp_file_path = tmp_file.name
+
+        # Prepare command for Meeko
+        script_path = get_meeko_path("mk_prepare_ligand.py")
+        command = [
+            sys.executable,
+            str(script_path),
+            "--mol",
+            tmp_file_path,
+            "-o",
+            str(output_path),
+        ]
+
+        # Run Meeko
+        result = subprocess.run(
+            command, capture_output=True, text=True, check=True
         )
-        output_path = output_dir / f"{mol_name}.pdbqt"
 
-        tmp_file_path = None
-        try:
-            # Convert molecule to SDF format in memory
-            sdf_data = Chem.MolToMolBlock(mol)
-
-            with tempfile.NamedTemporaryFile(
-                mode="w+", delete=False, suffix=".sdf"
-            ) as tmp_file:
-                tmp_file.write(sdf_data)
-                tmp_file_path = tmp_file.name
-
-            # Prepare command for Meeko
-            script_path = get_meeko_path("mk_prepare_ligand.py")
-            command = [
-                sys.executable,
-                str(script_path),
-                "--mol",
-                tmp_file_path,
-                "-o",
-                str(output_path),
-            ]
+        if result.returncode == 0:
+            return output_path
 
-            # Run Meeko
-            result = subprocess.run(
-                command, capture_output=True, text=True, check=True
-            )
+    except subprocess.CalledProcessError as e:
+        print(
+            f"Warning: Failed to prepare molecule {mol_name}. "
+            f"Error: {e.stderr}"
+        )
+    except Exception as e:
+        print(
+            f"Warning: An unexpected error occurred for molecule {mol_name}. "
+            f"Error: {e}"
+        )
+    finally:
+        # Clean up the temporary file
+        if tmp_file_path and Path(tmp_file_path).exists():
+            Path(tmp_file_path).unlink()
 
-            if result.returncode == 0:
-                prepared_paths.append(output_path)
+    return None
 
-        except subprocess.CalledProcessError as e:
-            print(
-                f"Warning: Failed to prepare molecule {mol_name}. "
-                f"Error: {e.stderr}"
-            )
-            continue
-        except Exception as e:
-            print(
-                f"Warning: An unexpected error occurred for molecule {mol_name}. "
-                f"Error: {e}"
-            )
-            continue
-        finally:
-            # Clean up the temporary file
-            if tmp_file_path and Path(tmp_file_path).exists():
-                Path(tmp_file_path).unlink()
 
-    return prepared_paths
\ No newline at end of file
+def prepare_ligand_strings(mol) -> list[str]:
+    """
+    Prepares every conformer of a molecule with Meeko, in memory.
+
+    Args:
+        mol: An RDKit Mol with explicit hydrogens and 3D conformers.
+
+    Returns:
+        One PDBQT string per conformer that Meeko could prepare.
+    """
+    from meeko import MoleculePreparation, PDBQTWriterLegacy
+
+    preparator = MoleculePreparation()
+    prepared = []
+    for conformer in mol.GetConformers():
+        for setup in preparator.prepare(mol, conformer_id=conformer.GetId()):
+            pdbqt, is_ok, error = PDBQTWriterLegacy.write_string(setup)
+            if is_ok:
+                prepared.append(pdbqt)
+            else:
+                print(f"Warning: Meeko could not write a ligand: {error}")
+    return prepared
@@ -0,0 +1,445 @@
+# Packed, Memory-Mapped Ready-to-Dock Libraries
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, Sequence
+
+import numpy as np
+
+PACK_SUFFIX = ".ndpack"
+PACK_VERSION = 1
+MAGIC = b"NDPACK\x00\x01"
+ALIGNMENT = 64
+
+# Descriptor columns computed once at pack time, one value per record
+DESCRIPTORS = {
+    "mol_weight": "<f8",
+    "logp": "<f8",
+    "rotatable_bonds": "<i4",
+    "heavy_atoms": "<i4",
+    "hbond_donors": "<i4",
+    "hbond_acceptors": "<i4",
+}
+
+# Variable-length columns, stored as concatenated bytes plus an offset index.
+# ``structure`` is a SMILES with explicit hydrogens whose atom order matches
+# the stored coordinates.
+RECORD_STRINGS = ("name", "smiles", "structure")
+
+
+def _pack_molecule(item) -> dict | None:
+    """
+    Embeds, prepares and describes one molecule for packing.
+
+    Args:
+        item: The molecule's name, the RDKit Mol and the keyword arguments
+            for `generate_conformers`.
+
+    Returns:
+        The record, or None if embedding or preparation failed.
+    """
+    from rdkit import Chem
+    from rdkit.Chem import Descriptors
+
+    from .compounds import generate_conformers, prepare_ligand_strings
+
+    name, mol, conformer_options = item
+    descriptors = (
+        Descriptors.MolWt(mol),
+        Descriptors.MolLogP(mol),
+        Descriptors.NumRotatableBonds(mol),
+        mol.GetNumHeavyAtoms(),
+        Descriptors.NumHDonors(mol),
+        Descriptors.NumHAcceptors(mol),
+    )
+    embedded = list(generate_conformers([mol], **conformer_options))
+    if not embedded:
+        return None
+    mol = embedded[0]
+    pdbqt = prepare_ligand_strings(mol)
+    if not pdbqt or len(pdbqt) != mol.GetNumConformers():
+        return None
+
+    structure = Chem.MolToSmiles(mol, canonical=False)
+    order = list(mol.GetPropsAsDict(True, True)["_smilesAtomOutputOrder"])
+    return {
+        "name": name,
+        "smiles": Chem.MolToSmiles(Chem.RemoveHs(mol)),
+        "structure": structure,
+        "descriptors": descriptors,
+        "coordinates": [
+            conformer.GetPositions()[order].astype("<f4")
+            for conformer in mol.GetConformers()
+        ],
+        "pdbqt": pdbqt,
+    }
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class _PackWriter:
+    """
+    Accumulates records and writes the packed file.
+
+    Descriptors and offsets are kept in memory. Strings, coordinates and
+    PDBQT blobs are spilled to temporary files, so packing needs little
+    memory for any library size.
+    """
+
+    def __init__(self, work_dir: Path):
+        self.work_dir = work_dir
+        self.descriptors = {name: [] for name in DESCRIPTORS}
+        self.offsets = {name: [0] for name in RECORD_STRINGS + ("coordinates", "pdbqt")}
+        self.conformer_offsets = [0]
+        self.spills = {name: open(work_dir / name, "wb") for name in self.offsets}
+
+    def add(self, record: dict):
+        for name, value in zip(DESCRIPTORS, record["descriptors"]):
+            self.descriptors[name].append(value)
+        for name in RECORD_STRINGS:
+            self._append(name, record[name].encode("utf-8"))
+        for coordinates, pdbqt in zip(record["coordinates"], record["pdbqt"]):
+            self.spills["coordinates"].write(coordinates.tobytes())
+            self.offsets["coordinates"].append(
+                self.offsets["coordinates"][-1] + len(coordinates)
+            )
+            self._append("pdbqt", pdbqt.encode("utf-8"))
+        self.conformer_offsets.append(self.conformer_offsets[-1] + len(record["pdbqt"]))
+
+    def _append(self, name: str, data: bytes):
+        self.spills[name].write(data)
+        self.offsets[name].append(self.offsets[name][-1] + len(data))
+
+    def write(self, output_path: Path, metadata: dict):
+        """Assembles the sections behind a JSON header into ``output_path``."""
+        for spill in self.spills.values():
+            spill.close()
+
+        sections = []
+        for name, dtype in DESCRIPTORS.items():
+            sections.append(
+                (f"descriptors/{name}", np.array(self.descriptors[name], dtype))
+            )
+        for name, offsets in self.offsets.items():
+            sections.append((f"offsets/{name}", np.array(offsets, "<u8")))
+        sections.append(("offsets/conformers", np.array(self.conformer_offsets, "<u8")))
+        for name in RECORD_STRINGS + ("pdbqt",):
+            sections.append((f"data/{name}", (self.work_dir / name, "u1", None)))
+        sections.append(("data/coordinates", (self.work_dir / "coordinates", "<f4", 3)))
+
+        layout = {}
+        offset = 0
+        for name, section in sections:
+            if isinstance(section, np.ndarray):
+                dtype, shape = section.dtype.str, list(section.shape)
+                nbytes = section.nbytes
+            else:
+                path, dtype, width = section
+                nbytes = path.stat().st_size
+                count = nbytes // np.dtype(dtype).itemsize
+                shape = [count // width, width] if width else [count]
+            layout[name] = {"offset": offset, "dtype": dtype, "shape": shape}
+            offset = _align(offset + nbytes)
+
+        header = json.dumps(
+            {**metadata, "version": PACK_VERSION, "sections": layout}
+        ).encode("utf-8")
+        data_start = _align(len(MAGIC) + 8 + len(header))
+        with open(output_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for name, section in sections:
+                f.seek(data_start + layout[name]["offset"])
+                if isinstance(section, np.ndarray):
+                    f.write(section.tobytes())
+                else:
+                    with open(section[0], "rb") as spill:
+                        while block := spill.read(1 << 20):
+                            f.write(block)
+
+
+def pack_library(
+    library_path,
+    output_path: Path,
+    conformer_options: dict | None = None,
+    num_workers: int | None = None,
+    chunk_size: int = 32,
+) -> int:
+    """
+    Converts a compound library into a packed, ready-to-dock file.
+
+    Every molecule is loaded once, described, embedded with
+    `generate_conformers` and prepared with Meeko in worker processes. The
+    packed file holds a columnar descriptor table, names and canonical
+    SMILES, 3D coordinates and PDBQT blobs for every conformer, and an offset
+    index. It is written to a temporary file and renamed into place.
+
+    Args:
+        library_path: The library files, directories or globs, see
+            `load_compounds`.
+        output_path: The packed library to write, conventionally ``*.ndpack``.
+        conformer_options: Keyword arguments for `generate_conformers`.
+        num_workers: Worker processes; defaults to the physical cores.
+        chunk_size: Molecules sent to a worker at a time.
+
+    Returns:
+        The number of packed molecules.
+    """
+    import psutil
+
+    from .compounds import compound_name, library_files, load_compounds
+
+    conformer_options = {
+        key: value
+        for key, value in (conformer_options or {}).items()
+        if key != "quarantine"
+    }
+    num_workers = num_workers or psutil.cpu_count(logical=False)
+    output_path = Path(output_path)
+    items = (
+        (compound_name(mol, i), mol, conformer_options)
+        for i, mol in enumerate(load_compounds(library_path))
+    )
+
+    failed = 0
+    with tempfile.TemporaryDirectory(dir=output_path.parent) as work_dir:
+        writer = _PackWriter(Path(work_dir))
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            while batch := list(islice(items, 16 * chunk_size * num_workers)):
+                for record in executor.map(_pack_molecule, batch, chunksize=chunk_size):
+                    if record is None:
+                        failed += 1
+                    else:
+                        writer.add(record)
+        packed = len(writer.conformer_offsets) - 1
+        tmp_path = Path(work_dir) / output_path.name
+        writer.write(
+            tmp_path,
+            {
+                "count": packed,
+                "source": [str(path) for path in library_files(library_path)],
+                "conformer_options": conformer_options,
+            },
+        )
+        os.replace(tmp_path, output_path)
+
+    print(f"Packed {packed} molecules into {output_path} ({failed} failed)")
+    return packed
+
+
+class PackedLibrary:
+    """
+    A packed library, memory-mapped for zero-copy reads.
+
+    Columns are NumPy views into the mapped file, so opening a library and
+    filtering on descriptors takes the same time for any library size, and
+    only the records used are paged in.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: The packed library written by `pack_library`.
+
+        Raises:
+            ValueError: If the file is not a packed library of this version.
+        """
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            magic = f.read(len(MAGIC))
+            if magic != MAGIC:
+                raise ValueError(f"Not a packed naturaDock library: {path}")
+            header_length = int.from_bytes(f.read(8), "little")
+            self.header = json.loads(f.read(header_length))
+        if self.header["version"] != PACK_VERSION:
+            raise ValueError(
+                f"Unsupported packed library version {self.header['version']}; "
+                f"repack it with 'naturaDock pack'."
+            )
+
+        data_start = _align(len(MAGIC) + 8 + header_length)
+        mapped = np.memmap(self.path, dtype=np.uint8, mode="r")
+        self._sections = {}
+        for name, spec in self.header["sections"].items():
+            dtype = np.dtype(spec["dtype"])
+            start = data_start + spec["offset"]
+            nbytes = int(np.prod(spec["shape"])) * dtype.itemsize
+            self._sections[name] = (
+                mapped[start : start + nbytes].view(dtype).reshape(spec["shape"])
+            )
+
+    def __len__(self) -> int:
+        return self.header["count"]
+
+    @property
+    def conformer_options(self) -> dict:
+        """The `generate_conformers` options the library was packed with."""
+        return self.header["conformer_options"]
+
+    @property
+    def descriptors(self) -> dict[str, np.ndarray]:
+        """The descriptor columns, each with one value per record."""
+        return {name: self._sections[f"descriptors/{name}"] for name in DESCRIPTORS}
+
+    def _string(self, column: str, index: int) -> str:
+        offsets = self._sections[f"offsets/{column}"]
+        data = self._sections[f"data/{column}"]
+        return data[offsets[index] : offsets[index + 1]].tobytes().decode("utf-8")
+
+    def name(self, index: int) -> str:
+        """Returns a record's name."""
+        return self._string("name", index)
+
+    def smiles(self, index: int) -> str:
+        """Returns a record's canonical SMILES."""
+        return self._string("smiles", index)
+
+    def _conformers(self, index: int) -> range:
+        offsets = self._sections["offsets/conformers"]
+        return range(int(offsets[index]), int(offsets[index + 1]))
+
+    def pdbqt(self, index: int) -> list[memoryview]:
+        """Returns the prepared PDBQT of each of a record's conformers."""
+        offsets = self._sections["offsets/pdbqt"]
+        data = self._sections["data/pdbqt"]
+        return [
+            memoryview(data[offsets[k] : offsets[k + 1]])
+            for k in self._conformers(index)
+        ]
+
+    def coordinates(self, index: int) -> list[np.ndarray]:
+        """Returns an (atoms, 3) coordinate view for each of a record's conformers."""
+        offsets = self._sections["offsets/coordinates"]
+        data = self._sections["data/coordinates"]
+        return [data[offsets[k] : offsets[k + 1]] for k in self._conformers(index)]
+
+    def select(
+        self,
+        max_mol_weight: float = 500.0,
+        max_rotatable_bonds: int = 10,
+        min_logp: float = -5.0,
+        max_logp: float = 5.0,
+    ) -> np.ndarray:
+        """
+        Applies the `filter_compounds` criteria to the descriptor table.
+
+        Returns:
+            The indices of the records that pass.
+        """
+        descriptors = self.descriptors
+        passes = (
+            (descriptors["mol_weight"] <= max_mol_weight)
+            & (descriptors["rotatable_bonds"] <= max_rotatable_bonds)
+            & (descriptors["logp"] >= min_logp)
+            & (descriptors["logp"] <= max_logp)
+        )
+        return np.flatnonzero(passes)
+
+    def molecule(self, index: int):
+        """Rebuilds a record as an RDKit Mol with its name and 3D conformers."""
+        from rdkit import Chem
+        from rdkit.Geometry import Point3D
+
+        params = Chem.SmilesParserParams()
+        params.removeHs = False
+        mol = Chem.MolFromSmiles(self._string("structure", index), params)
+        for coordinates in self.coordinates(index):
+            conformer = Chem.Conformer(mol.GetNumAtoms())
+            for atom, (x, y, z) in enumerate(coordinates.tolist()):
+                conformer.SetAtomPosition(atom, Point3D(x, y, z))
+            conformer.Set3D(True)
+            mol.AddConformer(conformer, assignId=True)
+        mol.SetProp("_Name", self.name(index))
+        return mol
+
+    def molecules(self, indices: Iterable[int] | None = None) -> Iterator:
+        """Yields records as RDKit Mols, see `molecule`."""
+        indices = range(len(self)) if indices is None else indices
+        return (self.molecule(int(index)) for index in indices)
+
+    def table(self, start: int = 0, stop: int | None = None):
+        """Returns names, SMILES and descriptors of a slice of records."""
+        import pandas as pd
+
+        stop = len(self) if stop is None else min(stop, len(self))
+        table = pd.DataFrame(
+            {
+                "name": [self.name(i) for i in range(start, stop)],
+                "smiles": [self.smiles(i) for i in range(start, stop)],
+            }
+        )
+        for name, column in self.descriptors.items():
+            table[name] = column[start:stop]
+        return table
+
+    def prepared(
+        self, output_dir: Path, indices: Iterable[int] | None = None
+    ) -> "PreparedLigands":
+        """
+        Returns the prepared PDBQT files of records, written as they are used.
+
+        Files are named like `prepare_compounds` names them: ``<name>.pdbqt``,
+        or ``<name>_conf<k>.pdbqt`` for records with several conformers.
+        """
+        indices = np.arange(len(self)) if indices is None else indices
+        return PreparedLigands(self, output_dir, indices)
+
+    def write_prepared(
+        self, output_dir: Path, indices: Iterable[int] | None = None
+    ) -> list[Path]:
+        """
+        Writes the prepared PDBQT files of records for docking, see `prepared`.
+
+        Returns:
+            The paths of the written files.
+        """
+        return list(self.prepared(output_dir, indices))
+
+
+class PreparedLigands(Sequence):
+    """
+    The prepared PDBQT files of packed records, written on first access.
+
+    Engines read ligands from files, so a conformer's blob is copied out of
+    the mapped library only when its path is first taken, which
+    `run_parallel_docking` does just ahead of docking it. Nothing is written
+    up front, and accessing a path again does not rewrite the file.
+    """
+
+    def __init__(self, library: PackedLibrary, output_dir: Path, indices):
+        self.library = library
+        self.output_dir = Path(output_dir)
+        offsets = library._sections["offsets/conformers"]
+        indices = np.asarray(indices, dtype=np.int64)
+        counts = (offsets[indices + 1] - offsets[indices]).astype(np.int64)
+        # The record, conformer and conformer count of every file
+        self._records = np.repeat(indices, counts)
+        self._conformers = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        self._counts = np.repeat(counts, counts)
+        self._written = np.zeros(len(self._records), dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __getitem__(self, position: int) -> Path:
+        if not -len(self) <= position < len(self):
+            raise IndexError(position)
+        position %= len(self)
+        index = int(self._records[position])
+        k = int(self._conformers[position])
+        name = self.library.name(index)
+        stem = f"{name}_conf{k}" if self._counts[position] > 1 else name
+        path = self.output_dir / f"{stem}.pdbqt"
+        if not self._written[position]:
+            with open(path, "wb") as f:
+                f.write(self.library.pdbqt(index)[k])
+            self._written[position] = True
+        return path
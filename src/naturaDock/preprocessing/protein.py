@@ -1,8 +1,6 @@
 # Protein Preprocessing
 
 from pathlib import Path
-from Bio.PDB import PDBParser, PDBExceptions
-from pdbfixer import PDBFixer
 import subprocess
 from .utils.utils import get_meeko_path
 
@@ -26,6 +24,8 @@ def load_protein(protein_pdb_path: Path):
     if not protein_pdb_path.exists():
         raise FileNotFoundError(f"PDB file not found at: {protein_pdb_path}")
 
+    from Bio.PDB import PDBParser, PDBExceptions
+
     parser = PDBParser(QUIET=True)
     try:
         structure = parser.get_structure(protein_pdb_path.stem, str(protein_pdb_path))
@@ -91,6 +91,9 @@ def validate_protein(protein_pdb_path: Path) -> dict:
     Returns:
         A dictionary containing validation results.
     """
+    # PDBFixer pulls in OpenMM, which is slow to import
+    from pdbfixer import PDBFixer
+
     fixer = PDBFixer(str(protein_pdb_path))
     fixer.findMissingResidues()
     fixer.findNonstandardResidues()
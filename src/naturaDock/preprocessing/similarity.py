@@ -0,0 +1,395 @@
+# Persistent Fingerprint Index for Analog Search
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+
+INDEX_VERSION = 2
+METADATA_FILENAME = "index.json"
+FINGERPRINTS_FILENAME = "fingerprints.npy"
+POPCOUNTS_FILENAME = "popcounts.npy"
+IDS_FILENAME = "ids.npy"
+BINS_FILENAME = "bins.npy"
+COMPOUNDS_FILENAME = "compounds.smi"
+OFFSETS_FILENAME = "compound_offsets.npy"
+
+# Rows compared against a query at a time, bounding temporary memory
+SEARCH_CHUNK = 1 << 16
+
+_BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """
+    Counts the set bits of packed fingerprints.
+
+    Uses ``np.bitwise_count`` (NumPy 2) and a byte lookup table otherwise.
+
+    Args:
+        words: Packed fingerprints, shape (..., words) of uint64.
+
+    Returns:
+        The number of set bits per fingerprint, shape (...).
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    bytes_ = np.ascontiguousarray(words).view(np.uint8)
+    return _BYTE_POPCOUNT[bytes_].sum(axis=-1, dtype=np.int64)
+
+
+def pack_fingerprints(fingerprints, fp_size: int) -> np.ndarray:
+    """
+    Packs RDKit bit vectors into rows of little-endian uint64 words.
+
+    Returns:
+        The packed fingerprints, shape (n, ceil(fp_size / 64)); bits past
+        ``fp_size`` are zero.
+    """
+    from rdkit import DataStructs
+
+    dense = np.zeros((len(fingerprints), -(-fp_size // 64) * 64), dtype=np.uint8)
+    for row, fingerprint in zip(dense, fingerprints):
+        DataStructs.ConvertToNumpyArray(fingerprint, row[:fp_size])
+    return np.packbits(dense, axis=1, bitorder="little").view("<u8")
+
+
+def build_fingerprint_index(
+    library,
+    index_dir: Path,
+    radius: int = 2,
+    fp_size: int = 2048,
+    chunk_size: int = 10_000,
+    num_threads: int = 0,
+    load_workers: int = 1,
+) -> "FingerprintIndex":
+    """
+    Builds a persistent Morgan fingerprint index of a whole library.
+
+    The library is streamed with `load_compounds` and fingerprinted in
+    multithreaded chunks. Fingerprints are stored packed, 64 bits per word,
+    and sorted by popcount, so the candidates that can reach a similarity
+    form one contiguous slice. Canonical SMILES and names are kept in
+    ``compounds.smi``, which `FingerprintIndex.write_compounds` copies
+    from to feed analogs back into a docking run. Records are named with
+    `compound_name`, as in a docking run of the same library, so hits of
+    ``ranked_results.csv`` are found under their docked names.
+
+    Args:
+        library: The library files, directories or globs, see `load_compounds`.
+        index_dir: The index directory; existing index files are replaced.
+        radius: The Morgan radius (2 corresponds to ECFP4).
+        fp_size: The fingerprint length in bits, a multiple of 64.
+        chunk_size: The number of molecules fingerprinted per RDKit call.
+        num_threads: Threads RDKit uses per chunk; 0 uses all cores.
+        load_workers: Library files parsed in parallel.
+
+    Returns:
+        The opened index.
+    """
+    from rdkit import Chem
+
+    from .clustering import compute_fingerprints
+    from .compounds import compound_name, library_files, load_compounds
+
+    if fp_size % 64:
+        raise ValueError(f"The fingerprint size must be a multiple of 64: {fp_size}")
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    words = fp_size // 64
+
+    count = 0
+    offsets = [0]
+    with tempfile.TemporaryDirectory(dir=index_dir) as work_dir:
+        raw_path = Path(work_dir) / "fingerprints.raw"
+        with open(raw_path, "wb") as raw, open(
+            index_dir / COMPOUNDS_FILENAME, "wb"
+        ) as compounds:
+            molecules = load_compounds(library, num_workers=load_workers)
+            while chunk := list(islice(molecules, chunk_size)):
+                fingerprints = list(
+                    compute_fingerprints(
+                        chunk,
+                        radius=radius,
+                        fp_size=fp_size,
+                        chunk_size=chunk_size,
+                        num_threads=num_threads,
+                    )
+                )
+                raw.write(pack_fingerprints(fingerprints, fp_size).tobytes())
+                for mol in chunk:
+                    # Tab-separated, since titles may contain spaces
+                    name = compound_name(mol, count)
+                    line = f"{Chem.MolToSmiles(mol)}\t{name}\n".encode("utf-8")
+                    compounds.write(line)
+                    offsets.append(offsets[-1] + len(line))
+                    count += 1
+        if count == 0:
+            raise ValueError("The library contains no readable molecules.")
+
+        unsorted = np.memmap(raw_path, dtype="<u8", mode="r", shape=(count, words))
+        popcounts = np.concatenate(
+            [
+                popcount(unsorted[start : start + SEARCH_CHUNK])
+                for start in range(0, count, SEARCH_CHUNK)
+            ]
+        )
+        order = np.argsort(popcounts, kind="stable")
+        fingerprints = np.lib.format.open_memmap(
+            index_dir / FINGERPRINTS_FILENAME,
+            mode="w+",
+            dtype="<u8",
+            shape=(count, words),
+        )
+        for start in range(0, count, SEARCH_CHUNK):
+            fingerprints[start : start + SEARCH_CHUNK] = unsorted[
+                order[start : start + SEARCH_CHUNK]
+            ]
+        fingerprints.flush()
+        del fingerprints, unsorted
+
+    sorted_popcounts = popcounts[order].astype(np.uint16)
+    np.save(index_dir / POPCOUNTS_FILENAME, sorted_popcounts)
+    np.save(index_dir / IDS_FILENAME, order.astype(np.int64))
+    np.save(
+        index_dir / BINS_FILENAME,
+        np.searchsorted(sorted_popcounts, np.arange(fp_size + 2)).astype(np.int64),
+    )
+    np.save(index_dir / OFFSETS_FILENAME, np.array(offsets, dtype=np.int64))
+    with open(index_dir / METADATA_FILENAME, "w") as f:
+        json.dump(
+            {
+                "version": INDEX_VERSION,
+                "count": count,
+                "radius": radius,
+                "fp_size": fp_size,
+                "sources": [str(path) for path in library_files(library)],
+            },
+            f,
+            indent=2,
+        )
+    print(f"Indexed {count} compounds in {index_dir}")
+    return FingerprintIndex(index_dir)
+
+
+def _popcounts_by_bound(a: int, fp_size: int):
+    """
+    Yields the popcounts of possible neighbours, highest similarity bound first.
+
+    A fingerprint with ``b`` bits set has a Tanimoto similarity of at most
+    ``min(a, b) / max(a, b)`` to a query with ``a`` bits set. Empty
+    fingerprints, which are similar to nothing, are not yielded.
+    """
+    if a == 0:
+        return
+    yield a, 1.0
+    below, above = a - 1, a + 1
+    while below >= 1 or above <= fp_size:
+        below_bound = below / a if below >= 1 else -1.0
+        above_bound = a / above if above <= fp_size else -1.0
+        if below_bound >= above_bound:
+            yield below, below_bound
+            below -= 1
+        else:
+            yield above, above_bound
+            above += 1
+
+
+class FingerprintIndex:
+    """
+    A fingerprint index built by `build_fingerprint_index`.
+
+    The packed fingerprints are memory-mapped. A query only reads the
+    popcount range that can reach the requested similarity, since the
+    Tanimoto similarity of fingerprints with ``a`` and ``b`` bits set is at
+    most ``min(a, b) / max(a, b)``.
+    """
+
+    def __init__(self, index_dir: Path):
+        """
+        Args:
+            index_dir: The index directory.
+
+        Raises:
+            FileNotFoundError: If the directory holds no index.
+        """
+        self.index_dir = Path(index_dir)
+        metadata_path = self.index_dir / METADATA_FILENAME
+        if not metadata_path.exists():
+            raise FileNotFoundError(f"No fingerprint index in {self.index_dir}")
+        with open(metadata_path) as f:
+            self.metadata = json.load(f)
+        if self.metadata["version"] != INDEX_VERSION:
+            raise ValueError(
+                f"Unsupported fingerprint index version {self.metadata['version']}; "
+                f"rebuild it with 'naturaDock index'."
+            )
+        self.radius = self.metadata["radius"]
+        self.fp_size = self.metadata["fp_size"]
+        self._fingerprints = np.load(
+            self.index_dir / FINGERPRINTS_FILENAME, mmap_mode="r"
+        )
+        self._popcounts = np.load(self.index_dir / POPCOUNTS_FILENAME)
+        self._ids = np.load(self.index_dir / IDS_FILENAME)
+        self._bins = np.load(self.index_dir / BINS_FILENAME)
+        self._offsets = np.load(self.index_dir / OFFSETS_FILENAME)
+        self._positions = None
+
+    def __len__(self) -> int:
+        return self.metadata["count"]
+
+    def compounds(self, indices) -> list[tuple[str, str]]:
+        """Returns the canonical SMILES and name of library records."""
+        result = []
+        with open(self.index_dir / COMPOUNDS_FILENAME, "rb") as f:
+            for index in indices:
+                f.seek(self._offsets[index])
+                smiles, name = f.readline().decode("utf-8").rstrip("\n").split("\t")
+                result.append((smiles, name))
+        return result
+
+    def find(self, names) -> dict[str, int]:
+        """Looks up library records by name; unknown names are left out."""
+        wanted = set(names)
+        found = {}
+        with open(self.index_dir / COMPOUNDS_FILENAME, encoding="utf-8") as f:
+            for index, line in enumerate(f):
+                name = line.rstrip("\n").split("\t")[1]
+                if name in wanted and name not in found:
+                    found[name] = index
+        return found
+
+    def fingerprints(self, indices) -> np.ndarray:
+        """Returns the packed fingerprints of library records."""
+        if self._positions is None:
+            self._positions = np.empty_like(self._ids)
+            self._positions[self._ids] = np.arange(len(self._ids))
+        return np.asarray(self._fingerprints[self._positions[np.asarray(indices)]])
+
+    def query_fingerprints(self, molecules) -> np.ndarray:
+        """Fingerprints molecules with the index's settings, packed."""
+        from .clustering import compute_fingerprints
+
+        return pack_fingerprints(
+            list(
+                compute_fingerprints(
+                    molecules, radius=self.radius, fp_size=self.fp_size
+                )
+            ),
+            self.fp_size,
+        )
+
+    def _search_one(
+        self, query: np.ndarray, top_n: int | None, threshold: float | None
+    ) -> list[tuple[int, float]]:
+        a = int(popcount(query))
+        scores = np.empty(0)
+        positions = np.empty(0, dtype=np.int64)
+        for b, bound in _popcounts_by_bound(a, self.fp_size):
+            if threshold is not None and bound < threshold:
+                break
+            if top_n is not None and len(scores) >= top_n and bound < scores.min():
+                break
+            for start in range(self._bins[b], self._bins[b + 1], SEARCH_CHUNK):
+                stop = min(start + SEARCH_CHUNK, self._bins[b + 1])
+                common = popcount(self._fingerprints[start:stop] & query)
+                similarity = common / (a + b - common)
+                candidates = np.arange(start, stop)
+                if threshold is not None:
+                    passes = similarity >= threshold
+                    similarity, candidates = similarity[passes], candidates[passes]
+                scores = np.concatenate([scores, similarity])
+                positions = np.concatenate([positions, candidates])
+                if top_n is not None and len(scores) > top_n:
+                    best = np.argpartition(-scores, top_n - 1)[:top_n]
+                    scores, positions = scores[best], positions[best]
+
+        records = self._ids[positions]
+        order = np.lexsort((records, -scores))
+        return [(int(records[i]), float(scores[i])) for i in order]
+
+    def search(
+        self,
+        queries: np.ndarray,
+        top_n: int | None = 50,
+        threshold: float | None = None,
+        num_threads: int | None = None,
+    ) -> list[list[tuple[int, float]]]:
+        """
+        Finds the library records most similar to each query.
+
+        Queries run in parallel threads; NumPy releases the GIL in the bulk
+        bitwise and popcount operations.
+
+        Args:
+            queries: Packed query fingerprints, see `query_fingerprints` and
+                `fingerprints`.
+            top_n: The number of neighbours per query; None for all above
+                the threshold.
+            threshold: The minimum Tanimoto similarity; None for no minimum.
+            num_threads: Threads for the queries; defaults to the CPU count.
+
+        Returns:
+            For each query, ``(record, similarity)`` pairs, most similar
+            first.
+        """
+        if top_n is None and threshold is None:
+            raise ValueError("Give top_n, threshold or both.")
+        queries = np.atleast_2d(np.asarray(queries, dtype="<u8"))
+        with ThreadPoolExecutor(max_workers=num_threads or os.cpu_count()) as pool:
+            return list(
+                pool.map(
+                    lambda query: self._search_one(query, top_n, threshold), queries
+                )
+            )
+
+    def write_compounds(self, indices, output_path: Path) -> Path:
+        """
+        Writes library records as a SMILES file to dock with ``--ligands``.
+
+        SMILES and names are tab-separated, so names with spaces are read
+        back whole.
+        """
+        with open(output_path, "w", encoding="utf-8") as f:
+            for smiles, name in self.compounds(indices):
+                f.write(f"{smiles}\t{name}\n")
+        return output_path
+
+
+def expand_hits(
+    index: FingerprintIndex,
+    queries: np.ndarray,
+    top_n: int | None = 50,
+    threshold: float | None = None,
+    exclude=(),
+    num_threads: int | None = None,
+) -> list[tuple[int, float]]:
+    """
+    Collects the analogs of several hits, most similar first.
+
+    Args:
+        index: The library's fingerprint index.
+        queries: Packed fingerprints of the hits.
+        top_n: Analogs per hit, not counting excluded records, see
+            `FingerprintIndex.search`.
+        threshold: The minimum Tanimoto similarity.
+        exclude: Records left out, such as the hits themselves.
+        num_threads: Threads for the queries.
+
+    Returns:
+        ``(record, similarity)`` pairs of distinct records, each with its
+        highest similarity to any hit.
+    """
+    exclude = set(exclude)
+    # Excluded records may take some of the top places
+    search_n = None if top_n is None else top_n + len(exclude)
+    best = {}
+    for neighbours in index.search(queries, search_n, threshold, num_threads):
+        analogs = [pair for pair in neighbours if pair[0] not in exclude]
+        for record, similarity in analogs[:top_n]:
+            if similarity > best.get(record, -1.0):
+                best[record] = similarity
+    return sorted(best.items(), key=lambda item: (-item[1], item[0]))
@@ -0,0 +1,364 @@
+# In-Memory Screening Sessions for Notebooks and Services
+from __future__ import annotations
+
+import importlib.util
+import itertools
+import os
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable
+
+from naturaDock.docking.engines import get_engine
+
+# Scoring functions whose maps the Vina Python bindings compute themselves
+BINDINGS_SCORING = (None, "vina", "vinardo")
+
+
+def has_vina_bindings() -> bool:
+    """Returns whether the ``vina`` Python package is installed."""
+    return importlib.util.find_spec("vina") is not None
+
+
+class _Docker:
+    """
+    Docks PDBQT strings against one receptor and box.
+
+    With the Vina Python bindings the receptor is loaded and its maps are
+    computed once, and ligands and poses never touch the disk. Other engines
+    and scoring functions run the executable on scratch files in
+    ``scratch_dir``, which are deleted after every ligand.
+    """
+
+    def __init__(
+        self,
+        protein_pdbqt: str,
+        binding_site: dict,
+        scratch_dir: str,
+        engine: str = "vina",
+        exhaustiveness: int | None = None,
+        seed: int | None = None,
+        scoring: str | None = None,
+        num_poses: int = 9,
+        maps: str | None = None,
+    ):
+        self.protein_pdbqt = Path(protein_pdbqt)
+        self.binding_site = binding_site
+        self.scratch_dir = Path(scratch_dir)
+        self.engine = get_engine(engine)
+        self.exhaustiveness = exhaustiveness
+        self.seed = seed
+        self.scoring = scoring
+        self.num_poses = num_poses
+        self.maps = Path(maps) if maps is not None else None
+        self._counter = itertools.count()
+        self._vina = None
+        if engine == "vina" and scoring in BINDINGS_SCORING and has_vina_bindings():
+            from vina import Vina
+
+            self._vina = Vina(
+                sf_name=scoring or "vina", cpu=1, seed=seed or 0, verbosity=0
+            )
+            self._vina.set_receptor(str(self.protein_pdbqt))
+            self._vina.compute_vina_maps(
+                center=[binding_site[f"center_{axis}"] for axis in "xyz"],
+                box_size=[binding_site[f"size_{axis}"] for axis in "xyz"],
+            )
+
+    def dock(self, ligand_pdbqt: str) -> tuple[float | None, str | None, str | None]:
+        """
+        Docks one prepared ligand.
+
+        Returns:
+            The best pose's score, the poses as a PDBQT string and an error
+            message; the score and poses are None if docking failed.
+        """
+        try:
+            if self._vina is not None:
+                return self._dock_in_memory(ligand_pdbqt) + (None,)
+            return self._dock_with_executable(ligand_pdbqt) + (None,)
+        except Exception as e:
+            return None, None, str(e)
+
+    def _dock_in_memory(self, ligand_pdbqt: str) -> tuple[float, str]:
+        self._vina.set_ligand_from_string(ligand_pdbqt)
+        self._vina.dock(
+            exhaustiveness=self.exhaustiveness or 8, n_poses=self.num_poses
+        )
+        affinity = float(self._vina.energies(n_poses=1)[0][0])
+        return affinity, self._vina.poses(n_poses=self.num_poses)
+
+    def _dock_with_executable(self, ligand_pdbqt: str) -> tuple[float | None, str]:
+        from naturaDock.docking.vina_dock import run_vina_docking
+
+        stem = f"ligand_{os.getpid()}_{next(self._counter)}"
+        compound_pdbqt = self.scratch_dir / f"{stem}.pdbqt"
+        output_pdbqt = self.scratch_dir / f"{stem}_docked.pdbqt"
+        compound_pdbqt.write_text(ligand_pdbqt)
+        try:
+            run_vina_docking(
+                self.protein_pdbqt,
+                compound_pdbqt,
+                self.binding_site,
+                output_pdbqt,
+                maps=self.maps,
+                engine=self.engine.name,
+                exhaustiveness=self.exhaustiveness,
+                seed=self.seed,
+                scoring=self.scoring,
+            )
+            return self.engine.parse_score(output_pdbqt), output_pdbqt.read_text()
+        finally:
+            compound_pdbqt.unlink(missing_ok=True)
+            output_pdbqt.unlink(missing_ok=True)
+
+
+# The docker of a pool worker process, set up once by `_init_worker`
+_WORKER_DOCKER: _Docker | None = None
+
+
+def _init_worker(options: dict):
+    global _WORKER_DOCKER
+    _WORKER_DOCKER = _Docker(**options)
+
+
+def _dock_in_worker(ligand_pdbqt: str):
+    return _WORKER_DOCKER.dock(ligand_pdbqt)
+
+
+class Screening:
+    """
+    A reusable docking session for notebooks and services.
+
+    The session prepares the receptor once. It keeps the binding box,
+    prepared ligands and a pool of warm docking processes in memory. Each
+    worker loads the receptor once, and computes Vina's maps once when the
+    Vina Python bindings are installed. Ligands are given as SMILES or RDKit
+    molecules, and scores and poses are returned directly. Nothing is
+    written to the output directory, and ligands seen before are not
+    prepared again.
+
+    Use it as a context manager, or call `close`, to stop the workers::
+
+        with Screening("protein.pdb", num_workers=4) as screening:
+            result = screening.dock_one("CC(=O)Oc1ccccc1C(=O)O")
+            print(result["affinity"])
+    """
+
+    def __init__(
+        self,
+        protein: Path,
+        binding_site: dict | None = None,
+        engine: str = "vina",
+        exhaustiveness: int | None = None,
+        seed: int | None = None,
+        scoring: str | None = None,
+        num_poses: int = 9,
+        num_workers: int | None = None,
+        conformer_options: dict | None = None,
+        maps_cache: Path | None = None,
+        cache_size: int = 10000,
+    ):
+        """
+        Args:
+            protein: The receptor as a PDB file, which is prepared with Meeko,
+                or an already prepared PDBQT file.
+            binding_site: Dictionary defining the docking box (center and
+                size); by default a 30 A box around the protein's centre.
+            engine: The docking engine name, see `docking.engines`.
+            exhaustiveness: Search exhaustiveness; the engine default if None.
+            seed: Random seed; the engine picks one if None.
+            scoring: Scoring function; the engine default if None.
+            num_poses: Poses returned per ligand with the Vina bindings.
+            num_workers: Docking processes; 0 docks in the calling process,
+                which is fastest for one ligand at a time. Defaults to the
+                physical cores.
+            conformer_options: Keyword arguments for `generate_conformers`.
+            maps_cache: Affinity maps cache directory for the Vina
+                executable, see `get_or_create_maps`.
+            cache_size: The number of prepared ligands kept in memory.
+        """
+        import psutil
+
+        from naturaDock.preprocessing.protein import (
+            define_binding_site,
+            load_protein,
+            prepare_protein,
+        )
+
+        self._scratch = tempfile.TemporaryDirectory(prefix="naturaDock-session-")
+        protein = Path(protein)
+        if protein.suffix.lower() == ".pdbqt":
+            protein_pdbqt = protein
+        else:
+            protein_pdbqt = Path(self._scratch.name) / f"{protein.stem}.pdbqt"
+            prepare_protein(protein, protein_pdbqt)
+        if binding_site is None:
+            if protein_pdbqt == protein:
+                raise ValueError("A binding site is required with a PDBQT receptor.")
+            binding_site = define_binding_site(load_protein(protein))
+        self.protein_pdbqt = protein_pdbqt
+        self.binding_site = {key: float(value) for key, value in binding_site.items()}
+        self.engine = get_engine(engine)
+        self.conformer_options = conformer_options or {}
+        self.num_workers = (
+            psutil.cpu_count(logical=False) if num_workers is None else num_workers
+        )
+        self.cache_size = cache_size
+        self._prepared: OrderedDict[str, list[str]] = OrderedDict()
+
+        maps = None
+        if maps_cache is not None and self.engine.supports_maps:
+            from naturaDock.docking.maps_cache import get_or_create_maps
+
+            maps = str(
+                get_or_create_maps(
+                    protein_pdbqt,
+                    self.binding_site,
+                    maps_cache,
+                    scoring=scoring or "vina",
+                )
+            )
+        self._docker_options = {
+            "protein_pdbqt": str(protein_pdbqt),
+            "binding_site": self.binding_site,
+            "scratch_dir": self._scratch.name,
+            "engine": self.engine.name,
+            "exhaustiveness": exhaustiveness,
+            "seed": seed,
+            "scoring": scoring,
+            "num_poses": num_poses,
+            "maps": maps,
+        }
+        self._docker = (
+            _Docker(**self._docker_options) if self.num_workers == 0 else None
+        )
+        self._pool = None
+
+    def __enter__(self) -> Screening:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stops the worker processes and removes the scratch directory."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self._scratch.cleanup()
+
+    def prepare(self, ligand, name: str | None = None) -> dict:
+        """
+        Embeds and prepares a ligand, reusing earlier preparations.
+
+        Args:
+            ligand: A SMILES string or RDKit Mol. Molecules that already have
+                3D coordinates are docked from them; others are embedded with
+                `generate_conformers`.
+            name: The ligand name; by default the molecule's ``_Name`` or its
+                SMILES.
+
+        Returns:
+            The ligand's ``name``, canonical ``smiles`` and ``pdbqt`` strings,
+            one per conformer (empty if preparation failed).
+        """
+        from rdkit import Chem
+
+        from naturaDock.preprocessing.compounds import (
+            generate_conformers,
+            prepare_ligand_strings,
+        )
+
+        mol = Chem.MolFromSmiles(ligand) if isinstance(ligand, str) else ligand
+        if mol is None:
+            return {"name": name or ligand, "smiles": None, "pdbqt": []}
+        smiles = Chem.MolToSmiles(Chem.RemoveHs(mol))
+        if name is None:
+            name = mol.GetProp("_Name") if mol.HasProp("_Name") else ""
+        name = name or smiles
+
+        has_3d = mol.GetNumConformers() > 0 and mol.GetConformer().Is3D()
+        if has_3d:
+            # Docked from the given coordinates, so not shared by SMILES
+            mol = Chem.AddHs(mol, addCoords=True)
+            return {
+                "name": name,
+                "smiles": smiles,
+                "pdbqt": prepare_ligand_strings(mol),
+            }
+
+        if smiles in self._prepared:
+            self._prepared.move_to_end(smiles)
+        else:
+            embedded = list(
+                generate_conformers([Chem.Mol(mol)], **self.conformer_options)
+            )
+            self._prepared[smiles] = (
+                prepare_ligand_strings(embedded[0]) if embedded else []
+            )
+            if len(self._prepared) > self.cache_size:
+                self._prepared.popitem(last=False)
+        return {"name": name, "smiles": smiles, "pdbqt": self._prepared[smiles]}
+
+    def dock(
+        self, ligands: Iterable, names: Iterable[str] | None = None
+    ) -> list[dict]:
+        """
+        Docks ligands against the session's receptor and box.
+
+        Conformers of all ligands are docked in parallel on the warm workers
+        and each ligand keeps its best-scoring conformer.
+
+        Args:
+            ligands: SMILES strings or RDKit Mols.
+            names: Optional ligand names, see `prepare`.
+
+        Returns:
+            One dictionary per ligand, in order, with its ``name``,
+            ``smiles``, best ``affinity`` in kcal/mol, the poses of the best
+            conformer as a ``pdbqt`` string and an ``error`` message; the
+            affinity and poses are None if the ligand failed.
+        """
+        ligands = list(ligands)
+        names = list(names) if names is not None else [None] * len(ligands)
+        prepared = [self.prepare(ligand, name) for ligand, name in zip(ligands, names)]
+        jobs = [blob for ligand in prepared for blob in ligand["pdbqt"]]
+
+        if self._docker is not None:
+            outcomes = [self._docker.dock(blob) for blob in jobs]
+        else:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.num_workers,
+                    initializer=_init_worker,
+                    initargs=(self._docker_options,),
+                )
+            outcomes = list(self._pool.map(_dock_in_worker, jobs))
+
+        results = []
+        outcomes = iter(outcomes)
+        for ligand in prepared:
+            result = {
+                "name": ligand["name"],
+                "smiles": ligand["smiles"],
+                "affinity": None,
+                "pdbqt": None,
+                "error": None if ligand["pdbqt"] else "preparation failed",
+            }
+            errors = []
+            for _ in ligand["pdbqt"]:
+                affinity, poses, error = next(outcomes)
+                if affinity is None:
+                    errors.append(error or "no score")
+                elif result["affinity"] is None or affinity < result["affinity"]:
+                    result.update(affinity=affinity, pdbqt=poses)
+            if result["affinity"] is None and errors:
+                result["error"] = errors[0]
+            results.append(result)
+        return results
+
+    def dock_one(self, ligand, name: str | None = None) -> dict:
+        """Docks a single ligand, see `dock`."""
+        return self.dock([ligand], [name])[0]
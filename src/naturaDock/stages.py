@@ -0,0 +1,140 @@
+# Dependency Graph of Pipeline Stages
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    A pipeline step and the stages whose results it needs.
+
+    Attributes:
+        name: The stage name, also the keyword its result is passed under.
+        func: Called with the required stages' results as keyword arguments.
+        requires: Names of the stages that must finish first.
+    """
+
+    name: str
+    func: Callable[..., Any]
+    requires: tuple[str, ...] = ()
+
+
+class StageGraph:
+    """
+    Runs pipeline stages as soon as the stages they depend on have finished.
+
+    Independent stages, such as receptor preparation and ligand preparation,
+    run at the same time in threads. The heavy work of every stage happens
+    in subprocesses, process pools or RDKit code that releases the GIL, so
+    threads overlap it without copying molecules between processes. Start
+    and end times are recorded for every stage to find the critical path.
+    """
+
+    def __init__(self):
+        self.stages: dict[str, Stage] = {}
+        self.timings: dict[str, tuple[float, float]] = {}
+
+    def add(self, name: str, func: Callable[..., Any], requires=()):
+        """
+        Adds a stage; the stages it requires must have been added before.
+
+        Raises:
+            ValueError: If the name is taken or a required stage is unknown.
+        """
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        unknown = [dep for dep in requires if dep not in self.stages]
+        if unknown:
+            raise ValueError(f"Stage {name} requires unknown stages: {unknown}")
+        self.stages[name] = Stage(name, func, tuple(requires))
+
+    def run(self) -> dict[str, Any]:
+        """
+        Runs every stage, each as soon as its requirements are met.
+
+        A failing stage stops new stages from starting, and its exception is
+        raised once the stages already running have finished.
+
+        Returns:
+            The result of every stage by name.
+        """
+        results = {}
+        pending = dict(self.stages)
+        running = {}
+        start = time.perf_counter()
+
+        def run_stage(stage: Stage, inputs: dict):
+            began = time.perf_counter() - start
+            try:
+                return stage.func(**inputs)
+            finally:
+                self.timings[stage.name] = (began, time.perf_counter() - start)
+
+        with ThreadPoolExecutor(max_workers=max(1, len(self.stages))) as executor:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if all(dep in results for dep in stage.requires):
+                        del pending[name]
+                        inputs = {dep: results[dep] for dep in stage.requires}
+                        running[executor.submit(run_stage, stage, inputs)] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        return results
+
+    def critical_path(self) -> list[str]:
+        """
+        Returns the chain of stages that determined the total run time.
+
+        The chain ends with the stage that finished last. Each earlier stage
+        is the requirement that finished last, which held up the next stage.
+        """
+        if not self.timings:
+            return []
+        name = max(self.timings, key=lambda stage: self.timings[stage][1])
+        path = [name]
+        while self.stages[name].requires:
+            name = max(
+                self.stages[name].requires, key=lambda dep: self.timings[dep][1]
+            )
+            path.append(name)
+        return path[::-1]
+
+    def format_timings(self) -> str:
+        """Formats stage start times and durations, marking the critical path."""
+        critical = set(self.critical_path())
+        total = max((end for _, end in self.timings.values()), default=0.0)
+        busy = sum(end - began for began, end in self.timings.values())
+        lines = ["Stage timings (* critical path):"]
+        for name, (began, end) in sorted(
+            self.timings.items(), key=lambda item: item[1][0]
+        ):
+            marker = "*" if name in critical else " "
+            lines.append(
+                f" {marker} {name:<20} start {began:8.1f} s  took {end - began:8.1f} s"
+            )
+        lines.append(f"Wall time {total:.1f} s for {busy:.1f} s of stage time")
+        return "\n".join(lines)
+
+    def save_timings(self, path: Path):
+        """Writes the stage timings and critical path as JSON."""
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "stages": {
+                        name: {
+                            "requires": list(self.stages[name].requires),
+                            "start_seconds": began,
+                            "end_seconds": end,
+                        }
+                        for name, (began, end) in self.timings.items()
+                    },
+                    "critical_path": self.critical_path(),
+                },
+                f,
+                indent=2,
+            )
@@ -0,0 +1,92 @@
+# Shared fixtures for the naturaDock performance benchmarks
+import json
+import os
+import time
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+BASELINES_DIR = Path(__file__).parent / "baselines"
+
+
+def _measure_stage(name: str, func, num_items: int) -> tuple[object, dict]:
+    """Runs a pipeline stage and measures its throughput and peak memory.
+
+    Args:
+        name: The stage name used in the report.
+        func: A zero-argument callable running the stage. Generators must be
+            consumed inside it.
+        num_items: The number of ligands entering the stage.
+
+    Returns:
+        The stage output and a dictionary with the measurements.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        output = func()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return output, {
+        "stage": name,
+        "items": num_items,
+        "seconds": elapsed,
+        "ligands_per_second": num_items / elapsed if elapsed > 0 else float("inf"),
+        "peak_memory_mb": peak / 2**20,
+    }
+
+
+@pytest.fixture
+def measure_stage():
+    """Returns the stage measurement helper."""
+    return _measure_stage
+
+
+@pytest.fixture
+def benchmark_baseline():
+    """Returns a function comparing results against a stored JSON baseline.
+
+    Baselines live in tests/benchmark/baselines and are (re)written when
+    NATURADOCK_UPDATE_BASELINES=1. An entry regresses when its metric is worse
+    than the baseline by more than NATURADOCK_BENCH_TOLERANCE (a fraction).
+    """
+
+    def compare(
+        name: str,
+        results: dict[str, dict],
+        metric: str = "ligands_per_second",
+        higher_is_better: bool = True,
+    ) -> list[str]:
+        baseline_path = BASELINES_DIR / f"{name}.json"
+        if os.environ.get("NATURADOCK_UPDATE_BASELINES") == "1":
+            BASELINES_DIR.mkdir(exist_ok=True)
+            baseline_path.write_text(json.dumps(results, indent=2, sort_keys=True))
+            return []
+        if not baseline_path.exists():
+            return []
+
+        tolerance = float(os.environ.get("NATURADOCK_BENCH_TOLERANCE", "0.5"))
+        baseline = json.loads(baseline_path.read_text())
+        regressions = []
+        for entry, measured in results.items():
+            reference = baseline.get(entry)
+            if reference is None:
+                continue
+            if higher_is_better:
+                limit = reference[metric] * (1 - tolerance)
+                regressed = measured[metric] < limit
+            else:
+                limit = reference[metric] * (1 + tolerance)
+                regressed = measured[metric] > limit
+            if regressed:
+                regressions.append(
+                    f"{entry}: {metric} {measured[metric]:.3f} is worse than "
+                    f"{limit:.3f} (baseline {reference[metric]:.3f})"
+                )
+        return regressions
+
+    return compare
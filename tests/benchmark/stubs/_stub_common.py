@@ -0,0 +1,45 @@
+"""Shared helpers for the stub Vina/Meeko executables used by the benchmarks.
+
+Latency and failure rates are controlled through environment variables so the
+same stub binaries can model fast, slow and flaky installations.
+"""
+
+import hashlib
+import os
+import sys
+import time
+
+
+def _draw(key: str) -> float:
+    """Returns a deterministic pseudo-random number in [0, 1) for a key."""
+    digest = hashlib.sha256(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64
+
+
+def simulate(tool: str, key: str):
+    """Sleeps and optionally fails according to the tool's environment knobs.
+
+    Args:
+        tool: Prefix of the environment variables, e.g. "STUB_VINA".
+        key: Identifier of the current job, used to make failures repeatable.
+    """
+    latency = float(os.environ.get(f"{tool}_LATENCY", "0"))
+    failure_rate = float(os.environ.get(f"{tool}_FAILURE_RATE", "0"))
+    if latency > 0:
+        time.sleep(latency)
+    if _draw(f"{tool}:{key}") < failure_rate:
+        sys.stderr.write(f"{tool}: simulated failure for {key}\n")
+        sys.exit(1)
+
+
+def get_option(argv: list[str], *names: str) -> str | None:
+    """Returns the value following the first matching command-line option."""
+    for name in names:
+        if name in argv:
+            return argv[argv.index(name) + 1]
+    return None
+
+
+def score_for(key: str) -> float:
+    """Returns a deterministic docking score in [-12, -4) kcal/mol."""
+    return round(-12.0 + 8.0 * _draw(f"score:{key}"), 3)
@@ -0,0 +1,35 @@
+"""Stand-in for Meeko's ``mk_prepare_ligand.py``.
+
+Converts the atom block of an MDL molfile into rigid PDBQT without touching
+RDKit, so preparation cost is dominated by the configured latency.
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from _stub_common import get_option, simulate  # noqa: E402
+
+
+def main(argv: list[str]):
+    mol_path = Path(get_option(argv, "--mol", "-i"))
+    output = Path(get_option(argv, "-o", "--out"))
+    simulate("STUB_MEEKO", output.stem)
+
+    lines = mol_path.read_text().splitlines()
+    num_atoms = int(lines[3][:3])
+    records = ["ROOT"]
+    for i, line in enumerate(lines[4 : 4 + num_atoms], start=1):
+        x, y, z, element = line.split()[:4]
+        records.append(
+            f"HETATM{i:>5} {element:<3} UNL     1    "
+            f"{float(x):8.3f}{float(y):8.3f}{float(z):8.3f}"
+            f"  1.00  0.00     0.000 {element:<2}"
+        )
+    records += ["ENDROOT", "TORSDOF 0"]
+    output.write_text("\n".join(records) + "\n")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
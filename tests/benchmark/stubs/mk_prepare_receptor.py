@@ -0,0 +1,28 @@
+"""Stand-in for Meeko's ``mk_prepare_receptor.py``.
+
+Copies the ATOM records of the input PDB into the requested PDBQT path.
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from _stub_common import get_option, simulate  # noqa: E402
+
+
+def main(argv: list[str]):
+    pdb_path = Path(get_option(argv, "--read_pdb"))
+    output = Path(get_option(argv, "-p"))
+    simulate("STUB_MEEKO", output.stem)
+
+    atoms = [
+        line
+        for line in pdb_path.read_text().splitlines()
+        if line.startswith(("ATOM", "HETATM"))
+    ]
+    output.write_text("\n".join(atoms) + "\n")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
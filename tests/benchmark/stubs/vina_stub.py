@@ -0,0 +1,90 @@
+"""Stand-in for the AutoDock Vina executable and its derivatives.
+
+Copies the ligand coordinates into a single-model output file carrying a
+deterministic score remark. With ``--write_maps`` it writes placeholder map
+files instead.
+
+``STUB_VINA_ENGINE`` selects which engine's command line is accepted and
+which score remark is written; unsupported options are rejected the way the
+real programs reject them. ``STUB_VINA_WORK`` adds that many million
+iterations of CPU-bound work per job, and on Linux the output records the
+CPUs the stub was allowed to run on.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from _stub_common import get_option, score_for, simulate  # noqa: E402
+
+BOX_OPTIONS = {f"--{kind}_{axis}" for kind in ("center", "size") for axis in "xyz"}
+COMMON_OPTIONS = {
+    "--receptor", "--ligand", "--out", "--cpu", "--exhaustiveness", "--seed"
+} | BOX_OPTIONS
+ENGINE_OPTIONS = {
+    "vina": COMMON_OPTIONS | {"--maps", "--write_maps", "--scoring", "--spacing"},
+    "qvina-w": COMMON_OPTIONS,
+    "qvina2": COMMON_OPTIONS,
+    "smina": COMMON_OPTIONS | {"--scoring"},
+}
+SCORE_REMARKS = {"smina": "REMARK minimizedAffinity {score:.5f}"}
+
+
+def check_options(engine: str, argv: list[str]):
+    """Exits with an error for options the emulated engine does not accept."""
+    options = set(argv[::2])
+    unknown = options - ENGINE_OPTIONS[engine]
+    if unknown:
+        sys.stderr.write(f"{engine}: unknown option(s) {sorted(unknown)}\n")
+        sys.exit(2)
+    if "--maps" not in options and not BOX_OPTIONS <= options:
+        sys.stderr.write(f"{engine}: the search box must be specified\n")
+        sys.exit(2)
+
+
+def main(argv: list[str]):
+    engine = os.environ.get("STUB_VINA_ENGINE", "vina")
+    if argv == ["--version"]:
+        print(f"Stub {engine} 1.0")
+        return
+    check_options(engine, argv)
+
+    maps_prefix = get_option(argv, "--write_maps")
+    if maps_prefix is not None:
+        simulate("STUB_VINA_MAPS", maps_prefix)
+        for atom_type in ("C", "OA", "N", "HD", "e", "d"):
+            Path(f"{maps_prefix}.{atom_type}.map").write_text("SPACING 0.375\n")
+        return
+
+    ligand = Path(get_option(argv, "--ligand"))
+    output = Path(get_option(argv, "--out"))
+    simulate("STUB_VINA", ligand.stem)
+    for _ in range(int(float(os.environ.get("STUB_VINA_WORK", "0")) * 1e6)):
+        pass
+
+    atoms = [
+        line
+        for line in ligand.read_text().splitlines()
+        if line.startswith(("ATOM", "HETATM"))
+    ]
+    score = score_for(ligand.stem)
+    remark = SCORE_REMARKS.get(
+        engine, "REMARK VINA RESULT: {score:>9.3f}      0.000      0.000"
+    )
+    remarks = [remark.format(score=score)]
+    if hasattr(os, "sched_getaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+        remarks.append(f"REMARK STUB CPUS {','.join(map(str, cpus))}")
+    output.write_text(
+        "MODEL 1\n"
+        + "".join(f"{line}\n" for line in remarks)
+        + "".join(f"{line}\n" for line in atoms)
+        + "ENDMDL\n"
+    )
+    print(f"   1 {score:>12.3f}      0.000      0.000")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,8 +1,18 @@
 
+import numpy as np
 import pandas as pd
 import pytest
 
-from naturaDock.benchmark import calculate_enrichment_factor, calculate_auc
+from naturaDock.benchmark import (
+    calculate_enrichment_factor,
+    calculate_auc,
+    calculate_metrics,
+    bootstrap_metrics,
+    evaluate_targets,
+    rank_by_score,
+    bedroc,
+    log_auc,
+)
 
 @pytest.fixture
 def sample_benchmark_data():
@@ -30,3 +40,69 @@ def test_calculate_auc(sample_benchmark_data):
     auc = calculate_auc(sample_benchmark_data, 'is_active', 'vina_score')
     assert isinstance(auc, float)
     assert 0.5 <= auc <= 1.0
+
+def test_calculate_enrichment_factor_small_percentile(sample_benchmark_data):
+    """A top slice smaller than one compound still holds the best compound."""
+    ef = calculate_enrichment_factor(
+        sample_benchmark_data, 'is_active', 'vina_score', 1
+    )
+    assert ef == pytest.approx(4.0)
+
+def test_calculate_auc_with_ties():
+    """Tied scores count as half a correct ranking."""
+    df = pd.DataFrame({'is_active': [1, 0, 1, 0], 'vina_score': [-9, -9, -8, -7]})
+    assert calculate_auc(df, 'is_active', 'vina_score') == pytest.approx(0.625)
+
+def test_calculate_metrics_perfect_ranking(sample_benchmark_data):
+    """A screen ranking every active first scores perfectly on every metric."""
+    metrics = calculate_metrics(
+        sample_benchmark_data, 'is_active', 'vina_score', percentiles=[10, 25]
+    )
+    assert metrics['auc'] == pytest.approx(1.0)
+    assert metrics['ef_10'] == pytest.approx(4.0)
+    assert metrics['ef_25'] == pytest.approx(4.0)
+    assert metrics['log_auc'] == pytest.approx(1.0)
+    assert 0.9 < metrics['bedroc'] <= 1.0
+    assert metrics['rie'] > 1.0
+
+def test_early_recognition_metrics_random_ranking():
+    """Random rankings give the expected baseline logAUC and BEDROC."""
+    rng = np.random.default_rng(0)
+    ranked_actives = rng.random((50, 20000)) < 0.01
+    assert np.mean(log_auc(ranked_actives)) == pytest.approx(0.145, abs=0.01)
+    assert np.mean(bedroc(ranked_actives)) < 0.1
+
+def test_rank_by_score_sorts_best_first():
+    """Lower docking scores rank first."""
+    ranked_actives, ranked_scores = rank_by_score([0, 1, 0], [-5.0, -9.0, -7.0])
+    assert ranked_actives.tolist() == [True, False, False]
+    assert ranked_scores.tolist() == [-9.0, -7.0, -5.0]
+
+def test_bootstrap_metrics_intervals(sample_benchmark_data):
+    """Bootstrap intervals bracket the point estimates and are reproducible."""
+    ci = bootstrap_metrics(
+        sample_benchmark_data, 'is_active', 'vina_score',
+        n_bootstrap=200, batch_size=64, seed=1,
+    )
+    assert list(ci.columns) == ['value', 'ci_lower', 'ci_upper']
+    assert (ci['ci_lower'] <= ci['ci_upper']).all()
+    assert ci.loc['auc', 'ci_upper'] == pytest.approx(1.0)
+    again = bootstrap_metrics(
+        sample_benchmark_data, 'is_active', 'vina_score',
+        n_bootstrap=200, batch_size=64, seed=1,
+    )
+    pd.testing.assert_frame_equal(ci, again)
+
+def test_evaluate_targets(sample_benchmark_data):
+    """Metrics are computed separately for every target."""
+    shuffled = sample_benchmark_data.assign(
+        vina_score=sample_benchmark_data['vina_score'][::-1].values
+    )
+    df = pd.concat([
+        sample_benchmark_data.assign(target='good'),
+        shuffled.assign(target='bad'),
+    ])
+    results = evaluate_targets(df, 'target', 'is_active', 'vina_score')
+    assert list(results.index) == ['bad', 'good']
+    assert results.loc['good', 'auc'] == pytest.approx(1.0)
+    assert results.loc['bad', 'auc'] == pytest.approx(0.0)
@@ -0,0 +1,40 @@
+import statistics
+import time
+from pathlib import Path
+
+import pytest
+
+from naturaDock.session import Screening
+
+PROTEIN_PDB = Path(__file__).parent.parent / "data" / "test_protein.pdb"
+
+# New ligands for every query, so none is served from the prepared cache
+QUERIES = ["CCO", "CCN", "CC(C)O", "OCC(=O)O", "c1ccccc1O", "c1ccncc1"]
+
+
+@pytest.mark.parametrize("num_workers", [0, 1])
+def test_single_ligand_round_trip(stub_tools, benchmark_baseline, num_workers):
+    """Single-ligand queries on an open session come back in under a second."""
+    with Screening(PROTEIN_PDB, num_workers=num_workers) as screening:
+        # The first query starts the workers; later ones find them warm
+        screening.dock_one(QUERIES[0])
+        timings = []
+        for smiles in QUERIES[1:]:
+            start = time.perf_counter()
+            result = screening.dock_one(smiles)
+            timings.append(time.perf_counter() - start)
+            assert result["affinity"] is not None
+
+    seconds = statistics.median(timings)
+    print(
+        f"Session round trip with {num_workers} workers: "
+        f"{seconds * 1000:.0f} ms (median of {len(timings)})"
+    )
+    regressions = benchmark_baseline(
+        f"session_latency_{num_workers}",
+        {"dock_one": {"seconds": seconds}},
+        "seconds",
+        False,
+    )
+    assert not regressions, "\n".join(regressions)
+    assert seconds < 1.0
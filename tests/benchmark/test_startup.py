@@ -0,0 +1,96 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+SRC_DIR = Path(__file__).parent.parent.parent / "src"
+
+# Top-level packages that take a noticeable time to import
+HEAVY_MODULES = [
+    "Bio",
+    "matplotlib",
+    "meeko",
+    "openmm",
+    "pandas",
+    "pdbfixer",
+    "rdkit",
+    "scipy",
+    "seaborn",
+    "sklearn",
+]
+
+
+def run_python(code: str) -> subprocess.CompletedProcess:
+    """Runs Python code in a fresh interpreter with naturaDock importable."""
+    env = os.environ.copy()
+    env["PYTHONPATH"] = str(SRC_DIR)
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+
+
+def heavy_modules_after_import(module: str) -> list[str]:
+    """Returns the heavy packages loaded as a side effect of importing a module."""
+    result = run_python(
+        f"import json, sys, {module}\n"
+        f"loaded = {{name.split('.')[0] for name in sys.modules}}\n"
+        f"print(json.dumps(sorted(loaded & set({HEAVY_MODULES!r}))))"
+    )
+    return json.loads(result.stdout)
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "naturaDock.main",
+        "naturaDock.analysis.sdf_export",
+        "naturaDock.benchmark",
+        "naturaDock.session",
+        "naturaDock.stages",
+        "naturaDock.preprocessing.packed",
+        "naturaDock.preprocessing.protein",
+        "naturaDock.preprocessing.similarity",
+        "naturaDock.docking.blind",
+        "naturaDock.docking.engines",
+        "naturaDock.docking.maps_cache",
+        "naturaDock.docking.parallel_dock",
+        "naturaDock.docking.placement",
+        "naturaDock.docking.progress",
+        "naturaDock.docking.result_cache",
+        "naturaDock.docking.vina_dock",
+        "naturaDock.docking.work_queue",
+    ],
+)
+def test_module_import_is_lightweight(module):
+    """The CLI and docking workers must not import heavy dependencies eagerly."""
+    assert heavy_modules_after_import(module) == []
+
+
+def test_cli_help_startup_time(benchmark_baseline):
+    """Measures the wall time of `naturaDock --help` in a fresh interpreter."""
+    timings = []
+    for _ in range(5):
+        start = time.perf_counter()
+        run_python(
+            "import sys\n"
+            "sys.argv = ['naturaDock', '--help']\n"
+            "from naturaDock.main import main\n"
+            "try:\n    main()\nexcept SystemExit:\n    pass"
+        )
+        timings.append(time.perf_counter() - start)
+
+    seconds = statistics.median(timings)
+    print(f"naturaDock --help: {seconds * 1000:.0f} ms (median of 5)")
+    regressions = benchmark_baseline(
+        "cli_startup", {"help": {"seconds": seconds}}, "seconds", False
+    )
+    assert not regressions, "\n".join(regressions)
@@ -0,0 +1,219 @@
+import gzip
+import os
+
+import psutil
+import pytest
+
+from naturaDock.preprocessing.compounds import (
+    load_compounds,
+    filter_compounds,
+    generate_conformers,
+    prepare_compounds,
+)
+from naturaDock.docking.parallel_dock import run_parallel_docking
+from naturaDock.analysis.results import aggregate_results
+from naturaDock.analysis.export import rank_and_export_results
+from naturaDock.analysis.statistics import generate_statistics
+
+LIBRARY_SIZE = int(os.environ.get("NATURADOCK_BENCH_LIBRARY_SIZE", "24"))
+
+BINDING_SITE = {
+    "center_x": 0.0,
+    "center_y": 0.0,
+    "center_z": 0.0,
+    "size_x": 20.0,
+    "size_y": 20.0,
+    "size_z": 20.0,
+}
+
+
+def run_pipeline(library_path, work_dir, measure_stage) -> dict[str, dict]:
+    """Runs every pipeline stage on a library and returns per-stage metrics."""
+    prepared_dir = work_dir / "prepared_compounds"
+    docking_dir = work_dir / "docking_results"
+    prepared_dir.mkdir()
+    docking_dir.mkdir()
+    protein_pdbqt = work_dir / "protein.pdbqt"
+    protein_pdbqt.write_text("")
+
+    metrics = {}
+
+    def record(name, func, num_items):
+        output, metrics[name] = measure_stage(name, func, num_items)
+        return output
+
+    compounds = record(
+        "load_compounds", lambda: list(load_compounds(library_path)), LIBRARY_SIZE
+    )
+    filtered = record(
+        "filter_compounds", lambda: list(filter_compounds(compounds)), len(compounds)
+    )
+    conformers = record(
+        "generate_conformers",
+        lambda: list(generate_conformers(filtered)),
+        len(filtered),
+    )
+    prepared = record(
+        "prepare_compounds",
+        lambda: prepare_compounds(conformers, prepared_dir),
+        len(conformers),
+    )
+    record(
+        "run_parallel_docking",
+        lambda: run_parallel_docking(
+            protein_pdbqt, prepared, BINDING_SITE, docking_dir, num_workers=2
+        ),
+        len(prepared),
+    )
+    results_df = record(
+        "aggregate_results", lambda: aggregate_results(docking_dir), len(prepared)
+    )
+
+    def export():
+        rank_and_export_results(results_df, work_dir, "csv")
+        generate_statistics(results_df, work_dir)
+
+    record("export", export, len(results_df))
+    return metrics
+
+
+def test_pipeline_throughput(
+    stub_tools, synthetic_library, measure_stage, benchmark_baseline, tmp_path
+):
+    """Measures ligands/second and peak memory for every pipeline stage."""
+    library_path = synthetic_library(LIBRARY_SIZE)
+    metrics = run_pipeline(library_path, tmp_path, measure_stage)
+
+    for stage in metrics.values():
+        print(
+            f"{stage['stage']:<22} {stage['ligands_per_second']:>10.1f} ligands/s "
+            f"{stage['peak_memory_mb']:>8.2f} MB peak"
+        )
+
+    assert metrics["aggregate_results"]["items"] == LIBRARY_SIZE
+    regressions = benchmark_baseline(
+        f"pipeline_throughput_{LIBRARY_SIZE}", metrics
+    )
+    assert not regressions, "\n".join(regressions)
+
+
+def test_pipeline_tolerates_stub_failures(
+    stub_tools, synthetic_library, measure_stage, monkeypatch, tmp_path
+):
+    """Simulated Vina and Meeko failures drop ligands without aborting the run."""
+    monkeypatch.setenv("STUB_VINA_FAILURE_RATE", "0.25")
+    monkeypatch.setenv("STUB_MEEKO_FAILURE_RATE", "0.25")
+    library_path = synthetic_library(LIBRARY_SIZE)
+
+    metrics = run_pipeline(library_path, tmp_path, measure_stage)
+
+    prepared = metrics["run_parallel_docking"]["items"]
+    docked = len(list((tmp_path / "docking_results").glob("*_docked.pdbqt")))
+    assert 0 < prepared < LIBRARY_SIZE
+    assert 0 < docked < prepared
+    assert (tmp_path / "ranked_results.csv").exists()
+
+
+def test_docking_stage_scales_with_workers(
+    prepared_ligands, protein_pdbqt, measure_stage, monkeypatch, tmp_path
+):
+    """With a fixed Vina latency, more workers give proportionally more ligands/s."""
+    monkeypatch.setenv("STUB_VINA_LATENCY", "0.2")
+    prepared = prepared_ligands(8)
+
+    rates = {}
+    for num_workers in (1, 4):
+        docking_dir = tmp_path / f"docking_{num_workers}"
+        docking_dir.mkdir()
+        _, measured = measure_stage(
+            "run_parallel_docking",
+            lambda: run_parallel_docking(
+                protein_pdbqt, prepared, BINDING_SITE, docking_dir, num_workers
+            ),
+            len(prepared),
+        )
+        rates[num_workers] = measured["ligands_per_second"]
+
+    assert rates[4] > rates[1]
+
+
+LOADING_SMILES = [
+    "CC(=O)Oc1ccccc1C(=O)O",
+    "CC(C)Cc1ccc(cc1)C(C)C(=O)O",
+    "CN1C=NC2=C1C(=O)N(C(=O)N2C)C",
+    "O=C(O)c1cc(O)c(O)c(O)c1",
+    "COc1cc(C=CC(=O)CC(=O)C=Cc2ccc(O)c(OC)c2)ccc1O",
+    "OCC1OC(Oc2cc(O)c3C(=O)C=C(Oc3c2)c2ccc(O)c(O)c2)C(O)C(O)C1O",
+]
+
+
+@pytest.mark.skipif(
+    (psutil.cpu_count(logical=False) or 1) < 2,
+    reason="parallel parsing needs more than one core",
+)
+def test_parallel_library_loading_is_faster(measure_stage, tmp_path):
+    """Compressed files parsed in parallel load faster than one after another."""
+    from rdkit import Chem
+
+    size = int(os.environ.get("NATURADOCK_BENCH_LOAD_SIZE", "24000"))
+    molecules = []
+    for smiles in LOADING_SMILES:
+        mol = Chem.AddHs(Chem.MolFromSmiles(smiles))
+        mol.Compute2DCoords()
+        molecules.append(Chem.MolToMolBlock(mol).split("\n", 1)[1])
+    files = [tmp_path / f"part_{i}.sdf.gz" for i in range(4)]
+    for i, path in enumerate(files):
+        with gzip.open(path, "wt") as f:
+            for j in range(i, size, len(files)):
+                f.write(f"bench_{j:06d}\n{molecules[j % len(molecules)]}$$$$\n")
+
+    rates = {}
+    for num_workers in (1, 4):
+        _, measured = measure_stage(
+            "load_compounds",
+            lambda: sum(1 for _ in load_compounds(files, num_workers=num_workers)),
+            size,
+        )
+        rates[num_workers] = measured["ligands_per_second"]
+    print(
+        f"Library loading: {rates[1]:.0f} ligands/s with one worker, "
+        f"{rates[4]:.0f} ligands/s with four"
+    )
+
+    assert rates[4] > rates[1]
+
+def test_pinned_docking_throughput(
+    prepared_ligands, protein_pdbqt, measure_stage, monkeypatch, tmp_path
+):
+    """Compares CPU-bound docking throughput with and without pinning."""
+    import psutil
+
+    monkeypatch.setenv("STUB_VINA_WORK", "2")
+    num_workers = psutil.cpu_count(logical=False)
+    prepared = prepared_ligands(4 * num_workers)
+
+    rates = {}
+    for pin_workers in (False, True):
+        docking_dir = tmp_path / f"docking_{pin_workers}"
+        docking_dir.mkdir()
+        _, measured = measure_stage(
+            "run_parallel_docking",
+            lambda: run_parallel_docking(
+                protein_pdbqt,
+                prepared,
+                BINDING_SITE,
+                docking_dir,
+                num_workers,
+                pin_workers=pin_workers,
+            ),
+            len(prepared),
+        )
+        rates[pin_workers] = measured["ligands_per_second"]
+    print(
+        f"{num_workers} workers: {rates[False]:.2f} ligands/s unpinned, "
+        f"{rates[True]:.2f} ligands/s pinned"
+    )
+
+    # Pinning must never cost much throughput on an idle machine
+    assert rates[True] > 0.5 * rates[False]
+
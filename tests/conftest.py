@@ -1 +1,113 @@
 # conftest.py for naturaDock tests
+import sys
+from pathlib import Path
+
+import pytest
+
+TEST_DATA_DIR = Path(__file__).parent / "data"
+STUBS_DIR = Path(__file__).parent / "benchmark" / "stubs"
+
+
+def write_stub_executable(directory: Path, name: str, engine: str = "vina") -> Path:
+    """Writes a wrapper script running the stub Vina as the given engine."""
+    stub = STUBS_DIR / "vina_stub.py"
+    if sys.platform == "win32":
+        executable = directory / f"{name}.cmd"
+        executable.write_text(
+            f'@set STUB_VINA_ENGINE={engine}\n@"{sys.executable}" "{stub}" %*\n'
+        )
+    else:
+        executable = directory / name
+        executable.write_text(
+            f"#!/bin/sh\nSTUB_VINA_ENGINE={engine} "
+            f'exec "{sys.executable}" "{stub}" "$@"\n'
+        )
+        executable.chmod(0o755)
+    return executable
+
+
+@pytest.fixture
+def stub_tools(tmp_path, monkeypatch):
+    """Points naturaDock at the stub Vina and Meeko executables.
+
+    Latency and failure rates can be tuned per test through the
+    STUB_VINA_* and STUB_MEEKO_* environment variables.
+    """
+    vina = write_stub_executable(tmp_path, "vina")
+
+    monkeypatch.setenv("VINA_EXECUTABLE", str(vina))
+    monkeypatch.setenv("MEEKO_SCRIPTS_DIR", str(STUBS_DIR))
+    for tool in ("STUB_VINA", "STUB_MEEKO"):
+        monkeypatch.setenv(f"{tool}_LATENCY", "0")
+        monkeypatch.setenv(f"{tool}_FAILURE_RATE", "0")
+    return vina
+
+
+@pytest.fixture
+def stub_engine(stub_tools, tmp_path, monkeypatch):
+    """Returns a factory pointing a docking engine at a stub executable."""
+
+    def make_engine(engine):
+        executable = write_stub_executable(
+            tmp_path, engine.executables[0], engine.name
+        )
+        monkeypatch.setenv(engine.env_var, str(executable))
+        return executable
+
+    return make_engine
+
+
+@pytest.fixture
+def synthetic_library(tmp_path):
+    """Returns a factory writing an SDF library of the requested size.
+
+    Records are cycled from the SDF files in tests/data and renamed so every
+    molecule produces a distinct PDBQT file downstream.
+    """
+
+    def make_library(size: int) -> Path:
+        templates = []
+        for sdf in sorted(TEST_DATA_DIR.glob("*.sdf")):
+            for record in sdf.read_text().split("$$$$\n"):
+                if record.strip():
+                    templates.append(record.split("\n", 1)[1])
+
+        library_path = tmp_path / f"library_{size}.sdf"
+        with open(library_path, "w") as f:
+            for i in range(size):
+                f.write(f"bench_{i:06d}\n{templates[i % len(templates)]}$$$$\n")
+        return library_path
+
+    return make_library
+
+
+@pytest.fixture
+def prepared_ligands(stub_tools, synthetic_library, tmp_path):
+    """Returns a factory preparing a synthetic library with the stub Meeko.
+
+    Every call prepares a new library of the requested size into its own
+    directory and returns the PDBQT paths.
+    """
+    from naturaDock.preprocessing.compounds import (
+        generate_conformers,
+        load_compounds,
+        prepare_compounds,
+    )
+
+    def prepare(size: int) -> list[Path]:
+        prepared_dir = tmp_path / f"prepared_{size}"
+        prepared_dir.mkdir(exist_ok=True)
+        return prepare_compounds(
+            generate_conformers(load_compounds(synthetic_library(size))),
+            prepared_dir,
+        )
+
+    return prepare
+
+
+@pytest.fixture
+def protein_pdbqt(tmp_path):
+    """Writes a placeholder receptor, which the stub engines accept."""
+    path = tmp_path / "protein.pdbqt"
+    path.write_text("ATOM\n")
+    return path
@@ -1,10 +1,25 @@
 import pytest
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
-from naturaDock.analysis.results import parse_vina_result, aggregate_results
+from naturaDock.analysis.results import (
+    parse_vina_result,
+    aggregate_results,
+    collapse_conformer_results,
+)
 from naturaDock.analysis.export import rank_and_export_results
-from naturaDock.analysis.statistics import generate_statistics
+from naturaDock.analysis.contacts import (
+    analyze_contacts,
+    parse_constraint,
+    read_pdbqt_poses,
+)
+from naturaDock.analysis.sdf_export import export_poses_sdf
+from naturaDock.analysis.statistics import (
+    generate_statistics,
+    ScoreAggregate,
+    aggregate_scores,
+)
 
 # Define test data paths
 TEST_DATA_DIR = Path(__file__).parent / "data"
@@ -41,6 +56,18 @@ def test_aggregate_results(dummy_results_dir):
     assert "compound" in results_df.columns
     assert "affinity" in results_df.columns
 
+def test_collapse_conformer_results():
+    """Test collapsing conformer results to the best score per molecule."""
+    results_df = pd.DataFrame({
+        "compound": ["taxol_conf0", "taxol_conf1", "taxol_conf2", "menthol"],
+        "affinity": [-7.1, -9.3, -8.0, -5.2],
+    })
+    collapsed = collapse_conformer_results(results_df).set_index("compound")
+    assert len(collapsed) == 2
+    assert collapsed.loc["taxol", "affinity"] == -9.3
+    assert collapsed.loc["taxol", "conformer"] == 1
+    assert collapsed.loc["menthol", "conformer"] == -1
+
 def test_rank_and_export_results(dummy_results_dir):
     """Test ranking and exporting results."""
     results_df = aggregate_results(dummy_results_dir)
@@ -72,3 +99,188 @@ def test_generate_statistics(dummy_results_dir):
 
     plot_path = output_dir / "docking_scores_distribution.png"
     assert plot_path.exists()
+
+def test_generate_statistics_top_bins(tmp_path):
+    """Test that scores in the top bins, where bars are padded, still plot."""
+    generate_statistics(pd.DataFrame({"affinity": [9.49, 12.0, 11.0]}), tmp_path)
+    assert (tmp_path / "docking_scores_distribution.png").exists()
+
+def test_score_aggregate_matches_describe():
+    """Test that the binned summary matches describe() within one bin width."""
+    rng = np.random.default_rng(0)
+    affinities = pd.Series(rng.normal(-7.0, 1.5, 50_000))
+    aggregate = aggregate_scores(
+        pd.DataFrame({"affinity": affinities}), chunk_size=7_000
+    )
+
+    summary = aggregate.describe()
+    expected = affinities.describe()
+    assert list(summary.index) == list(expected.index)
+    assert summary["count"] == expected["count"]
+    for stat in ["mean", "std", "min", "max"]:
+        assert summary[stat] == pytest.approx(expected[stat])
+    for stat in ["25%", "50%", "75%"]:
+        assert abs(summary[stat] - expected[stat]) <= aggregate.bin_width
+
+def test_score_aggregate_merge_and_roundtrip():
+    """Test that shard aggregates merge into the aggregate of all scores."""
+    rng = np.random.default_rng(1)
+    affinities = rng.normal(-8.0, 2.0, 1_000)
+    shards = [
+        ScoreAggregate().update(chunk) for chunk in np.array_split(affinities, 4)
+    ]
+
+    merged = ScoreAggregate()
+    for shard in shards:
+        merged.merge(ScoreAggregate.from_dict(shard.to_dict()))
+    whole = ScoreAggregate().update(affinities)
+
+    assert np.array_equal(merged.counts, whole.counts)
+    pd.testing.assert_series_equal(merged.describe(), whole.describe())
+    with pytest.raises(ValueError):
+        merged.merge(ScoreAggregate(bin_width=0.1))
+
+
+def _pdbqt_atom(serial, x, y, z, atom_type):
+    """Formats a ligand atom record as written by Vina."""
+    return (
+        f"ATOM  {serial:5d} {atom_type:<4} UNL A   1    {x:8.3f}{y:8.3f}{z:8.3f}"
+        f"  1.00  0.00     0.000 {atom_type:<2}"
+    )
+
+def _pdbqt_pose(affinity, atoms):
+    """Formats one Vina output model."""
+    lines = ["MODEL 1", f"REMARK VINA RESULT:    {affinity:.1f}      0.000      0.000"]
+    lines += [_pdbqt_atom(i, *atom) for i, atom in enumerate(atoms, start=1)]
+    return lines + ["ENDMDL"]
+
+def test_analyze_contacts(tmp_path):
+    """Test residue fingerprints and constraints against the tri-alanine."""
+    near_ala2 = [(5.9, 1.65, 3.0, "OA"), (5.9, 1.65, 4.0, "HD")]
+    near_ala3 = [(9.0, 3.0, -4.0, "C")]
+    far_away = [(30.0, 30.0, 30.0, "OA")]
+    (tmp_path / "hbond_docked.pdbqt").write_text(
+        "\n".join(_pdbqt_pose(-7.0, near_ala2) + _pdbqt_pose(-6.0, near_ala3))
+    )
+    (tmp_path / "apolar_docked.pdbqt").write_text(
+        "\n".join(_pdbqt_pose(-6.5, near_ala3))
+    )
+    (tmp_path / "distant_docked.pdbqt").write_text(
+        "\n".join(_pdbqt_pose(-5.0, far_away))
+    )
+    results_df = pd.DataFrame(
+        {
+            "compound": ["hbond", "apolar", "missing", "distant"],
+            "affinity": [-7.0, -6.5, -6.0, -5.0],
+            "site-id": [0, 1, 2, 3],
+        }
+    )
+
+    df = analyze_contacts(
+        results_df,
+        tmp_path,
+        TEST_DATA_DIR / "test_protein.pdb",
+        constraints=["A:ALA2:hbond", "A:ALA1"],
+        batch_size=2,
+    )
+
+    assert df["compound"].tolist() == ["hbond", "apolar", "missing", "distant"]
+    assert df["site-id"].tolist() == [0, 1, 2, 3]
+    assert df["A:ALA2:hbond"].tolist()[:2] == [True, False]
+    assert df["A:ALA3:hydrophobic"].tolist()[:2] == [False, True]
+    assert df.loc[2, ["contacts", "A:ALA2:hbond"]].isna().all()
+    assert df["A:ALA2:hbond"].tolist()[3] is False
+    assert not df["A:ALA1:contact"].any()
+    assert not df["passes_constraints"].any()
+    assert df["contacts"].tolist()[1::2] == [1, 0]
+
+    all_poses = analyze_contacts(
+        results_df.iloc[:1], tmp_path, TEST_DATA_DIR / "test_protein.pdb",
+        all_poses=True,
+    )
+    assert all_poses["pose"].tolist() == [1, 2]
+    assert all_poses["affinity"].tolist() == [-7.0, -6.0]
+    assert all_poses["passes_constraints"].all()
+
+def test_read_pdbqt_poses_and_constraints(tmp_path):
+    """Test pose parsing and constraint syntax."""
+    pose_file = tmp_path / "pose.pdbqt"
+    pose_file.write_text("\n".join(_pdbqt_pose(-7.0, [(1.0, 2.0, 3.0, "NA")])))
+    (pose,) = read_pdbqt_poses(pose_file, all_poses=True)
+    assert pose["affinity"] == -7.0
+    assert pose["coordinates"].tolist() == [[1.0, 2.0, 3.0]]
+    assert pose["elements"].tolist() == ["N"]
+
+    assert parse_constraint("A:ASP25:hbond") == ("A:ASP25", "hbond")
+    assert parse_constraint("A:ASP25") == ("A:ASP25", "contact")
+    with pytest.raises(ValueError):
+        parse_constraint(":hbond")
+
+
+def _docked_pdbqt(smiles: str, scores: list[float]) -> str:
+    """Builds Vina-style output from a Meeko-prepared ligand, one model per score."""
+    from meeko import MoleculePreparation, PDBQTWriterLegacy
+    from rdkit import Chem
+    from rdkit.Chem import AllChem
+
+    mol = Chem.AddHs(Chem.MolFromSmiles(smiles))
+    AllChem.EmbedMolecule(mol, randomSeed=42)
+    pdbqt, _, _ = PDBQTWriterLegacy.write_string(MoleculePreparation().prepare(mol)[0])
+    return "".join(
+        f"MODEL {model}\nREMARK VINA RESULT: {score:9.3f}      0.000      0.000\n"
+        f"{pdbqt}ENDMDL\n"
+        for model, score in enumerate(scores, start=1)
+    )
+
+
+def test_export_poses_sdf(tmp_path):
+    """Test that poses are rebuilt with bond orders and streamed in rank order."""
+    import gzip
+    from rdkit import Chem
+
+    results_dir = tmp_path / "docking_results"
+    results_dir.mkdir()
+    (results_dir / "ester_docked.pdbqt").write_text(
+        _docked_pdbqt("c1ccc(cc1)C(=O)OCC", [-7.5, -6.0])
+    )
+    (results_dir / "acid_conf1_docked.pdbqt").write_text(
+        _docked_pdbqt("CC(=O)O", [-8.0])
+    )
+    (results_dir / "broken_docked.pdbqt").write_text(
+        "MODEL 1\nREMARK VINA RESULT: -9.0 0.0 0.0\nENDMDL\n"
+    )
+    results_df = pd.DataFrame(
+        {
+            "compound": ["ester", "acid", "broken"],
+            "affinity": [-7.5, -8.0, -9.0],
+            "conformer": [-1, 1, -1],
+        }
+    )
+
+    paths = export_poses_sdf(
+        results_df,
+        results_dir,
+        tmp_path,
+        max_poses=None,
+        num_workers=2,
+        records_per_file=1,
+        compression="gzip",
+    )
+
+    assert [path.name for path in paths] == ["poses_0000.sdf.gz", "poses_0001.sdf.gz"]
+    records = []
+    for path in paths:
+        with gzip.open(path) as f:
+            records.extend(Chem.ForwardSDMolSupplier(f))
+    assert [
+        (mol.GetProp("_Name"), mol.GetIntProp("naturaDock_rank"),
+         mol.GetIntProp("naturaDock_pose"), mol.GetDoubleProp("naturaDock_affinity"))
+        for mol in records
+    ] == [("acid", 2, 1, -8.0), ("ester", 3, 1, -7.5), ("ester", 3, 2, -6.0)]
+    assert records[0].GetIntProp("naturaDock_conformer") == 1
+    assert records[0].GetProp("naturaDock_source") == "acid_conf1_docked.pdbqt"
+    assert Chem.MolToSmiles(Chem.RemoveHs(records[1])) == "CCOC(=O)c1ccccc1"
+
+    top = export_poses_sdf(results_df, results_dir, tmp_path / "top", top_k=2,
+                           num_workers=1)
+    assert len(list(Chem.SDMolSupplier(str(top[0])))) == 1
@@ -2,6 +2,13 @@ from pathlib import Path
 import subprocess
 import pandas as pd
 import os
+import json
+import time
+
+from naturaDock.main import main
+from naturaDock.preprocessing.packed import PackedLibrary
+from naturaDock.preprocessing.similarity import FingerprintIndex
+from naturaDock.stages import StageGraph
 
 # Define test data paths
 TEST_DATA_DIR = Path(__file__).parent / "data"
@@ -76,3 +83,114 @@ def test_cli_workflow():
 
     # Clean up output directory
     subprocess.run(["rmdir", "/s", "/q", str(OUTPUT_DIR)], shell=True)
+
+
+def test_cli_status(tmp_path, capsys):
+    """Test that the status command reports a snapshot without pose files."""
+    docking_results_dir = tmp_path / "docking_results"
+    docking_results_dir.mkdir()
+    snapshot = {
+        "started_at": "2024-01-01T00:00:00+00:00",
+        "updated_at": "2024-01-01T01:00:00+00:00",
+        "finished": False,
+        "total": 100,
+        "completed": 40,
+        "failed": 2,
+        "elapsed_seconds": 3600.0,
+        "ligands_per_second": 42 / 3600,
+        "eta_seconds": 58 * 3600 / 42,
+        "top_hits": [{"compound": "quercetin", "affinity": -9.8}],
+        "histogram": {
+            "lower": -30.0, "upper": 10.0, "bin_width": 0.1,
+            "bins": [202], "counts": [40], "count": 40,
+            "mean": -9.75, "m2": 0.0, "minimum": -9.8, "maximum": -9.7,
+        },
+    }
+    (docking_results_dir / "progress.json").write_text(json.dumps(snapshot))
+
+    main(["status", str(tmp_path)])
+    output = capsys.readouterr().out
+    assert "42/100" in output
+    assert "quercetin" in output
+
+    main(["status", str(tmp_path), "--json"])
+    assert json.loads(capsys.readouterr().out)["completed"] == 40
+
+
+def test_cli_pack(tmp_path, capsys):
+    """Test that the pack command writes a library the pipeline can open."""
+    packed_path = tmp_path / "library.ndpack"
+
+    main(["pack", str(TEST_DATA_DIR / "test_compounds.sdf"), str(packed_path),
+          "--num_workers", "1"])
+
+    assert "Packed 1 molecules" in capsys.readouterr().out
+    assert len(PackedLibrary(packed_path)) == 1
+
+
+def test_cli_index_and_similar(tmp_path, capsys):
+    """Test that hits of a ranked results file are expanded into analogs."""
+    library = tmp_path / "library.smi"
+    library.write_text(
+        "c1ccc(cc1)C(=O)O benzoic\nc1ccc(cc1)C(=O)OC methyl\nCCCCCCCCCCO decanol\n"
+    )
+    hits = tmp_path / "ranked_results.csv"
+    pd.DataFrame({"compound": ["benzoic"], "affinity": [-7.0]}).to_csv(
+        hits, index=False
+    )
+    output = tmp_path / "analogs.smi"
+
+    main(["index", str(library), str(tmp_path / "index")])
+    main(["similar", str(tmp_path / "index"), str(output), "--hits", str(hits),
+          "--top_n", "1"])
+
+    assert "1 analogs of 1 queries" in capsys.readouterr().out
+    assert output.read_text().split()[1] == "methyl"
+
+
+def test_similar_finds_hits_of_a_filtered_run(stub_tools, tmp_path):
+    """Hits of a run whose filters dropped compounds map onto the right records."""
+    library = tmp_path / "library.smi"
+    # The untitled chain fails the weight filter, shifting later positions
+    library.write_text(
+        "C" * 48 + "\nCCO\nc1ccccc1O\nCC(=O)Oc1ccccc1C(=O)O titled hit\n"
+    )
+    output_dir = tmp_path / "run"
+    main(["-p", str(PROTEIN_PDB), "-l", str(library), "-o", str(output_dir),
+          "--num_workers", "1"])
+    ranked = output_dir / "ranked_results.csv"
+
+    index_dir = tmp_path / "index"
+    main(["index", str(library), str(index_dir)])
+    index = FingerprintIndex(index_dir)
+    names = pd.read_csv(ranked)["compound"].tolist()
+    found = index.find(names)
+    assert sorted(found) == sorted(names) == ["compound_1", "compound_2", "titled"]
+    assert "C" * 48 not in [smiles for smiles, _ in index.compounds(found.values())]
+
+    analogs = tmp_path / "analogs.smi"
+    main(["similar", str(index_dir), str(analogs), "--hits", str(ranked),
+          "--top_hits", "1"])
+    hit = index.compounds([found[names[0]]])[0][0]
+    assert hit not in analogs.read_text().split()
+
+
+def test_stage_graph_overlaps_independent_stages():
+    """Independent stages run concurrently and the slower one is critical."""
+    graph = StageGraph()
+    graph.add("receptor", lambda: time.sleep(0.5) or "protein.pdbqt")
+    graph.add("ligands", lambda: time.sleep(0.2) or ["ligand.pdbqt"])
+    graph.add(
+        "docking",
+        lambda receptor, ligands: (receptor, ligands),
+        requires=("receptor", "ligands"),
+    )
+
+    start = time.perf_counter()
+    results = graph.run()
+
+    assert time.perf_counter() - start < 0.65
+    assert results["docking"] == ("protein.pdbqt", ["ligand.pdbqt"])
+    assert graph.critical_path() == ["receptor", "docking"]
+    assert graph.timings["docking"][0] >= graph.timings["receptor"][1]
+    assert "* receptor" in graph.format_timings()
@@ -3,7 +3,15 @@ from pathlib import Path
 from unittest.mock import patch, MagicMock
 import subprocess
 
+from naturaDock.analysis.results import parse_score_remark, parse_vina_result
+from naturaDock.docking.engines import ENGINES, DockingEngine, get_engine
+from naturaDock.docking.parallel_dock import run_parallel_docking
 from naturaDock.docking.vina_dock import run_vina_docking
+from naturaDock.docking.progress import (
+    DockingProgress,
+    read_snapshot,
+    format_snapshot,
+)
 
 # Define test data paths
 TEST_DATA_DIR = Path(__file__).parent / "data"
@@ -62,3 +70,701 @@ def test_run_vina_docking_called_process_error(mock_subprocess_run):
     # The function should catch the exception and print an error
     with pytest.raises(subprocess.CalledProcessError):
         run_vina_docking(PROTEIN_PDBQT, COMPOUND_PDBQT, BINDING_SITE, OUTPUT_PDBQT)
+
+def test_docking_progress_snapshot(tmp_path):
+    """Test that running aggregates and top hits are written to the snapshot."""
+    snapshot_path = tmp_path / "progress.json"
+    progress = DockingProgress(5, snapshot_path, snapshot_interval=0, top_k=2)
+
+    for compound, affinity in [
+        ("a", -6.0), ("b", -9.5), ("c", None), ("d", -7.25)
+    ]:
+        progress.record(compound, affinity)
+
+    snapshot = read_snapshot(tmp_path)
+    assert snapshot["total"] == 5
+    assert snapshot["completed"] == 3
+    assert snapshot["failed"] == 1
+    assert not snapshot["finished"]
+    assert snapshot["eta_seconds"] is not None
+    assert snapshot["top_hits"] == [
+        {"compound": "b", "affinity": -9.5},
+        {"compound": "d", "affinity": -7.25},
+    ]
+    assert snapshot["histogram"]["count"] == 3
+    assert list(tmp_path.iterdir()) == [snapshot_path]
+
+    report = format_snapshot(snapshot)
+    assert "4/5" in report
+    assert "b" in report
+
+def test_docking_progress_snapshot_interval(tmp_path):
+    """Test that snapshots are throttled by the snapshot interval."""
+    snapshot_path = tmp_path / "progress.json"
+    progress = DockingProgress(3, snapshot_path, snapshot_interval=3600)
+    progress.record("a", -6.0)
+    assert read_snapshot(snapshot_path)["completed"] == 1
+    progress.record("b", -7.0)
+    assert read_snapshot(snapshot_path)["completed"] == 1
+    progress.write_snapshot()
+    assert read_snapshot(snapshot_path)["completed"] == 2
+
+
+def test_read_snapshot_merges_workers(tmp_path):
+    """Test that the snapshots of queue workers are merged into one."""
+    first = DockingProgress(2, tmp_path / "progress_a.json", snapshot_interval=0)
+    second = DockingProgress(3, tmp_path / "progress_b.json", snapshot_interval=0)
+    first.record("a", -6.0)
+    second.record("b", -9.5)
+    second.record("c", None)
+    first.total += 2
+    first.record("d", -7.25, cached=True)
+
+    snapshot = read_snapshot(tmp_path)
+    assert snapshot["total"] == 7
+    assert snapshot["completed"] == 3
+    assert snapshot["failed"] == 1
+    assert snapshot["cached"] == 1
+    assert not snapshot["finished"]
+    assert [hit["compound"] for hit in snapshot["top_hits"]] == ["b", "d", "a"]
+    assert snapshot["histogram"]["count"] == 3
+    assert "4/7" in format_snapshot(snapshot)
+
+
+def test_read_snapshot_counts_unclaimed_queue_jobs(tmp_path):
+    """Test that a queued run's total and ETA include jobs no worker claimed."""
+    from naturaDock.docking.work_queue import WorkQueue
+
+    queue = WorkQueue(tmp_path / "queue.sqlite")
+    queue.enqueue([Path(f"ligand_{i}.pdbqt") for i in range(6)])
+    docking_dir = tmp_path / "docking_results"
+    docking_dir.mkdir()
+    progress = DockingProgress(0, docking_dir / "progress_a.json", snapshot_interval=0)
+    for job_id, ligand in queue.claim("a", 2, lease_seconds=60):
+        progress.total += 1
+        progress.record(ligand.stem, -7.0)
+        queue.complete("a", job_id, -7.0)
+
+    snapshot = read_snapshot(tmp_path)
+    assert snapshot["total"] == 6
+    assert snapshot["completed"] == 2
+    assert not snapshot["finished"]
+    assert snapshot["eta_seconds"] > 0
+    assert snapshot["queue"]["pending"] == 4
+    assert "4 pending" in format_snapshot(snapshot)
+
+
+@patch("naturaDock.docking.screening.dock_molecules")
+def test_run_cluster_expansion_docking(mock_dock_molecules, tmp_path):
+    """Test that only members of the best-scoring clusters are docked."""
+    from rdkit import Chem
+    from naturaDock.docking.screening import (
+        assign_names,
+        run_cluster_expansion_docking,
+    )
+
+    molecules = assign_names(Chem.MolFromSmiles("C" * (i + 1)) for i in range(6))
+    labels = [0, 0, 1, 1, 2, 2]
+    representatives = [0, 2, 4]
+    mock_dock_molecules.side_effect = [
+        {"compound_0": -5.0, "compound_2": -9.0, "compound_4": -7.0},
+        {"compound_3": -8.5},
+    ]
+
+    scores = run_cluster_expansion_docking(
+        molecules, labels, representatives, Path("protein.pdbqt"), {}, tmp_path,
+        expand_fraction=0.34,
+    )
+
+    expanded = mock_dock_molecules.call_args_list[1].args[0]
+    assert [mol.GetProp("_Name") for mol in expanded] == ["compound_3"]
+    assert scores["compound_3"] == -8.5
+    assert len(scores) == 4
+
+
+def test_active_learning_screen_recovers_top_hits():
+    """Test that surrogate-guided rounds find far more top hits than chance."""
+    import numpy as np
+    import pandas as pd
+    from sklearn.linear_model import Ridge
+    from naturaDock.docking.active_learning import (
+        active_learning_screen,
+        recall_report,
+    )
+
+    rng = np.random.default_rng(0)
+    bits = rng.random((2000, 64)) < 0.3
+    true_scores = -8.0 * bits[:, :8].mean(axis=1) + rng.normal(0, 0.1, len(bits))
+    features = np.packbits(bits.astype(np.uint8), axis=1)
+    calls = []
+
+    def dock(batch):
+        calls.append(len(batch))
+        return {int(i): float(true_scores[i]) for i in batch}
+
+    scores, history = active_learning_screen(
+        features, dock, initial_size=40, batch_size=40, num_rounds=4,
+        model=Ridge(),
+    )
+
+    assert calls == [40] * 5
+    assert len(scores) == 200 and history[-1]["docked"] == 200
+    names = [f"compound_{i}" for i in range(len(bits))]
+    reference = pd.DataFrame({"compound": names, "affinity": true_scores})
+    report = recall_report(
+        [{**e, "compounds": [names[i] for i in e["batch"]]} for e in history],
+        reference,
+    )
+    assert report["docked"].tolist() == [40, 80, 120, 160, 200]
+    # Docking 10% at random recovers ~10% of the top 1%
+    assert report["recall"].iloc[-1] >= 0.5
+
+
+def _fake_write_maps(calls):
+    """Returns a subprocess.run stand-in that writes map files slowly."""
+    import time
+
+    def run(command, **kwargs):
+        calls.append(command)
+        time.sleep(0.2)
+        prefix = command[command.index("--write_maps") + 1]
+        Path(f"{prefix}.C.map").write_text("SPACING 0.375\n")
+        return MagicMock(returncode=0, stdout="", stderr="")
+
+    return run
+
+
+def test_maps_cache_builds_once_under_concurrency(tmp_path, monkeypatch):
+    """Test that concurrent requests compute the maps once and share them."""
+    from concurrent.futures import ThreadPoolExecutor
+    from naturaDock.docking import maps_cache
+
+    receptor = tmp_path / "receptor.pdbqt"
+    receptor.write_text("ATOM      1  C   ALA A   1       0.000   0.000   0.000\n")
+    cache_dir = tmp_path / "cache"
+    calls = []
+    monkeypatch.setenv("VINA_EXECUTABLE", "vina")
+    monkeypatch.setattr(maps_cache.subprocess, "run", _fake_write_maps(calls))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        prefixes = list(
+            executor.map(
+                lambda _: maps_cache.get_or_create_maps(
+                    receptor, BINDING_SITE, cache_dir, poll_interval=0.01
+                ),
+                range(8),
+            )
+        )
+
+    assert len(calls) == 1
+    assert len(set(prefixes)) == 1
+    assert Path(f"{prefixes[0]}.C.map").exists()
+    assert not list(cache_dir.glob("*.lock")) and not list(cache_dir.glob(".*"))
+
+    # A different box or receptor gets its own entry
+    other_site = dict(BINDING_SITE, size_x=22.0)
+    assert maps_cache.get_or_create_maps(receptor, other_site, cache_dir) != prefixes[0]
+    receptor.write_text(receptor.read_text() + "END\n")
+    assert maps_cache.get_or_create_maps(receptor, BINDING_SITE, cache_dir) != prefixes[0]
+    assert len(calls) == 3
+
+
+def test_maps_cache_eviction(tmp_path, monkeypatch):
+    """Test eviction of entries by last use and by total size."""
+    import os
+    import time
+    from naturaDock.docking import maps_cache
+
+    receptor = tmp_path / "receptor.pdbqt"
+    receptor.write_text("ATOM\n")
+    monkeypatch.setenv("VINA_EXECUTABLE", "vina")
+    monkeypatch.setattr(maps_cache.subprocess, "run", _fake_write_maps([]))
+    prefixes = [
+        maps_cache.get_or_create_maps(
+            receptor, dict(BINDING_SITE, size_x=size), tmp_path / "cache"
+        )
+        for size in (10.0, 20.0, 30.0)
+    ]
+    now = time.time()
+    for days, prefix in zip((100, 10, 1), prefixes):
+        marker = prefix.parent / maps_cache.COMPLETE_MARKER
+        os.utime(marker, (now - days * 86400, now - days * 86400))
+
+    removed = maps_cache.evict_maps(tmp_path / "cache", max_age_days=90)
+    assert removed == [prefixes[0].parent]
+    removed = maps_cache.evict_maps(
+        tmp_path / "cache", max_size_gb=0, keep=(prefixes[2].parent.name,)
+    )
+    assert removed == [prefixes[1].parent]
+    assert [p.name for p in (tmp_path / "cache").iterdir()] == [prefixes[2].parent.name]
+
+
+def _cached_maps(protein_pdbqt, cache_dir):
+    """Looks up the maps of the test box from a worker process."""
+    from naturaDock.docking.maps_cache import get_or_create_maps
+
+    return get_or_create_maps(
+        protein_pdbqt, BINDING_SITE, cache_dir, poll_interval=0.05
+    )
+
+
+def test_maps_cache_shared_across_processes(
+    prepared_ligands, protein_pdbqt, monkeypatch, tmp_path
+):
+    """Workers starting together compute the maps once, then dock from them."""
+    import time
+    from concurrent.futures import ProcessPoolExecutor
+
+    monkeypatch.setenv("STUB_VINA_MAPS_LATENCY", "0.5")
+    cache_dir = tmp_path / "maps"
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        prefixes = set(
+            executor.map(_cached_maps, [protein_pdbqt] * 4, [cache_dir] * 4)
+        )
+    elapsed = time.perf_counter() - start
+
+    assert len(prefixes) == 1 and len(list(cache_dir.iterdir())) == 1
+    # Four independent builds would take at least 2 seconds
+    assert elapsed < 2.0
+
+    docking_dir = tmp_path / "docking"
+    docking_dir.mkdir()
+    prepared = prepared_ligands(4)
+    snapshot = run_parallel_docking(
+        protein_pdbqt, prepared, BINDING_SITE, docking_dir, 2, maps=prefixes.pop()
+    )
+    assert snapshot["completed"] == len(prepared)
+
+
+@patch('subprocess.run')
+def test_run_vina_docking_with_maps(mock_subprocess_run, monkeypatch):
+    """Test that cached maps replace the receptor and box options."""
+    monkeypatch.setenv("VINA_EXECUTABLE", "vina")
+    run_vina_docking(
+        PROTEIN_PDBQT, COMPOUND_PDBQT, BINDING_SITE, OUTPUT_PDBQT,
+        maps=Path("cache/receptor"),
+    )
+    command = mock_subprocess_run.call_args.args[0]
+    assert command[command.index("--maps") + 1] == str(Path("cache/receptor"))
+    assert "--receptor" not in command and "--center_x" not in command
+
+
+def test_work_queue_leases(tmp_path):
+    """Test claiming, expired lease reclaim and retry limits."""
+    from naturaDock.docking.work_queue import WorkQueue
+
+    queue = WorkQueue(tmp_path / "queue.sqlite", max_attempts=2)
+    ligands = [tmp_path / f"ligand_{i}.pdbqt" for i in range(5)]
+    assert queue.enqueue(ligands) == 5
+    assert queue.enqueue(ligands[:2]) == 0
+
+    # A worker that stops heartbeating loses its jobs to the next claimer
+    crashed = queue.claim("crashed", 2, lease_seconds=-1)
+    live = queue.claim("live", 10, lease_seconds=60)
+    assert [job_id for job_id, _ in crashed] == [1, 2]
+    assert [job_id for job_id, _ in live] == [1, 2, 3, 4, 5]
+    assert queue.claim("other", 10, lease_seconds=60) == []
+    assert queue.heartbeat("crashed", [1, 2], 60) == 0
+    assert queue.heartbeat("live", [1, 2], 60) == 2
+
+    # Reports from a worker that lost its lease are ignored
+    queue.complete("crashed", 1, -9.0)
+    queue.complete("live", 1, -7.5)
+    for job_id in (2, 3, 4, 5):
+        queue.fail("live", job_id, "no docking result")
+    assert queue.counts() == {"pending": 3, "leased": 0, "done": 1, "failed": 1}
+
+    # Job 2 has used both attempts; the others get a second one
+    retried = queue.claim("live", 10, lease_seconds=60)
+    assert [job_id for job_id, _ in retried] == [3, 4, 5]
+    assert retried[0][1] == ligands[2].resolve()
+
+
+def test_worker_requires_existing_queue(tmp_path):
+    """Test that workers report a missing queue instead of creating one."""
+    from naturaDock.docking.work_queue import QUEUE_FILENAME, WorkQueue, run_worker
+
+    with pytest.raises(FileNotFoundError, match="No work queue"):
+        run_worker(tmp_path)
+    with pytest.raises(FileNotFoundError):
+        WorkQueue(tmp_path / "typo" / QUEUE_FILENAME, create=False)
+    assert list(tmp_path.iterdir()) == []
+
+    WorkQueue(tmp_path / QUEUE_FILENAME).configure(engine="vina")
+    assert WorkQueue(tmp_path, create=False).config() == {"engine": "vina"}
+
+
+def test_work_queue_concurrent_claims(tmp_path):
+    """Test that concurrent claimers never receive the same job."""
+    from concurrent.futures import ThreadPoolExecutor
+    from naturaDock.docking.work_queue import WorkQueue
+
+    queue = WorkQueue(tmp_path / "queue.sqlite")
+    queue.enqueue([tmp_path / f"ligand_{i}.pdbqt" for i in range(60)])
+
+    def drain(worker_id):
+        claimed = []
+        while jobs := queue.claim(worker_id, 3, lease_seconds=60):
+            claimed += [job_id for job_id, _ in jobs]
+        return claimed
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        claimed = [
+            job_id
+            for jobs in executor.map(drain, [f"worker-{i}" for i in range(8)])
+            for job_id in jobs
+        ]
+    assert sorted(claimed) == list(range(1, 61))
+    assert queue.counts()["leased"] == 60
+
+
+def _drain_queue(queue_path, worker_id):
+    """Runs a queue worker in a separate process until the queue is drained."""
+    from naturaDock.docking.work_queue import run_worker
+
+    return run_worker(
+        queue_path, worker_id, num_workers=1, batch_size=2, poll_interval=0.05
+    )
+
+
+def test_workers_drain_shared_queue(prepared_ligands, protein_pdbqt, tmp_path):
+    """Worker processes share a queue and pick up a crashed worker's jobs."""
+    from concurrent.futures import ProcessPoolExecutor
+    from naturaDock.analysis.results import aggregate_results
+    from naturaDock.docking.work_queue import WorkQueue
+
+    docking_dir = tmp_path / "docking"
+    docking_dir.mkdir()
+    prepared = prepared_ligands(8)
+
+    queue = WorkQueue(tmp_path / "queue.sqlite")
+    queue.configure(
+        protein_pdbqt=str(protein_pdbqt),
+        binding_site=BINDING_SITE,
+        docking_results_dir=str(docking_dir),
+        docking_options={"snapshot_interval": 0},
+    )
+    queue.enqueue(prepared)
+    # A worker that claimed a batch and died before docking it
+    queue.claim("crashed", 3, lease_seconds=-1)
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        counts = list(
+            executor.map(_drain_queue, [queue.path] * 2, ["worker-a", "worker-b"])
+        )
+
+    assert counts[-1]["done"] == len(prepared)
+    assert len(aggregate_results(docking_dir)) == len(prepared)
+
+
+def _fake_sysfs(root, nodes, siblings):
+    """Writes a sysfs tree with the given node CPU lists and SMT siblings."""
+    for node, cpulist in enumerate(nodes):
+        (root / "node" / f"node{node}").mkdir(parents=True)
+        (root / "node" / f"node{node}" / "cpulist").write_text(f"{cpulist}\n")
+    for cpu, sibling_list in siblings.items():
+        topology = root / "cpu" / f"cpu{cpu}" / "topology"
+        topology.mkdir(parents=True)
+        (topology / "thread_siblings_list").write_text(f"{sibling_list}\n")
+    return root
+
+
+def test_worker_placement(tmp_path):
+    """Test NUMA-aware placement on a dual-socket topology with SMT."""
+    from naturaDock.docking.placement import (
+        CpuTopology,
+        parse_cpu_list,
+        plan_placement,
+    )
+
+    assert parse_cpu_list("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+    # Two sockets with four cores each; CPU k and k + 8 share a core
+    siblings = {cpu: f"{cpu % 8},{cpu % 8 + 8}" for cpu in range(16)}
+    sysfs = _fake_sysfs(tmp_path, ["0-3,8-11", "4-7,12-15"], siblings)
+    topology = CpuTopology.detect(sysfs, cpus=list(range(16)))
+    assert topology.nodes[0] == ((0, 8), (1, 9), (2, 10), (3, 11))
+
+    # Workers alternate between nodes and use whole cores before siblings
+    assert plan_placement(topology, 4) == [(0,), (4,), (1,), (5,)]
+    assert plan_placement(topology, 8, cpus_per_worker=2) == [
+        (0, 1), (4, 5), (2, 3), (6, 7), (8, 9), (12, 13), (10, 11), (14, 15)
+    ]
+    # Without SMT siblings only four two-CPU workers fit
+    assert plan_placement(topology, 8, cpus_per_worker=2, avoid_smt=True) == [
+        (0, 1), (4, 5), (2, 3), (6, 7)
+    ]
+    # A worker never spans nodes
+    assert plan_placement(topology, 2, cpus_per_worker=6, avoid_smt=True) == []
+
+    # First threads and siblings are never mixed within a worker
+    odd = CpuTopology((((0, 3), (1, 4), (2, 5)),))
+    assert plan_placement(odd, 3, cpus_per_worker=2) == [(0, 1), (3, 4)]
+
+    # Only CPUs in the process's affinity mask are used
+    restricted = CpuTopology.detect(sysfs, cpus=[2, 3, 10])
+    assert restricted.nodes == (((2, 10), (3,)),)
+
+
+def test_pinned_workers_run_on_their_cpus(prepared_ligands, protein_pdbqt, tmp_path):
+    """A pinned worker's engine processes inherit its CPU set."""
+    from naturaDock.docking.placement import CpuTopology, plan_placement
+
+    docking_dir = tmp_path / "docking"
+    docking_dir.mkdir()
+    prepared = prepared_ligands(2)
+
+    snapshot = run_parallel_docking(
+        protein_pdbqt, prepared, BINDING_SITE, docking_dir, 1, pin_workers=True
+    )
+
+    assert snapshot["completed"] == len(prepared)
+    (cpus,) = plan_placement(CpuTopology.detect(), 1)
+    for output in docking_dir.glob("*_docked.pdbqt"):
+        assert f"REMARK STUB CPUS {','.join(map(str, cpus))}" in output.read_text()
+
+
+def test_result_cache_eviction(tmp_path):
+    """Test that least recently used results are evicted first."""
+    import os
+    import time
+    from naturaDock.docking.result_cache import evict_results
+
+    now = time.time()
+    entries = []
+    for age in (3, 1, 2):
+        entry = tmp_path / "ab" / f"ab{age}.pdbqt"
+        entry.parent.mkdir(exist_ok=True)
+        entry.write_bytes(b"x" * 1024)
+        os.utime(entry, (now - age * 86400, now - age * 86400))
+        entries.append(entry)
+
+    assert evict_results(tmp_path, max_size_gb=1) == 0
+    assert evict_results(tmp_path, max_size_gb=1.5 * 1024 / 1024**3) == 2
+    assert [entry.exists() for entry in entries] == [False, True, False]
+
+
+def test_result_cache_for_site(stub_tools, tmp_path):
+    """Test that per-box caches share the receptor digest but not their keys."""
+    from naturaDock.docking import result_cache
+    from naturaDock.docking.result_cache import ResultCache
+
+    protein_pdbqt = tmp_path / "protein.pdbqt"
+    protein_pdbqt.write_text("receptor\n")
+    ligand_pdbqt = tmp_path / "ligand.pdbqt"
+    ligand_pdbqt.write_text("ligand\n")
+    other_site = {**BINDING_SITE, "center_x": 35.0}
+
+    cache = ResultCache(tmp_path / "cache", protein_pdbqt, BINDING_SITE)
+    with patch.object(result_cache, "_file_digest") as digest:
+        site_cache = cache.for_site(other_site)
+        digest.assert_not_called()
+
+    fresh = ResultCache(tmp_path / "cache", protein_pdbqt, other_site)
+    assert site_cache.key(ligand_pdbqt) == fresh.key(ligand_pdbqt)
+    assert site_cache.key(ligand_pdbqt) != cache.key(ligand_pdbqt)
+
+
+def test_result_cache_skips_docked_ligands(prepared_ligands, protein_pdbqt, tmp_path):
+    """A second run with the same inputs and settings is served from the cache."""
+    from naturaDock.analysis.results import aggregate_results
+
+    prepared = prepared_ligands(4)
+    cache_dir = tmp_path / "results_cache"
+
+    def dock(name, **options):
+        docking_dir = tmp_path / name
+        docking_dir.mkdir()
+        snapshot = run_parallel_docking(
+            protein_pdbqt,
+            prepared,
+            BINDING_SITE,
+            docking_dir,
+            2,
+            seed=1,
+            result_cache=cache_dir,
+            **options,
+        )
+        return snapshot, aggregate_results(docking_dir).sort_values("compound")
+
+    first, first_results = dock("first")
+    second, second_results = dock("second")
+    assert first["cached"] == 0 and second["cached"] == len(prepared)
+    assert second["completed"] == len(prepared)
+    # The library repeats molecules, and identical ligands share an entry
+    assert set(second_results["affinity"]) <= set(first_results["affinity"])
+
+    # Any setting that changes the poses misses the cache
+    third, _ = dock("third", exhaustiveness=16)
+    assert third["cached"] == 0
+    protein_pdbqt.write_text("ATOM\nEND\n")
+    fourth, _ = dock("fourth")
+    assert fourth["cached"] == 0
+
+
+def write_ball_receptor(path, radius=12.0, spacing=1.5):
+    """Writes a PDBQT receptor of carbon atoms filling a ball at the origin."""
+    import numpy as np
+
+    axis = np.arange(-radius, radius + spacing, spacing)
+    grid = np.stack(np.meshgrid(axis, axis, axis), axis=-1).reshape(-1, 3)
+    atoms = grid[np.linalg.norm(grid, axis=1) <= radius]
+    path.write_text(
+        "".join(
+            f"ATOM  {i + 1:5d}  C   ALA A   1    {x:8.3f}{y:8.3f}{z:8.3f}"
+            f"  1.00  0.00     0.000 C \n"
+            for i, (x, y, z) in enumerate(atoms)
+        )
+    )
+
+
+def test_blind_docking_tiles_surface(tmp_path):
+    """Test that sub-boxes cover the binding shell and skip the protein core."""
+    import numpy as np
+    from naturaDock.docking.blind import (
+        receptor_coordinates,
+        surface_points,
+        tile_binding_sites,
+    )
+
+    receptor = tmp_path / "ball.pdbqt"
+    write_ball_receptor(receptor)
+    sites = tile_binding_sites(receptor, box_size=8.0, overlap=0.25)
+
+    centers = np.array([[s[f"center_{axis}"] for axis in "xyz"] for s in sites])
+    assert len(sites) > 8
+    # A box deep inside the ball holds no shell point
+    assert np.linalg.norm(centers, axis=1).min() > 4.0
+    shell = surface_points(receptor_coordinates(receptor))
+    covered = np.zeros(len(shell), dtype=bool)
+    for center in centers:
+        covered |= np.all(np.abs(shell - center) <= 4.0, axis=1)
+    assert covered.all()
+
+
+def test_blind_docking_merges_duplicate_poses():
+    """Test that poses found in several sub-boxes are kept once, best first."""
+    import numpy as np
+    from naturaDock.docking.blind import merge_poses
+
+    pose = np.zeros((5, 3))
+    shifted = pose + [0.5, 0.0, 0.0]
+    elsewhere = pose + [10.0, 0.0, 0.0]
+    site_poses = [
+        [{"score": -7.0, "coordinates": pose, "lines": []}],
+        [
+            {"score": -7.5, "coordinates": shifted, "lines": []},
+            {"score": -6.0, "coordinates": elsewhere, "lines": []},
+        ],
+    ]
+
+    merged = merge_poses(site_poses, rmsd_threshold=2.0)
+
+    assert [(p["score"], p["site"]) for p in merged] == [(-7.5, 1), (-6.0, 1)]
+
+
+def test_blind_docking_spreads_sub_boxes(prepared_ligands, protein_pdbqt, tmp_path):
+    """Blind docking runs one job per ligand and sub-box and merges the poses."""
+    from naturaDock.analysis.results import aggregate_results
+    from naturaDock.docking.blind import run_blind_docking, tile_binding_sites
+
+    prepared = prepared_ligands(3)
+    write_ball_receptor(protein_pdbqt, radius=6.0)
+    docking_dir = tmp_path / "docking_results"
+    docking_dir.mkdir()
+
+    summaries = run_blind_docking(
+        protein_pdbqt, prepared, docking_dir, box_size=10.0, num_workers=2
+    )
+
+    sites = len(tile_binding_sites(protein_pdbqt, box_size=10.0))
+    assert sites > 1
+    assert read_snapshot(docking_dir)["completed"] == sites * len(prepared)
+    # The stub returns the input pose from every box, merged into one pose
+    assert [summary["distinct_poses"] for summary in summaries] == [1] * len(prepared)
+    results = aggregate_results(docking_dir)
+    assert len(results) == len(prepared)
+    assert (tmp_path / "blind_sites.csv").exists()
+
+
+@pytest.mark.parametrize("name", sorted(ENGINES))
+def test_engine_conformance(
+    name, stub_engine, prepared_ligands, protein_pdbqt, tmp_path
+):
+    """Every engine finds its executable, builds a valid command and parses scores."""
+    engine = get_engine(name)
+    executable = stub_engine(engine)
+    assert engine.find_executable() == str(executable)
+
+    ligands = prepared_ligands(3)
+    docking_dir = tmp_path / "docking"
+    docking_dir.mkdir()
+
+    snapshot = run_parallel_docking(
+        protein_pdbqt,
+        ligands,
+        BINDING_SITE,
+        docking_dir,
+        num_workers=2,
+        engine=name,
+        exhaustiveness=4,
+        seed=7,
+    )
+
+    assert snapshot["completed"] == len(ligands)
+    for ligand in ligands:
+        output = docking_dir / f"{ligand.stem}_docked.pdbqt"
+        score = engine.parse_score(output)
+        assert -12.0 <= score < -4.0
+        assert parse_vina_result(output) == score
+
+
+@pytest.mark.parametrize("name", sorted(ENGINES))
+def test_engine_capabilities(
+    name, stub_engine, prepared_ligands, protein_pdbqt, tmp_path
+):
+    """Options an engine lacks are refused before the executable is run."""
+    engine = get_engine(name)
+    stub_engine(engine)
+    (ligand,) = prepared_ligands(1)
+    output = tmp_path / "out.pdbqt"
+
+    if engine.supports_maps:
+        run_vina_docking(
+            protein_pdbqt, ligand, BINDING_SITE, output,
+            maps=tmp_path / "maps" / "receptor", engine=name,
+        )
+        assert engine.parse_score(output) is not None
+    else:
+        with pytest.raises(ValueError):
+            run_vina_docking(
+                protein_pdbqt, ligand, BINDING_SITE, output,
+                maps=tmp_path / "receptor", engine=name,
+            )
+
+    if not engine.supports_scoring:
+        with pytest.raises(ValueError):
+            engine.build_command(
+                "engine", "r.pdbqt", "l.pdbqt", BINDING_SITE, "o.pdbqt",
+                scoring="vinardo",
+            )
+
+
+def test_unknown_engine():
+    """Test that unknown engine names list the registered engines."""
+    with pytest.raises(ValueError, match="Available engines"):
+        get_engine("autodock-gpu")
+
+
+def test_score_remarks_follow_registry(monkeypatch):
+    """Test that results parsing recognises the remark of any registered engine."""
+    engine = DockingEngine(
+        name="custom",
+        executables=("custom",),
+        env_var="CUSTOM_EXECUTABLE",
+        score_remark="REMARK CUSTOM SCORE",
+    )
+    assert parse_score_remark("REMARK CUSTOM SCORE -7.25 0.0 0.0") is None
+    monkeypatch.setitem(ENGINES, engine.name, engine)
+    assert parse_score_remark("REMARK CUSTOM SCORE -7.25 0.0 0.0") == -7.25
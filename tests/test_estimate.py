@@ -0,0 +1,119 @@
+import math
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from naturaDock.estimate import (
+    CostModel,
+    calibrate,
+    format_estimate,
+    plan_for_budget,
+    project_wall_time,
+    scale_box,
+)
+from naturaDock.preprocessing.compounds import load_compounds
+
+BINDING_SITE = {
+    "center_x": 0.0,
+    "center_y": 0.0,
+    "center_z": 0.0,
+    "size_x": 20.0,
+    "size_y": 20.0,
+    "size_z": 20.0,
+}
+
+
+def _synthetic_measurements(n=40, seed=0):
+    """Measurements following log t = -3 + 0.1 rot + 0.05 heavy + 0.5 log V."""
+    rng = np.random.default_rng(seed)
+    measurements = []
+    for i in range(n):
+        rot, heavy = int(rng.integers(0, 10)), int(rng.integers(10, 40))
+        volume = 8000.0 * (1.0, 0.343)[i % 2]
+        seconds = math.exp(-3 + 0.1 * rot + 0.05 * heavy + 0.5 * math.log(volume))
+        measurements.append(
+            {
+                "rotatable_bonds": rot,
+                "heavy_atoms": heavy,
+                "box_volume": volume,
+                "exhaustiveness": 8,
+                "prepare_seconds": 0.5,
+                "dock_seconds": seconds,
+                "docked": True,
+            }
+        )
+    return measurements
+
+
+def test_cost_model_recovers_coefficients():
+    """The fitted model reproduces the generating cost function."""
+    model = CostModel.fit(_synthetic_measurements())
+    assert model.coefficients == pytest.approx([-3, 0.1, 0.05, 0.5], abs=1e-6)
+
+    features = np.array([[5, 20]])
+    base = model.dock_seconds(features, BINDING_SITE, 8)[0]
+    assert model.dock_seconds(features, BINDING_SITE, 16)[0] == pytest.approx(2 * base)
+    smaller = model.dock_seconds(features, scale_box(BINDING_SITE, 0.5), 8)[0]
+    assert smaller == pytest.approx(base * 0.125**0.5)
+
+
+def test_projection_and_budget_plan():
+    """Wall time divides docking by workers; the plan fits the budget."""
+    model = CostModel.fit(_synthetic_measurements())
+    features = np.tile([[5, 20]], (1000, 1))
+    projection = project_wall_time(model, features, BINDING_SITE, 8, num_workers=4)
+    assert projection["prepare_seconds"] == pytest.approx(500)
+    assert projection["wall_seconds"] == pytest.approx(
+        500 + projection["dock_cpu_seconds"] / 4
+    )
+
+    generous = plan_for_budget(model, features, BINDING_SITE, 4, 1e9)
+    assert generous["fits"] and generous["exhaustiveness"] == 8
+    assert generous["box_scale"] == 1.0
+
+    # Enough for exhaustiveness 4 at full size, but not 8
+    budget = project_wall_time(model, features, BINDING_SITE, 6, 4)["wall_seconds"]
+    tight = plan_for_budget(model, features, BINDING_SITE, 4, budget)
+    assert tight["fits"] and tight["exhaustiveness"] == 4 and tight["box_scale"] == 1.0
+
+    impossible = plan_for_budget(model, features, BINDING_SITE, 4, 1.0)
+    assert not impossible["fits"]
+    assert impossible["exhaustiveness"] == 1 and impossible["box_scale"] == 0.7
+    assert "does NOT fit" in format_estimate(projection, model, 4, impossible)
+
+
+def test_calibration_with_stub_tools(stub_tools, synthetic_library, tmp_path):
+    """Calibration times the real stages and yields a usable model."""
+    molecules = list(load_compounds(synthetic_library(6)))
+    protein_pdbqt = tmp_path / "protein.pdbqt"
+    protein_pdbqt.write_text("")
+
+    measurements = calibrate(
+        molecules, protein_pdbqt, BINDING_SITE, tmp_path / "calibration",
+        sample_size=4,
+    )
+
+    assert len(measurements) == 4
+    assert all(m["docked"] and m["dock_seconds"] > 0 for m in measurements)
+    assert sorted({m["box_volume"] for m in measurements}) == pytest.approx(
+        [14.0**3, 20.0**3]
+    )
+    model = CostModel.fit(measurements)
+    assert model.samples == 4
+    assert model.dock_seconds([[3, 20]], BINDING_SITE, 8)[0] > 0
+
+
+def test_calibration_docks_with_cpus_per_worker(
+    stub_tools, synthetic_library, tmp_path
+):
+    """Calibration docks with the CPUs each worker of the real run gets."""
+    molecules = list(load_compounds(synthetic_library(2)))
+    with patch("naturaDock.docking.vina_dock.run_vina_docking") as run_vina_docking:
+        calibrate(
+            molecules, tmp_path / "protein.pdbqt", BINDING_SITE,
+            tmp_path / "calibration", sample_size=2, cpus_per_worker=4,
+        )
+
+    assert run_vina_docking.call_count == 2
+    assert all(call.kwargs["cpu"] == 4 for call in run_vina_docking.call_args_list)
@@ -1,13 +1,31 @@
+import gzip
+import multiprocessing
+import time
 import pytest
 from pathlib import Path
+from unittest.mock import patch, MagicMock
 from rdkit import Chem
+from rdkit.Chem import AllChem
 from Bio.PDB.Structure import Structure
 
 from naturaDock.preprocessing.protein import load_protein, validate_protein
+from naturaDock.preprocessing import compounds
 from naturaDock.preprocessing.compounds import (
     load_compounds,
     generate_conformers,
     filter_compounds,
+    prepare_compounds,
+)
+from naturaDock.preprocessing.packed import PackedLibrary, pack_library
+from naturaDock.preprocessing.clustering import (
+    cluster_molecules,
+    compute_fingerprints,
+    sphere_exclusion_clusters,
+)
+from naturaDock.preprocessing.similarity import (
+    FingerprintIndex,
+    build_fingerprint_index,
+    expand_hits,
 )
 
 # Define test data paths
@@ -68,6 +86,54 @@ def test_load_compounds_unsupported_format():
     unsupported_file.unlink()  # Clean up the dummy file
 
 
+@pytest.fixture
+def split_library(tmp_path):
+    """A library split into a gzipped SMILES chunk and an SDF chunk."""
+    with gzip.open(tmp_path / "chunk_0.smi.gz", "wt") as f:
+        f.write("CCO ethanol\nnot_a_smiles broken\nc1ccccc1O phenol\n")
+    (tmp_path / "chunk_1.sdf").write_text(VALID_SDF.read_text())
+    (tmp_path / "README.txt").write_text("Not part of the library")
+    return tmp_path
+
+
+def test_load_compounds_directory_and_glob(split_library):
+    """Test that split, compressed libraries stream with their origin tagged."""
+    molecules = list(load_compounds(split_library))
+
+    assert [mol.GetProp("naturaDock_source") for mol in molecules] == [
+        str(split_library / "chunk_0.smi.gz"),
+        str(split_library / "chunk_0.smi.gz"),
+        str(split_library / "chunk_1.sdf"),
+    ]
+    # Unparsable records are skipped but keep their place in the numbering
+    assert [mol.GetIntProp("naturaDock_record") for mol in molecules] == [0, 2, 0]
+    assert molecules[1].GetProp("_Name") == "phenol"
+    assert len(list(load_compounds(str(split_library / "*.smi.gz")))) == 2
+
+
+def test_load_compounds_parallel_keeps_file_order(split_library):
+    """Test that parsing files in child processes yields the serial order."""
+    files = [split_library / "chunk_1.sdf", split_library / "chunk_0.smi.gz"]
+    serial = [Chem.MolToSmiles(mol) for mol in load_compounds(files)]
+    parallel = list(load_compounds(files, num_workers=2, batch_size=1))
+
+    assert [Chem.MolToSmiles(mol) for mol in parallel] == serial
+    assert parallel[-1].GetProp("_Name") == "phenol"
+    # Ligands are loaded while the receptor is prepared on another thread
+    assert compounds._process_context().get_start_method() != "fork"
+
+
+def test_load_compounds_zstd(tmp_path):
+    """Test that zstd-compressed SDF is streamed without a temporary file."""
+    zstandard = pytest.importorskip("zstandard")
+    library = tmp_path / "library.sdf.zst"
+    library.write_bytes(zstandard.ZstdCompressor().compress(VALID_SDF.read_bytes()))
+
+    molecules = list(load_compounds(library))
+    assert len(molecules) == 1
+    assert molecules[0].GetNumAtoms() == 6
+
+
 # --- Compound Processing Tests ---
 
 
@@ -79,6 +145,103 @@ def test_generate_conformers_success():
     assert processed_mols[0].GetNumConformers() > 0
 
 
+def test_generate_conformers_ensemble():
+    """Test that an ensemble of distinct conformers is generated and pruned."""
+    mol = Chem.MolFromSmiles("OC1CCC(CCCCN)CC1")  # Flexible ring compound
+    processed_mols = list(
+        generate_conformers([mol], num_conformers=10, num_threads=2)
+    )
+    assert len(processed_mols) == 1
+    ensemble = processed_mols[0]
+    assert 1 < ensemble.GetNumConformers() <= 10
+
+    heavy = Chem.RemoveHs(ensemble)
+    conf_ids = [conf.GetId() for conf in heavy.GetConformers()]
+    for i, first in enumerate(conf_ids):
+        for second in conf_ids[i + 1:]:
+            assert AllChem.GetConformerRMS(heavy, first, second) > 0.5
+
+
+@patch("naturaDock.preprocessing.compounds.get_meeko_path")
+@patch("subprocess.run")
+def test_prepare_compounds_conformer_ensemble(
+    mock_subprocess_run, mock_meeko_path, tmp_path
+):
+    """Test that each conformer of an ensemble is prepared as its own file."""
+    mock_subprocess_run.return_value = MagicMock(returncode=0)
+    mol = Chem.MolFromSmiles("CCCCO")
+    mol.SetProp("_Name", "butanol")
+    ensemble = next(generate_conformers([mol], num_conformers=5))
+
+    prepared = prepare_compounds([ensemble], tmp_path)
+
+    assert len(prepared) == ensemble.GetNumConformers()
+    assert prepared[0].name == "butanol_conf0.pdbqt"
+    assert mock_subprocess_run.call_count == ensemble.GetNumConformers()
+
+
+def test_generate_conformers_timeout_quarantines():
+    """Test that molecules over the embedding budget are killed and quarantined."""
+    macrocycle = Chem.MolFromSmiles("C1CCCCCCCCCCCCCCCCCCCCCCCCCCCCCC1")
+    macrocycle.SetProp("_Name", "macrocycle")
+    quarantine = []
+
+    processed_mols = list(
+        generate_conformers([macrocycle], embed_timeout=0.01, quarantine=quarantine)
+    )
+
+    assert processed_mols == []
+    assert quarantine == [
+        {
+            "name": "macrocycle",
+            "smiles": Chem.MolToSmiles(macrocycle),
+            "reason": "timeout",
+            "fallback": "none",
+        }
+    ]
+
+
+_embed_molecule = compounds._embed_molecule
+
+
+def _slow_embed_molecule(mol, use_random_coords=False, **options):
+    """Stalls on the molecule named "slow" unless random coordinates are used."""
+    if mol.GetProp("_Name") == "slow" and not use_random_coords:
+        time.sleep(60)
+    return _embed_molecule(mol, use_random_coords=use_random_coords, **options)
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(),
+    reason="patching the embedding worker requires fork",
+)
+def test_generate_conformers_random_coords_fallback(monkeypatch):
+    """Test that a stalled molecule falls back to random-coordinate embedding."""
+    monkeypatch.setattr(compounds, "_embed_molecule", _slow_embed_molecule)
+    monkeypatch.setattr(
+        compounds, "_process_context", lambda: multiprocessing.get_context("fork")
+    )
+    molecules = []
+    for name in ["fast", "slow", "after"]:
+        mol = Chem.MolFromSmiles("CCO")
+        mol.SetProp("_Name", name)
+        molecules.append(mol)
+    quarantine = []
+
+    start = time.perf_counter()
+    processed_mols = list(
+        generate_conformers(molecules, embed_timeout=2, quarantine=quarantine)
+    )
+
+    assert time.perf_counter() - start < 30
+    assert [mol.GetProp("_Name") for mol in processed_mols] == [
+        "fast", "slow", "after"
+    ]
+    assert processed_mols[1].GetProp("naturaDock_embedding") == "random_coords"
+    assert [entry["name"] for entry in quarantine] == ["slow"]
+    assert quarantine[0]["fallback"] == "random_coords"
+
+
 def test_filter_compounds_logic():
     """Test that the molecular weight filter works correctly."""
     # Methane (~16) and Iodine (~127)
@@ -92,3 +255,166 @@ def test_filter_compounds_logic():
     # Check that the remaining molecule is methane
     assert filtered_list[0].GetNumAtoms() == 1
     assert filtered_list[0].GetAtomWithIdx(0).GetSymbol() == "C"
+
+
+# --- Packed Library Tests ---
+
+
+def test_packed_library_round_trip(tmp_path):
+    """Test that packed records, coordinates and filters match the input."""
+    library = tmp_path / "library.smi"
+    library.write_text("CCO ethanol\nIc1ccccc1 iodobenzene\nCCCCO butanol\n")
+    packed_path = tmp_path / "library.ndpack"
+
+    count = pack_library(
+        library, packed_path, {"num_conformers": 3, "num_threads": 1}, num_workers=1
+    )
+    packed = PackedLibrary(packed_path)
+
+    assert count == len(packed) == 3
+    assert packed.table()["name"].tolist() == ["ethanol", "iodobenzene", "butanol"]
+    assert packed.smiles(1) == "Ic1ccccc1"
+    assert packed.select(max_mol_weight=100.0).tolist() == [0, 2]
+
+    butanol = packed.molecule(2)
+    assert butanol.GetProp("_Name") == "butanol"
+    assert butanol.GetNumConformers() == len(packed.pdbqt(2))
+    # Coordinates map onto the rebuilt atoms in order
+    bonded = butanol.GetBondWithIdx(0)
+    length = Chem.rdMolTransforms.GetBondLength(
+        butanol.GetConformer(), bonded.GetBeginAtomIdx(), bonded.GetEndAtomIdx()
+    )
+    assert 0.9 < length < 1.6
+
+    prepared_dir = tmp_path / "prepared"
+    prepared_dir.mkdir()
+    prepared = packed.write_prepared(prepared_dir, [0])
+    assert [path.name for path in prepared] == ["ethanol.pdbqt"]
+    assert "ROOT" in prepared[0].read_text()
+
+    # Files are written only as docking takes them
+    lazy_dir = tmp_path / "lazy"
+    lazy_dir.mkdir()
+    lazy = packed.prepared(lazy_dir, [2, 0])
+    assert len(lazy) == butanol.GetNumConformers() + 1
+    assert list(lazy_dir.iterdir()) == []
+    assert lazy[-1] == lazy_dir / "ethanol.pdbqt"
+    assert [path.name for path in lazy_dir.iterdir()] == ["ethanol.pdbqt"]
+    assert lazy[0].read_bytes() == bytes(packed.pdbqt(2)[0])
+
+
+def test_packed_library_rejects_other_files(tmp_path):
+    """Test that a file without the packed header is refused."""
+    path = tmp_path / "library.ndpack"
+    path.write_bytes(b"not a packed library")
+    with pytest.raises(ValueError):
+        PackedLibrary(path)
+
+
+# --- Clustering Tests ---
+
+
+ANALOG_FAMILIES = [
+    ["c1ccc(cc1)C(=O)O", "c1ccc(cc1)C(=O)OC", "c1ccc(cc1)C(=O)OCC"],
+    ["CCCCCCCCCCO", "CCCCCCCCCCCO", "CCCCCCCCCCCCO"],
+]
+
+
+def test_cluster_molecules_groups_analogs():
+    """Test that close analogs share a cluster led by the first family member."""
+    molecules = [Chem.MolFromSmiles(s) for family in ANALOG_FAMILIES for s in family]
+    labels, representatives = cluster_molecules(molecules, similarity_threshold=0.4)
+    assert labels.tolist() == [0, 0, 0, 1, 1, 1]
+    assert representatives == [0, 3]
+
+
+def test_sphere_exclusion_threshold():
+    """Test that a threshold of 1.0 only merges identical fingerprints."""
+    molecules = [Chem.MolFromSmiles(s) for s in ["CCO", "CCO", "CCN"]]
+    labels, representatives = cluster_molecules(molecules, similarity_threshold=1.0)
+    assert labels.tolist() == [0, 0, 1]
+    assert representatives == [0, 2]
+    labels, representatives = sphere_exclusion_clusters([])
+    assert labels.size == 0 and representatives == []
+
+
+@pytest.mark.parametrize("threshold", [0.3, 0.6, 0.8])
+@pytest.mark.parametrize("block_size", [1, 4, 1024])
+def test_sphere_exclusion_matches_leader_pass(threshold, block_size):
+    """Test that blocked, pruned clustering equals a plain leader pass."""
+    from rdkit import DataStructs
+
+    smiles = [s for family in ANALOG_FAMILIES for s in family]
+    smiles += ["CCO", "c1ccncc1", "c1ccc(cc1)C(=O)N", "CCCCCCCCCCN", "CCO", "C"]
+    fps = list(compute_fingerprints(Chem.MolFromSmiles(s) for s in smiles))
+
+    expected, centroids = [], []
+    for i, fp in enumerate(fps):
+        similarities = DataStructs.BulkTanimotoSimilarity(
+            fp, [fps[c] for c in centroids]
+        )
+        if similarities and max(similarities) >= threshold:
+            expected.append(similarities.index(max(similarities)))
+        else:
+            expected.append(len(centroids))
+            centroids.append(i)
+    labels, representatives = sphere_exclusion_clusters(fps, threshold, block_size)
+    assert labels.tolist() == expected
+    assert representatives == centroids
+
+
+# --- Similarity Index Tests ---
+
+
+def test_fingerprint_index_matches_brute_force(tmp_path):
+    """Test that pruned index searches return the exact Tanimoto neighbours."""
+    from rdkit import DataStructs
+    from rdkit.Chem import rdFingerprintGenerator
+
+    smiles = [s for family in ANALOG_FAMILIES for s in family] + ["CCN", "c1ccncc1"]
+    library = tmp_path / "library.smi"
+    library.write_text("".join(f"{s} mol{i}\n" for i, s in enumerate(smiles)))
+    build_fingerprint_index(library, tmp_path / "index", fp_size=1024)
+    index = FingerprintIndex(tmp_path / "index")
+
+    generator = rdFingerprintGenerator.GetMorganGenerator(radius=2, fpSize=1024)
+    fingerprints = [generator.GetFingerprint(Chem.MolFromSmiles(s)) for s in smiles]
+    for query in range(len(smiles)):
+        expected = DataStructs.BulkTanimotoSimilarity(fingerprints[query], fingerprints)
+        ranked = sorted(range(len(smiles)), key=lambda i: (-expected[i], i))
+        top = index.search(index.fingerprints([query]), top_n=3)[0]
+        assert [record for record, _ in top] == ranked[:3]
+        above = index.search(index.fingerprints([query]), top_n=None, threshold=0.3)
+        assert [record for record, _ in above[0]] == [
+            i for i in ranked if expected[i] >= 0.3
+        ]
+        assert [s for _, s in above[0]] == pytest.approx(
+            [expected[i] for i in ranked if expected[i] >= 0.3]
+        )
+
+    found = index.find(["mol0", "unknown"])
+    assert found == {"mol0": 0}
+    analogs = expand_hits(index, index.fingerprints([0]), top_n=2, exclude=[0])
+    assert [record for record, _ in analogs] == [1, 2]
+    output = index.write_compounds([record for record, _ in analogs], tmp_path / "a.smi")
+    assert output.read_text().split() == [
+        Chem.CanonSmiles(smiles[1]), "mol1", Chem.CanonSmiles(smiles[2]), "mol2"
+    ]
+
+
+def test_write_compounds_keeps_spaced_names(tmp_path):
+    """Test that analogs with multi-word titles reload under their full names."""
+    names = ["Quercetin 3-O-glucoside", "Quercetin 7-O-rutinoside"]
+    library = tmp_path / "library.sdf"
+    with Chem.SDWriter(str(library)) as writer:
+        for name, smiles in zip(names, ["c1ccccc1O", "c1ccccc1N"]):
+            mol = Chem.MolFromSmiles(smiles)
+            mol.SetProp("_Name", name)
+            writer.write(mol)
+    build_fingerprint_index(library, tmp_path / "index")
+    index = FingerprintIndex(tmp_path / "index")
+
+    output = index.write_compounds(index.find(names).values(), tmp_path / "a.smi")
+
+    reloaded = [mol.GetProp("_Name") for mol in load_compounds(output)]
+    assert sorted(reloaded) == names
@@ -0,0 +1,94 @@
+import sys
+from pathlib import Path
+
+from naturaDock import session
+from naturaDock.preprocessing import compounds
+from naturaDock.session import Screening
+
+PROTEIN_PDB = Path(__file__).parent / "data" / "test_protein.pdb"
+
+BINDING_SITE = {
+    "center_x": 0.0,
+    "center_y": 0.0,
+    "center_z": 0.0,
+    "size_x": 20.0,
+    "size_y": 20.0,
+    "size_z": 20.0,
+}
+
+
+def test_session_docks_with_warm_workers(stub_tools, monkeypatch):
+    """A session prepares the receptor once and reuses prepared ligands."""
+    with Screening(PROTEIN_PDB, num_workers=2) as screening:
+        scratch = Path(screening._scratch.name)
+        results = screening.dock(["CCO", "c1ccccc1O", "not a smiles"])
+
+        assert [r["name"] for r in results] == ["CCO", "Oc1ccccc1", "not a smiles"]
+        assert all(isinstance(r["affinity"], float) for r in results[:2])
+        assert results[0]["pdbqt"].startswith("MODEL 1")
+        assert results[2]["affinity"] is None
+        assert results[2]["error"] == "preparation failed"
+        # Only the prepared receptor is left in the scratch directory
+        assert [p.name for p in scratch.iterdir()] == ["test_protein.pdbqt"]
+
+        # A known ligand is not embedded or prepared again
+        monkeypatch.setattr(compounds, "prepare_ligand_strings", None)
+        again = screening.dock_one("OCC", name="ethanol")
+        assert again["name"] == "ethanol" and again["smiles"] == "CCO"
+        assert isinstance(again["affinity"], float)
+    assert not scratch.exists()
+
+
+class FakeVina:
+    """Records calls made through the Vina Python bindings."""
+
+    instances = []
+
+    def __init__(self, **options):
+        self.options = options
+        self.calls = []
+        FakeVina.instances.append(self)
+
+    def set_receptor(self, path):
+        self.calls.append("set_receptor")
+
+    def compute_vina_maps(self, center, box_size):
+        self.calls.append("compute_vina_maps")
+
+    def set_ligand_from_string(self, pdbqt):
+        self.calls.append("set_ligand_from_string")
+        self.ligand = pdbqt
+
+    def dock(self, exhaustiveness, n_poses):
+        self.calls.append("dock")
+
+    def energies(self, n_poses):
+        return [[-6.5, 0.0, 0.0]]
+
+    def poses(self, n_poses):
+        return "MODEL 1\n" + self.ligand + "ENDMDL\n"
+
+
+def test_session_docks_in_memory_with_vina_bindings(
+    stub_tools, monkeypatch, tmp_path
+):
+    """With the Vina bindings, maps are computed once and no files are written."""
+    fake_module = type(sys)("vina")
+    fake_module.Vina = FakeVina
+    monkeypatch.setitem(sys.modules, "vina", fake_module)
+    monkeypatch.setattr(session, "has_vina_bindings", lambda: True)
+    FakeVina.instances.clear()
+    protein_pdbqt = tmp_path / "protein.pdbqt"
+    protein_pdbqt.write_text("ATOM\n")
+
+    with Screening(
+        protein_pdbqt, BINDING_SITE, num_workers=0, exhaustiveness=4
+    ) as screening:
+        results = screening.dock(["CCO", "CCN"])
+        assert not any(Path(screening._scratch.name).iterdir())
+
+    assert [r["affinity"] for r in results] == [-6.5, -6.5]
+    (vina,) = FakeVina.instances
+    assert vina.calls[:2] == ["set_receptor", "compute_vina_maps"]
+    assert vina.calls.count("dock") == 2
+    assert vina.options["sf_name"] == "vina"